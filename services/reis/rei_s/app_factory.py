@@ -2,13 +2,14 @@ from fastapi import FastAPI
 from prometheus_fastapi_instrumentator import Instrumentator
 
 from rei_s.utils import lifespan
-from rei_s.routes import files, health
+from rei_s.routes import admin, files, health
 
 
 def create() -> FastAPI:
     app = FastAPI(lifespan=lifespan)
     app.include_router(files.router)
     app.include_router(health.router)
+    app.include_router(admin.router)
     Instrumentator().instrument(app)
 
     return app
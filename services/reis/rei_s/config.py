@@ -21,6 +21,13 @@ def update_tempdir() -> None:
 update_tempdir()
 
 
+def get_state_dir() -> str:
+    """The directory of the databases of the service, the uploaded files are named by the clients,
+    so they must not be stored next to them.
+    """
+    return os.path.join(tempfile.gettempdir(), "reis-state")
+
+
 def check_needed(needed: Mapping[str, str | SecretStr | None], switch_name: str, switch_value: str) -> None:
     missing = []
     for name, value in needed.items():
@@ -42,6 +49,31 @@ class Config(BaseSettings, frozen=True):  # type: ignore
     metrics_port: Annotated[int, Field(ge=0)] = 9200
     batch_size: Annotated[int, Field(gt=0)] | None = None
     filesize_threshold: Annotated[int, Field(gt=0)] = 10**5
+    process_pool_size: Annotated[int, Field(gt=0)] | None = None
+    process_pool_max_tasks_per_child: Annotated[int, Field(gt=0)] = 10
+    # number of batches, which the process pool may parse ahead of the embedding
+    processing_queue_size: Annotated[int, Field(gt=0)] = 2
+    # number of batches of a single file, which are embedded at the same time
+    embedding_concurrency: Annotated[int, Field(gt=0)] = 1
+    embedding_ordered_writes: bool = True
+    # uploads in job mode, which may be queued or running at the same time
+    jobs_max_pending: Annotated[int, Field(gt=0)] = 100
+    # number of finished jobs, whose result is kept for polling
+    jobs_history_size: Annotated[int, Field(gt=0)] = 1000
+    # database of the jobs, pending jobs are resumed on startup
+    jobs_path: str | None = None
+    # share of the workers for processing, which users wait for, work around searches and adding files
+    scheduler_weight_interactive: Annotated[int, Field(gt=0)] = 8
+    scheduler_weight_search: Annotated[int, Field(gt=0)] = 4
+    scheduler_weight_bulk: Annotated[int, Field(gt=0)] = 1
+    # additional workers, which only serve the interactive and search lanes, so they never wait for adding files
+    scheduler_reserved_workers: Annotated[int, Field(ge=0)] = 1
+    # remember the stored batches of a file, such that retries only add the missing batches
+    ingestion_checkpoints_enabled: bool = False
+    ingestion_checkpoints_path: str | None = None
+    # copy the chunks of identical files, which were already added, instead of processing them again
+    ingestion_dedupe_enabled: bool = False
+    ingestion_dedupe_path: str | None = None
 
     embeddings_type: Literal["azure-openai", "openai", "random-test-embeddings", "ollama"]
     # needed for Azure OpenAI
@@ -57,6 +89,20 @@ class Config(BaseSettings, frozen=True):  # type: ignore
     # needed for ollama
     embeddings_ollama_endpoint: str | None = None
     embeddings_ollama_model_name: str | None = None
+    # local cache for the embeddings of chunks
+    embeddings_cache_enabled: bool = False
+    embeddings_cache_path: str | None = None
+    embeddings_cache_max_entries: Annotated[int, Field(gt=0)] = 100_000
+    # local cache for the parsed elements of files, which are processed without adding them (`/files/process`)
+    parse_cache_enabled: bool = False
+    parse_cache_path: str | None = None
+    parse_cache_max_entries: Annotated[int, Field(gt=0)] = 100
+    # in-memory cache for the embeddings of search queries, 0 disables the cache
+    embeddings_query_cache_size: Annotated[int, Field(ge=0)] = 256
+    embeddings_query_cache_ttl: Annotated[int, Field(gt=0)] = 600
+    # shared limit of all threads of a process for the embedding endpoint
+    embeddings_rate_limit_requests_per_minute: Annotated[int, Field(gt=0)] | None = None
+    embeddings_rate_limit_tokens_per_minute: Annotated[int, Field(gt=0)] | None = None
 
     stt_type: Literal["azure-openai-whisper"] | None = None
     stt_azure_openai_whisper_endpoint: str | None = None
@@ -65,6 +111,11 @@ class Config(BaseSettings, frozen=True):  # type: ignore
     stt_azure_openai_whisper_deployment_name: str | None = None
 
     store_type: Literal["azure-ai-search", "pgvector", "dev-null"]
+    # number of store adapters (one per index), which are kept warm
+    store_cache_size: Annotated[int, Field(gt=0)] = 32
+    # in-memory cache for search results, 0 disables the cache
+    search_cache_size: Annotated[int, Field(ge=0)] = 0
+    search_cache_ttl: Annotated[int, Field(gt=0)] = 60
     # needed for Azure AI Search vectorstore
     store_azure_ai_search_service_endpoint: str | None = None
     store_azure_ai_search_service_api_key: SecretStr | None = None
@@ -72,6 +123,48 @@ class Config(BaseSettings, frozen=True):  # type: ignore
     # needed for pgvector vectorstore
     store_pgvector_url: str | None = None
     store_pgvector_index_name: str = "index"
+    # searches with a filter, which matches at most this many chunks, only compare the matching chunks
+    store_pgvector_prefilter_threshold: Annotated[int, Field(ge=0)] = 10_000
+    # approximate nearest neighbour index of each collection, `none` compares the query with every chunk
+    store_pgvector_vector_index: Literal["none", "hnsw", "ivfflat"] = "none"
+    store_pgvector_hnsw_m: Annotated[int, Field(ge=2)] = 16
+    store_pgvector_hnsw_ef_construction: Annotated[int, Field(ge=4)] = 64
+    store_pgvector_hnsw_ef_search: Annotated[int, Field(ge=1)] = 40
+    store_pgvector_ivfflat_lists: Annotated[int, Field(ge=1)] = 100
+    store_pgvector_ivfflat_probes: Annotated[int, Field(ge=1)] = 1
+    # batches with at least this many chunks are written with a binary COPY instead of an INSERT
+    store_pgvector_copy_threshold: Annotated[int, Field(ge=1)] = 100
+    # connection pool of the engines, which are shared by all collections
+    store_pgvector_pool_size: Annotated[int, Field(ge=1)] = 5
+    store_pgvector_pool_max_overflow: Annotated[int, Field(ge=0)] = 10
+    store_pgvector_pool_pre_ping: bool = True
+    # seconds, after which connections are replaced, -1 keeps them
+    store_pgvector_pool_recycle: Annotated[int, Field(ge=-1)] = 1800
+
+    def get_embeddings_cache_path(self) -> str:
+        if self.embeddings_cache_path is not None:
+            return self.embeddings_cache_path
+        return os.path.join(get_state_dir(), "embeddings_cache.sqlite3")
+
+    def get_parse_cache_path(self) -> str:
+        if self.parse_cache_path is not None:
+            return self.parse_cache_path
+        return os.path.join(get_state_dir(), "parse_cache.sqlite3")
+
+    def get_jobs_path(self) -> str:
+        if self.jobs_path is not None:
+            return self.jobs_path
+        return os.path.join(get_state_dir(), "jobs.sqlite3")
+
+    def get_ingestion_checkpoints_path(self) -> str:
+        if self.ingestion_checkpoints_path is not None:
+            return self.ingestion_checkpoints_path
+        return os.path.join(get_state_dir(), "checkpoints.sqlite3")
+
+    def get_ingestion_dedupe_path(self) -> str:
+        if self.ingestion_dedupe_path is not None:
+            return self.ingestion_dedupe_path
+        return os.path.join(get_state_dir(), "ingest_registry.sqlite3")
 
     @model_validator(mode="after")
     def store_dependend_requirements(self) -> Self:
@@ -1,5 +1,52 @@
-from prometheus_client import Counter
+from prometheus_client import Counter, Gauge, Histogram
 
 files_processed_counter = Counter("files_processed_total", "Number of files that have been processed.")
 
+files_deduplicated_counter = Counter(
+    "files_deduplicated_total", "Number of files, whose chunks were copied from an identical file."
+)
+
 files_added_to_queue = Counter("files_added_to_queue_total", "Number of files that have been processed.")
+
+embeddings_rate_limited_counter = Counter(
+    "embeddings_rate_limited_total", "Number of embedding requests, which were rejected by the rate limit."
+)
+
+query_embeddings_cache_hits_counter = Counter(
+    "query_embeddings_cache_hits_total", "Number of search queries, whose embedding was cached."
+)
+
+query_embeddings_cache_misses_counter = Counter(
+    "query_embeddings_cache_misses_total", "Number of search queries, which had to be embedded."
+)
+
+parse_cache_hits_counter = Counter("parse_cache_hits_total", "Number of processed files, whose elements were cached.")
+
+parse_cache_misses_counter = Counter("parse_cache_misses_total", "Number of processed files, which had to be parsed.")
+
+search_cache_hits_counter = Counter("search_cache_hits_total", "Number of searches, whose result was cached.")
+
+search_cache_misses_counter = Counter("search_cache_misses_total", "Number of searches, which queried the store.")
+
+scheduler_queue_depth_gauge = Gauge(
+    "scheduler_queue_depth", "Number of tasks, which wait for a worker, by lane.", ["lane"]
+)
+
+scheduler_wait_histogram = Histogram(
+    "scheduler_wait_seconds",
+    "Seconds, which tasks waited for a worker, by lane.",
+    ["lane"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900),
+)
+
+pgvector_pool_connections_gauge = Gauge(
+    "pgvector_pool_connections",
+    "Number of connections in the pool of the pgvector engine, by database, engine and state (checked_out, idle).",
+    ["database", "engine", "state"],
+)
+
+pgvector_pool_max_connections_gauge = Gauge(
+    "pgvector_pool_max_connections",
+    "Maximal number of connections of the pgvector engine including the overflow, by database and engine.",
+    ["database", "engine"],
+)
@@ -0,0 +1,28 @@
+from asyncio import wrap_future
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.params import Query
+from pydantic import AfterValidator
+
+from rei_s.config import Config, get_config
+from rei_s.routes.files import check_index_name
+from rei_s.services import store_service
+
+
+router = APIRouter()
+
+
+@router.post("/admin/reindex", tags=["admin"], operation_id="reindex")
+async def reindex(
+    request: Request,
+    config: Annotated[Config, Depends(get_config)],
+    index_name: Annotated[
+        str | None, Query(description="The name of the index", alias="indexName"), AfterValidator(check_index_name)
+    ] = None,
+) -> None:
+    """
+    Rebuilds the vector index of the index with the configured parameters.
+    This may take long for large indexes, searches and uploads continue meanwhile.
+    """
+    await wrap_future(request.app.state.executor.submit_to_lane("bulk", store_service.reindex, config, index_name))
@@ -1,22 +1,30 @@
+import hashlib
 import re
-from typing import Annotated, List, Optional
+from typing import Annotated, AsyncIterator, List, Optional
 from asyncio import wrap_future
 import uuid
 import aiofiles
 from urllib.parse import unquote
 
-from fastapi import APIRouter, Depends, Request, Header
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, Header, UploadFile
 from fastapi.params import Query
+from langchain_core.documents import Document
 
 from pydantic import AfterValidator
 from rei_s.services import store_service
+from rei_s.services.job_service import get_configured_job_manager
 from rei_s.config import Config, get_config
 from rei_s.types.dtos import (
+    BatchSearchRequest,
+    BatchSearchResult,
+    BulkUploadResult,
     FileProcessResult,
     ResultDocument,
     FileResult,
     FileType,
     FileTypesResult,
+    FileUpdateResult,
+    JobResult,
 )
 from rei_s.types.source_file import SourceFile
 from rei_s import logger
@@ -26,6 +34,31 @@ from rei_s.metrics.metrics import files_added_to_queue
 
 router = APIRouter()
 
+# bytes, which are copied at once from an uploaded file to its temporary file
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+async def receive_file(
+    chunks: AsyncIterator[bytes], dest_path: str, file_id: str, file_name: str, mime_type: str
+) -> SourceFile:
+    """Writes the uploaded file to its temporary file, its size and hash are computed on the way"""
+    size = 0
+    sha256 = hashlib.sha256()
+    async with aiofiles.open(dest_path, "wb") as temp_file:
+        async for chunk in chunks:
+            size += len(chunk)
+            sha256.update(chunk)
+            await temp_file.write(chunk)
+
+    file = SourceFile(id=file_id, path=dest_path, file_name=file_name, mime_type=mime_type)
+    file.set_content_info(size, sha256.hexdigest())
+    return file
+
+
+async def iter_upload(upload: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+        yield chunk
+
 
 def check_index_name(index_name: str) -> str | None:
     # We enforce the most strict subset of rules to satisfy all vector stores
@@ -63,7 +96,7 @@ async def get_file_types(config: Annotated[Config, Depends(get_config)]) -> File
         },
     },
 )
-def get_files(
+async def get_files(
     config: Annotated[Config, Depends(get_config)],
     query: Annotated[str, Query(description="The query from the internal tool")],
     take: Annotated[int, Query(description="The number of results to return")],
@@ -80,8 +113,39 @@ def get_files(
     Get the files matching the query.
     """
     file_ids = files.split(",") if files is not None else None
-    store_docs = store_service.search(config, query, bucket, take, file_ids, index_name)
+    store_docs = await store_service.search(config, query, bucket, take, file_ids, index_name)
+
+    return get_file_result(store_docs)
+
+
+@router.post(
+    "/files/search:batch",
+    tags=["files"],
+    operation_id="searchFilesBatch",
+    responses={
+        422: {
+            "description": "Validation error",
+        },
+    },
+)
+async def search_files_batch(
+    config: Annotated[Config, Depends(get_config)],
+    body: BatchSearchRequest,
+    index_name: Annotated[
+        Optional[str], Query(description="The name of the index", alias="indexName"), AfterValidator(check_index_name)
+    ] = None,
+) -> BatchSearchResult:
+    """
+    Get the files matching each of the queries.
+
+    All queries are embedded with a single request and searched concurrently.
+    """
+    results = await store_service.search_batch(config, body.queries, index_name)
+
+    return BatchSearchResult(results=[get_file_result(store_docs) for store_docs in results])
+
 
+def get_file_result(store_docs: List[Document]) -> FileResult:
     docs = [ResultDocument(content=doc.page_content, metadata=getattr(doc, "metadata", {})) for doc in store_docs]
 
     debug = store_service.get_file_sources_markdown(store_docs)
@@ -91,8 +155,9 @@ def get_files(
 
 
 @router.get("/documents/content", tags=["files"], operation_id="getDocumentsContent")
-def get_documents_content(
+async def get_documents_content(
     config: Annotated[Config, Depends(get_config)],
+    request: Request,
     chunk_ids: Annotated[List[str], Query(description="The IDs of the chunks to retrieve")],
     index_name: Annotated[
         Optional[str], Query(description="The name of the index", alias="indexName"), AfterValidator(check_index_name)
@@ -101,7 +166,11 @@ def get_documents_content(
     """
     Get the documents content by their IDs.
     """
-    content = store_service.get_documents_content(config, chunk_ids, index_name)
+    content: List[str] = await wrap_future(
+        request.app.state.executor.submit_to_lane(
+            "search", store_service.get_documents_content, config, chunk_ids, index_name
+        )
+    )
 
     return content
 
@@ -145,16 +214,12 @@ async def post_files(
         raise ValueError("content_type is not defined")
 
     dest_path = get_uploaded_file_path(file_id)
-    async with aiofiles.open(dest_path, "wb") as temp_file:
-        async for chunk in request.stream():
-            await temp_file.write(chunk)
-
-    q = SourceFile(id=file_id, path=dest_path, file_name=unquote(file_name), mime_type=file_mime_type)
+    q = await receive_file(request.stream(), dest_path, file_id, unquote(file_name), file_mime_type)
     try:
         files_added_to_queue.inc()
         await wrap_future(
-            request.app.state.executor.submit(
-                store_service.process_and_add_file, config, q, bucket, index_name=index_name
+            request.app.state.executor.submit_to_lane(
+                "bulk", store_service.process_and_add_file, config, q, bucket, index_name=index_name
             )
         )
     except Exception as e:
@@ -164,6 +229,188 @@ async def post_files(
         q.delete()
 
 
+@router.put(
+    "/files",
+    tags=["files"],
+    operation_id="updateFile",
+    responses={
+        400: {
+            "description": "Processing failed",
+        },
+        413: {
+            "description": "File too large",
+        },
+        415: {
+            "description": "File format not supported",
+        },
+        422: {
+            "description": "Validation error",
+        },
+    },
+)
+async def put_files(
+    config: Annotated[Config, Depends(get_config)],
+    request: Request,
+    file_name: Annotated[str, Header(alias="fileName")],
+    file_mime_type: Annotated[str, Header(alias="fileMimeType")],
+    bucket: Annotated[str, Header()],
+    file_id: Annotated[str, Header(description="The ID of the file", alias="id")],
+    index_name: Annotated[
+        str | None, Header(description="The name of the index", alias="indexName"), AfterValidator(check_index_name)
+    ] = None,
+) -> FileUpdateResult:
+    """
+    Replaces a stored file with a new version.
+
+    Only the chunks, which changed, are embedded and stored, and only the chunks, which vanished, are deleted.
+    If the file was not stored before, this is the same as the POST /files endpoint.
+    """
+    dest_path = get_uploaded_file_path(str(uuid.uuid4()))
+    q = await receive_file(request.stream(), dest_path, file_id, unquote(file_name), file_mime_type)
+    try:
+        files_added_to_queue.inc()
+        result: FileUpdateResult = await wrap_future(
+            request.app.state.executor.submit_to_lane(
+                "bulk", store_service.process_and_update_file, config, q, bucket, index_name
+            )
+        )
+    except Exception as e:
+        logger.error(f"Error response from task: {e}")
+        raise
+    finally:
+        q.delete()
+
+    return result
+
+
+@router.post(
+    "/files/jobs",
+    tags=["files"],
+    operation_id="uploadFileJob",
+    status_code=202,
+    responses={
+        422: {
+            "description": "Validation error",
+        },
+        429: {
+            "description": "Too many pending jobs",
+        },
+    },
+)
+async def post_files_job(
+    config: Annotated[Config, Depends(get_config)],
+    request: Request,
+    file_name: Annotated[str, Header(alias="fileName")],
+    file_mime_type: Annotated[str, Header(alias="fileMimeType")],
+    bucket: Annotated[str, Header()],
+    file_id: Annotated[str, Header(description="The ID of the file", alias="id")],
+    index_name: Annotated[
+        str | None, Header(description="The name of the index", alias="indexName"), AfterValidator(check_index_name)
+    ] = None,
+) -> JobResult:
+    """
+    Stores the file and processes it in the background, like the POST /files endpoint.
+
+    The response contains the job, whose progress can be polled with GET /jobs/{job_id}.
+    Jobs survive a restart of the service. If a job for the file is still pending, the upload is discarded
+    and the pending job is returned.
+    """
+    job_manager = get_configured_job_manager(config)
+
+    # the job may outlive concurrent uploads of the same file, so we do not use the id for the temporary file
+    dest_path = get_uploaded_file_path(str(uuid.uuid4()))
+    q = await receive_file(request.stream(), dest_path, file_id, unquote(file_name), file_mime_type)
+    try:
+        job = job_manager.submit(request.app.state.executor, config, q, bucket, index_name)
+    except Exception:
+        q.delete()
+        raise
+
+    files_added_to_queue.inc()
+    return job
+
+
+@router.get(
+    "/jobs/{job_id}",
+    tags=["files"],
+    operation_id="getJob",
+    responses={
+        404: {
+            "description": "Job not found",
+        },
+    },
+)
+async def get_job(config: Annotated[Config, Depends(get_config)], job_id: str) -> JobResult:
+    """
+    Get the status and the progress of an upload job.
+    """
+    job = get_configured_job_manager(config).get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
+
+
+@router.post(
+    "/files/bulk",
+    tags=["files"],
+    operation_id="uploadFiles",
+    responses={
+        422: {
+            "description": "Validation error",
+        },
+    },
+)
+async def post_files_bulk(
+    config: Annotated[Config, Depends(get_config)],
+    request: Request,
+    files: Annotated[List[UploadFile], File(description="The files to add, with file name and content type")],
+    ids: Annotated[List[str], Form(description="The IDs of the files, in the order of the files")],
+    bucket: Annotated[str, Header()],
+    index_name: Annotated[
+        str | None, Header(description="The name of the index", alias="indexName"), AfterValidator(check_index_name)
+    ] = None,
+) -> BulkUploadResult:
+    """
+    Processes many files into chunks and stores them in the vector store.
+
+    The chunks of the files are embedded and stored together, which is much faster than uploading
+    many small files one by one. The result contains the status of every file.
+    """
+    if len(ids) != len(files):
+        raise HTTPException(status_code=422, detail="The number of IDs does not match the number of files")
+
+    source_files: List[SourceFile] = []
+    try:
+        for file_id, upload in zip(ids, files):
+            # the ids might be used by concurrent single uploads, so we do not use them for the temporary files
+            dest_path = get_uploaded_file_path(str(uuid.uuid4()))
+            source_files.append(
+                await receive_file(
+                    iter_upload(upload),
+                    dest_path,
+                    file_id,
+                    upload.filename or file_id,
+                    upload.content_type or "application/octet-stream",
+                )
+            )
+
+        files_added_to_queue.inc(len(source_files))
+        results = await wrap_future(
+            request.app.state.executor.submit_to_lane(
+                "bulk", store_service.process_and_add_files, config, source_files, bucket, index_name
+            )
+        )
+    except Exception as e:
+        logger.error(f"Error response from task: {e}")
+        raise
+    finally:
+        for source_file in source_files:
+            source_file.delete()
+
+    return BulkUploadResult(files=results)
+
+
 @router.post(
     "/files/process",
     tags=["files"],
@@ -200,13 +447,12 @@ async def post_files_only_processing(
     file_id = str(uuid.uuid4())
 
     dest_path = get_uploaded_file_path(file_id)
-    async with aiofiles.open(dest_path, "wb") as temp_file:
-        async for chunk in request.stream():
-            await temp_file.write(chunk)
-
-    q = SourceFile(id=file_id, path=dest_path, file_name=unquote(file_name), mime_type=file_mime_type)
+    q = await receive_file(request.stream(), dest_path, file_id, unquote(file_name), file_mime_type)
     try:
-        result = await wrap_future(request.app.state.executor.submit(store_service.process_file, config, q, chunk_size))
+        # the user waits for the result, so it is not queued behind files, which are added to the store
+        result = await wrap_future(
+            request.app.state.executor.submit_to_lane("interactive", store_service.process_file, config, q, chunk_size)
+        )
     except Exception as e:
         logger.error(f"Error response from task: {e}")
         raise
@@ -219,6 +465,20 @@ async def post_files_only_processing(
     return FileProcessResult(chunks=docs)
 
 
+@router.delete("/files", tags=["files"], operation_id="deleteFiles")
+def delete_many_files(
+    config: Annotated[Config, Depends(get_config)],
+    file_ids: Annotated[List[str], Query(description="The IDs of the files to delete", alias="fileIds")],
+    index_name: Annotated[
+        str | None, Query(description="The name of the index", alias="indexName"), AfterValidator(check_index_name)
+    ] = None,
+) -> None:
+    """
+    Deletes all chunks belonging to the specified files in the vector store at once.
+    """
+    store_service.delete_files(config, file_ids, index_name)
+
+
 @router.delete("/files/{file_id}", tags=["files"], operation_id="deleteFile")
 def delete_files(
     config: Annotated[Config, Depends(get_config)],
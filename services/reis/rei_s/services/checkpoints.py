@@ -0,0 +1,64 @@
+from functools import lru_cache
+import sqlite3
+from threading import Lock
+import time
+
+
+# checkpoints of files, which are never retried, are dropped after this many seconds
+CHECKPOINT_MAX_AGE = 7 * 24 * 3600
+
+
+class CheckpointStore:
+    """Remembers the stored batches of files, which are being added, such that a retry can skip them.
+
+    A checkpoint belongs to a fingerprint of the file and the batching, the batches of a different
+    fingerprint are not the same, so the checkpoint is discarded.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.lock = Lock()
+
+        # the connection is shared by all worker threads, it is guarded by the lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                "scope TEXT NOT NULL, "
+                "doc_id TEXT NOT NULL, "
+                "fingerprint TEXT NOT NULL, "
+                "batch_index INTEGER NOT NULL, "
+                "updated_at REAL NOT NULL, "
+                "PRIMARY KEY (scope, doc_id, batch_index))"
+            )
+            self.connection.execute("DELETE FROM checkpoints WHERE updated_at < ?", [time.time() - CHECKPOINT_MAX_AGE])
+
+    def get(self, scope: str, doc_id: str, fingerprint: str) -> set[int]:
+        """Returns the indexes of the stored batches"""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM checkpoints WHERE scope = ? AND doc_id = ? AND fingerprint != ?",
+                [scope, doc_id, fingerprint],
+            )
+            rows = self.connection.execute(
+                "SELECT batch_index FROM checkpoints WHERE scope = ? AND doc_id = ?", [scope, doc_id]
+            ).fetchall()
+
+        return {batch_index for (batch_index,) in rows}
+
+    def add(self, scope: str, doc_id: str, fingerprint: str, batch_index: int) -> None:
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO checkpoints (scope, doc_id, fingerprint, batch_index, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [scope, doc_id, fingerprint, batch_index, time.time()],
+            )
+
+    def clear(self, scope: str, doc_id: str) -> None:
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM checkpoints WHERE scope = ? AND doc_id = ?", [scope, doc_id])
+
+
+@lru_cache
+def get_checkpoint_store(path: str) -> CheckpointStore:
+    return CheckpointStore(path)
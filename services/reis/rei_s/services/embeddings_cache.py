@@ -0,0 +1,227 @@
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+import hashlib
+import sqlite3
+from threading import Lock
+import time
+
+from langchain_core.embeddings import Embeddings
+
+from rei_s.metrics.metrics import query_embeddings_cache_hits_counter, query_embeddings_cache_misses_counter
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class EmbeddingsCache:
+    """Size bounded on-disk cache for embedding vectors, evicting the least recently used entries"""
+
+    def __init__(self, path: str, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.lock = Lock()
+
+        # the connection is shared by all worker threads, it is guarded by the lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            (version,) = self.connection.execute("PRAGMA user_version").fetchone()
+            if version < 1:
+                # the first version stored the vectors as doubles
+                self.connection.execute("DROP TABLE IF EXISTS embeddings")
+                self.connection.execute("PRAGMA user_version = 1")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, "
+                "text_hash TEXT NOT NULL, "
+                "vector BLOB NOT NULL, "
+                "last_used REAL NOT NULL, "
+                "PRIMARY KEY (model, text_hash))"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+            (self.count,) = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+
+    def get_many(self, model: str, text_hashes: list[str]) -> dict[str, list[float]]:
+        result: dict[str, list[float]] = {}
+        # stay below the limit of variables in an sqlite statement
+        for i in range(0, len(text_hashes), 500):
+            part = text_hashes[i : i + 500]
+            placeholders = ", ".join("?" * len(part))
+            with self.lock, self.connection:
+                rows = self.connection.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *part],
+                ).fetchall()
+                self.connection.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash IN ({placeholders})",
+                    [time.time(), model, *part],
+                )
+
+            for text_hash, vector in rows:
+                result[text_hash] = array("f", vector).tolist()
+
+        return result
+
+    def set_many(self, model: str, vectors: dict[str, list[float]]) -> None:
+        if not vectors:
+            return
+
+        now = time.time()
+        # the providers return vectors with the precision of floats, doubles would take twice the space
+        rows = [(model, text_hash, array("f", vector).tobytes(), now) for text_hash, vector in vectors.items()]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            # replaced entries are counted as well, so the count is only an upper bound until it is checked
+            self.count += len(rows)
+            if self.count > self.max_entries:
+                (self.count,) = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if self.count > self.max_entries:
+                # we evict a tenth more than needed, such that the following writes do not evict again
+                keep = self.max_entries - self.max_entries // 10
+                self.connection.execute(
+                    "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    [self.count - keep],
+                )
+                self.count = keep
+
+
+@lru_cache
+def get_embeddings_cache(path: str, max_entries: int) -> EmbeddingsCache:
+    return EmbeddingsCache(path, max_entries)
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings, which are only computed by the wrapped provider, if the text was not embedded before"""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingsCache, model: str) -> None:
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+
+    def _lookup(self, texts: list[str]) -> tuple[list[str], dict[str, list[float]], list[str]]:
+        text_hashes = [hash_text(text) for text in texts]
+        cached = self.cache.get_many(self.model, list(set(text_hashes)))
+
+        # the same chunk may occur multiple times, e.g., repeated headers, we only embed it once
+        missing = list({h: text for h, text in zip(text_hashes, texts) if h not in cached}.values())
+
+        return text_hashes, cached, missing
+
+    def _store(self, cached: dict[str, list[float]], missing: list[str], vectors: list[list[float]]) -> None:
+        new = {hash_text(text): vector for text, vector in zip(missing, vectors)}
+        self.cache.set_many(self.model, new)
+        cached.update(new)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        text_hashes, cached, missing = self._lookup(texts)
+        if missing:
+            self._store(cached, missing, self.embeddings.embed_documents(missing))
+
+        return [cached[text_hash] for text_hash in text_hashes]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        text_hashes, cached, missing = self._lookup(texts)
+        if missing:
+            self._store(cached, missing, await self.embeddings.aembed_documents(missing))
+
+        return [cached[text_hash] for text_hash in text_hashes]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self.embeddings.aembed_query(text)
+
+
+def normalize_query(query: str) -> str:
+    # only whitespace is normalized, since the embedding models distinguish e.g. upper and lower case
+    return " ".join(query.split())
+
+
+class QueryEmbeddingsCache:
+    """In-memory cache for the embeddings of search queries, the entries expire after `ttl` seconds"""
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = Lock()
+        # the vectors are stored as arrays, which take a quarter of the memory of a list of floats
+        self.entries: OrderedDict[tuple[str, str], tuple[float, array[float]]] = OrderedDict()
+
+    def get(self, model: str, query: str) -> list[float] | None:
+        key = (model, normalize_query(query))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.entries.pop(key, None)
+                query_embeddings_cache_misses_counter.inc()
+                return None
+
+            self.entries.move_to_end(key)
+            query_embeddings_cache_hits_counter.inc()
+            return entry[1].tolist()
+
+    def set(self, model: str, query: str, vector: list[float]) -> None:
+        key = (model, normalize_query(query))
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, array("d", vector))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+@lru_cache
+def get_query_embeddings_cache(max_entries: int, ttl: float) -> QueryEmbeddingsCache:
+    return QueryEmbeddingsCache(max_entries, ttl)
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings, which reuse the embeddings of recently searched queries"""
+
+    def __init__(self, embeddings: Embeddings, cache: QueryEmbeddingsCache, model: str) -> None:
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        vector = self.cache.get(self.model, text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.set(self.model, text, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        vector = self.cache.get(self.model, text)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            self.cache.set(self.model, text, vector)
+        return vector
+
+    async def aembed_queries(self, texts: list[str]) -> list[list[float]]:
+        """Embeds the queries, which are not cached, with a single request"""
+        vectors = [self.cache.get(self.model, text) for text in texts]
+        missing = [text for text, vector in zip(texts, vectors) if vector is None]
+        if missing:
+            embedded = iter(await self.embeddings.aembed_documents(missing))
+            for i, text in enumerate(texts):
+                if vectors[i] is None:
+                    vector = next(embedded)
+                    self.cache.set(self.model, text, vector)
+                    vectors[i] = vector
+        return [vector for vector in vectors if vector is not None]
+
+
+async def aembed_queries(embeddings: Embeddings, texts: list[str]) -> list[list[float]]:
+    """Embeds several search queries at once, which saves the round trips of one request per query"""
+    if isinstance(embeddings, CachedQueryEmbeddings):
+        return await embeddings.aembed_queries(texts)
+    return await embeddings.aembed_documents(texts)
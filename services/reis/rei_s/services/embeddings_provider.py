@@ -1,18 +1,82 @@
+import httpx
 from langchain_openai import OpenAIEmbeddings, AzureOpenAIEmbeddings
 from langchain_community.embeddings import FakeEmbeddings
 from langchain_ollama import OllamaEmbeddings
 from langchain_core.embeddings import Embeddings
 
 from rei_s.config import Config
+from rei_s.services.embeddings_cache import (
+    CachedEmbeddings,
+    CachedQueryEmbeddings,
+    get_embeddings_cache,
+    get_query_embeddings_cache,
+)
+from rei_s.services.rate_limiter import RateLimitedEmbeddings, RateLimiter, get_rate_limiter
 
 
 def get_embeddings(config: Config) -> Embeddings:
+    rate_limiter = get_embeddings_rate_limiter(config)
+    embeddings = create_provider_embeddings(config, rate_limiter)
+
+    if rate_limiter is not None:
+        embeddings = RateLimitedEmbeddings(embeddings, rate_limiter)
+
+    # cached embeddings do not count against the rate limit
+    if config.embeddings_cache_enabled:
+        cache = get_embeddings_cache(config.get_embeddings_cache_path(), config.embeddings_cache_max_entries)
+        embeddings = CachedEmbeddings(embeddings, cache, get_embeddings_model_name(config))
+
+    if config.embeddings_query_cache_size > 0:
+        query_cache = get_query_embeddings_cache(config.embeddings_query_cache_size, config.embeddings_query_cache_ttl)
+        embeddings = CachedQueryEmbeddings(embeddings, query_cache, get_embeddings_model_name(config))
+
+    return embeddings
+
+
+def get_embeddings_model_name(config: Config) -> str:
+    """An identifier of the embedding model, vectors are only comparable if their identifiers are equal"""
+    if config.embeddings_type.lower() == "openai":
+        model_name = config.embeddings_openai_model_name
+    elif config.embeddings_type.lower() == "ollama":
+        model_name = config.embeddings_ollama_model_name
+    elif config.embeddings_type.lower() == "azure-openai":
+        model_name = config.embeddings_azure_openai_model_name
+    else:
+        model_name = None
+
+    return f"{config.embeddings_type.lower()}:{model_name}"
+
+
+def get_embeddings_rate_limiter(config: Config) -> RateLimiter | None:
+    if (
+        config.embeddings_rate_limit_requests_per_minute is None
+        and config.embeddings_rate_limit_tokens_per_minute is None
+    ):
+        return None
+
+    return get_rate_limiter(
+        get_embeddings_model_name(config),
+        config.embeddings_rate_limit_requests_per_minute,
+        config.embeddings_rate_limit_tokens_per_minute,
+    )
+
+
+def create_provider_embeddings(config: Config, rate_limiter: RateLimiter | None = None) -> Embeddings:
     # for low tier subscriptions, we will encounter rate limits when uploading larger files
     # since we may have multiple workers using the same embedding endpoint, we will encounter
     # multiple triggers of the rate limit error. However, we do not want to fail after
     # the default 2 retries. Thus we use a ridiculous number of retries to insure slow but errorless
     # uploads in instances with a too cheap subscription tier.
     max_retries = 1337
+    http_client = None
+    http_async_client = None
+
+    if rate_limiter is not None:
+        # The rate limiter coordinates the retries of all threads and learns from the rate limit headers
+        # of every response. Retries of the client would not wait for the limiter, so it retries all errors.
+        max_retries = 0
+        http_client = httpx.Client(event_hooks={"response": [rate_limiter.observe_response]})
+        http_async_client = httpx.AsyncClient(event_hooks={"response": [rate_limiter.aobserve_response]})
 
     if config.embeddings_type.lower() == "openai":
         # this is ensured by the config validation, the following lines are there to help the mypy typechecker
@@ -23,6 +87,8 @@ def get_embeddings(config: Config) -> Embeddings:
             api_key=config.embeddings_openai_api_key,
             model=config.embeddings_openai_model_name,
             max_retries=max_retries,
+            http_client=http_client,
+            http_async_client=http_async_client,
             base_url=config.embeddings_openai_endpoint,
         )
     elif config.embeddings_type.lower() == "ollama":
@@ -48,6 +114,8 @@ def get_embeddings(config: Config) -> Embeddings:
             azure_endpoint=config.embeddings_azure_openai_endpoint,
             api_version=config.embeddings_azure_openai_api_version,
             max_retries=max_retries,
+            http_client=http_client,
+            http_async_client=http_async_client,
         )
     elif config.embeddings_type.lower() == "random-test-embeddings":
         # use text-embedding-3-large size, which is at the time of writing the
@@ -1,22 +1,62 @@
-from abc import ABC, abstractmethod
+from abc import ABC
+from typing import Iterable, Iterator
 
 from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-from rei_s.services.formats.utils import check_file_name_extensions
+from rei_s.services.formats.utils import check_file_name_extensions, validate_chunk_overlap, validate_chunk_size
 from rei_s.types.source_file import SourceFile
 
 
 class AbstractFormatProvider(ABC):
     name: str
     file_name_extensions: list[str]
+    # increased, when `load` yields different elements, such that cached elements are not used anymore
+    version: int = 1
+    default_chunk_size: int
+    default_chunk_overlap: int = 0
 
     def supports(self, file: SourceFile) -> bool:
         return check_file_name_extensions(self.file_name_extensions, file)
 
-    @abstractmethod
     def process_file(self, file: SourceFile, chunk_size: int | None = None) -> list[Document]:
+        """Returns the chunks of the file.
+
+        Providers, which do not implement `load`, override this and split the whole file at once.
+        """
+        return list(self.iter_chunks(file, chunk_size))
+
+    def iter_chunks(self, file: SourceFile, chunk_size: int | None = None) -> Iterator[Document]:
+        """Yields the chunks of the file.
+
+        The elements of providers, which implement `load`, are split as they are loaded, such that the chunks
+        can be processed further before the whole file was parsed.
+        """
+        if self.cacheable:
+            return self.split(self.load(file), chunk_size)
+        return iter(self.process_file(file, chunk_size))
+
+    def load(self, file: SourceFile) -> Iterator[Document]:
+        """Yields the elements of the file before they are split into chunks, e.g., the pages of a PDF.
+
+        Providers with an expensive parser implement this, such that the elements can be
+        cached and only split again, when the same file is processed with another chunk size.
+        """
         raise NotImplementedError
 
+    def split(self, elements: Iterable[Document], chunk_size: int | None = None) -> Iterator[Document]:
+        """Splits the elements one by one, such that each chunk keeps the metadata of its element, e.g., the page"""
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=validate_chunk_size(chunk_size, self.default_chunk_size),
+            chunk_overlap=validate_chunk_overlap(None, self.default_chunk_overlap),
+        )
+        for doc in elements:
+            yield from splitter.split_documents([doc])
+
+    @property
+    def cacheable(self) -> bool:
+        return type(self).load is not AbstractFormatProvider.load
+
     def clean_up(self, document: Document) -> Document:
         return document
 
@@ -61,7 +61,7 @@ class CodeProvider(AbstractFormatProvider):
     def process_file(
         self, file: SourceFile, chunk_size: int | None = None, chunk_overlap: int | None = None
     ) -> list[Document]:
-        text = file.buffer.decode()
+        text = file.read_text()
 
         language = None
         for ext in self.file_name_extensions:
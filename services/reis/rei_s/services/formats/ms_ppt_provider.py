@@ -1,10 +1,8 @@
-from typing import Any
+from typing import Any, Iterator
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import UnstructuredPowerPointLoader
 
 from rei_s.services.formats.abstract_format_provider import AbstractFormatProvider
-from rei_s.services.formats.utils import validate_chunk_overlap, validate_chunk_size
 from rei_s.types.source_file import SourceFile
 
 
@@ -18,18 +16,6 @@ class MsPptProvider(AbstractFormatProvider):
         self.default_chunk_size = chunk_size
         self.default_chunk_overlap = chunk_overlap
 
-    def splitter(
-        self, chunk_size: int | None = None, chunk_overlap: int | None = None
-    ) -> RecursiveCharacterTextSplitter:
-        chunk_size = validate_chunk_size(chunk_size, self.default_chunk_size)
-        chunk_overlap = validate_chunk_overlap(chunk_overlap, self.default_chunk_overlap)
-        return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-
-    def process_file(
-        self, file: SourceFile, chunk_size: int | None = None, chunk_overlap: int | None = None
-    ) -> list[Document]:
+    def load(self, file: SourceFile) -> Iterator[Document]:
         loader = UnstructuredPowerPointLoader(file.path)
-        docs = loader.load()
-
-        chunks = self.splitter(chunk_size, chunk_overlap).split_documents(docs)
-        return chunks
+        yield from loader.load()
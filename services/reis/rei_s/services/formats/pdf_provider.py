@@ -1,14 +1,12 @@
-from io import BytesIO
-from typing import Any, BinaryIO
+from typing import Any, BinaryIO, Iterator
 
 from langchain_core.documents import Document
 from langchain_community.document_loaders.parsers.pdf import PDFMinerParser
 from langchain_community.document_loaders.generic import GenericLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 import pdfminer
 
 from rei_s.services.formats.abstract_format_provider import AbstractFormatProvider
-from rei_s.services.formats.utils import BytesLoader, validate_chunk_overlap, validate_chunk_size
+from rei_s.services.formats.utils import FileLoader
 from rei_s.types.source_file import SourceFile
 
 
@@ -43,34 +41,21 @@ class PdfProvider(AbstractFormatProvider):
         self.default_chunk_size = chunk_size
         self.default_chunk_overlap = chunk_overlap
 
-    def splitter(
-        self, chunk_size: int | None = None, chunk_overlap: int | None = None
-    ) -> RecursiveCharacterTextSplitter:
-        chunk_size = validate_chunk_size(chunk_size, self.default_chunk_size)
-        chunk_overlap = validate_chunk_overlap(chunk_overlap, self.default_chunk_overlap)
-        return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-
-    def process_file(
-        self, file: SourceFile, chunk_size: int | None = None, chunk_overlap: int | None = None
-    ) -> list[Document]:
+    def load(self, file: SourceFile) -> Iterator[Document]:
         loader = GenericLoader(
-            blob_loader=BytesLoader(BytesIO(file.buffer)),
+            blob_loader=FileLoader(file),
             blob_parser=TolerantPDFMinerParser(extract_images=False, mode="page"),
         )
 
-        documents = loader.load()
-
-        for doc in documents:
+        # the pages are parsed lazily, so we can split and pass on the chunks page by page
+        for doc in loader.lazy_load():
             doc.metadata["pdf_parser"] = f"PDFMiner {pdfminer.__version__}"
             if "page" in doc.metadata:
                 # this loader starts to count at 0
                 # since convention for pdfs (and books, ...) is to start at 1, we need to increase it here
                 doc.metadata["page"] += 1
 
-        chunks = self.splitter(chunk_size, chunk_overlap).split_documents(documents)
-
-        # apparently we can encounter 0x00 bytes, which can not be handled by pgvector
-        for c in chunks:
-            c.page_content = c.page_content.replace("\x00", "\ufffd")
+            # apparently we can encounter 0x00 bytes, which can not be handled by pgvector
+            doc.page_content = doc.page_content.replace("\x00", "\ufffd")
 
-        return chunks
+            yield doc
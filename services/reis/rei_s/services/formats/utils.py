@@ -1,4 +1,3 @@
-from io import BytesIO
 from typing import Generator
 
 from langchain_core.documents.base import Blob
@@ -29,12 +28,14 @@ def validate_chunk_overlap(chunk_overlap: int | None, default: int) -> int:
     return chunk_overlap
 
 
-class BytesLoader(BlobLoader):
-    def __init__(self, buffer: BytesIO) -> None:
-        self.buffer = buffer
+class FileLoader(BlobLoader):
+    """Passes the file by its path, such that parsers read it as a stream instead of copying it into memory"""
+
+    def __init__(self, file: SourceFile) -> None:
+        self.file = file
 
     def yield_blobs(self) -> Generator[Blob, None, None]:
-        yield Blob.from_data(self.buffer.getvalue(), path="stream")
+        yield Blob.from_path(self.file.path, mime_type=self.file.mime_type)
 
 
 class ProcessingError(Exception):
@@ -42,3 +43,7 @@ class ProcessingError(Exception):
         super().__init__(message)
         self.status = status
         self.message = message
+
+    def __reduce__(self) -> tuple[type["ProcessingError"], tuple[str, int]]:
+        # needed to pass the error from the processing pool back to the main process
+        return self.__class__, (self.message, self.status)
@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Iterator
 from langchain_core.documents import Document
 import ffmpeg
 
@@ -65,10 +65,9 @@ class VideoTranscriptionProvider(VoiceTranscriptionProvider):
 
         return audio_only_file
 
-    def process_file(
-        self, file: SourceFile, chunk_size: int | None = None, chunk_overlap: int | None = None
-    ) -> list[Document]:
+    def load(self, file: SourceFile) -> Iterator[Document]:
         audio_file = self.extract_audio_to_file(file.path)
-        chunks = super().process_file(audio_file, chunk_size, chunk_overlap)
-        audio_file.delete()
-        return chunks
+        try:
+            yield from super().load(audio_file)
+        finally:
+            audio_file.delete()
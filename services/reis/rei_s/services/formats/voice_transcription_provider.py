@@ -1,9 +1,9 @@
 from dataclasses import dataclass
-from typing import Any
+import os
+from typing import Any, Iterator
 
 from langchain_core.documents import Document
 from langchain_core.documents.base import Blob
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders.parsers.audio import AzureOpenAIWhisperParser
 import openai
 import ffmpeg
@@ -11,7 +11,7 @@ import ffmpeg
 from rei_s import logger
 from rei_s.config import Config
 from rei_s.services.formats.abstract_format_provider import AbstractFormatProvider
-from rei_s.services.formats.utils import ProcessingError, validate_chunk_overlap, validate_chunk_size
+from rei_s.services.formats.utils import ProcessingError
 from rei_s.types.source_file import SourceFile
 
 
@@ -85,13 +85,6 @@ class VoiceTranscriptionProvider(AbstractFormatProvider):
         else:
             self.parser = None
 
-    def splitter(
-        self, chunk_size: int | None = None, chunk_overlap: int | None = None
-    ) -> RecursiveCharacterTextSplitter:
-        chunk_size = validate_chunk_size(chunk_size, self.default_chunk_size)
-        chunk_overlap = validate_chunk_overlap(chunk_overlap, self.default_chunk_overlap)
-        return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-
     @property
     def enabled(self) -> bool:
         return self.parser is not None
@@ -178,9 +171,7 @@ class VoiceTranscriptionProvider(AbstractFormatProvider):
 
         return segments_files, segment_timestamps, audio_codec
 
-    def process_file(
-        self, file: SourceFile, chunk_size: int | None = None, chunk_overlap: int | None = None
-    ) -> list[Document]:
+    def load(self, file: SourceFile) -> Iterator[Document]:
         if self.parser is None:
             raise ValueError(f"calling disabled format provider: `{self.__class__.name}`")
 
@@ -188,27 +179,31 @@ class VoiceTranscriptionProvider(AbstractFormatProvider):
         # If the file is larger than 25 MB, split it into multiple files and combine the output
         segments, segment_timestamps, _audio_codec = self.split_into_compatible_format(file.path)
 
-        results = []
-        for n, segment in enumerate(segments):
-            blob = Blob.from_path(segment.path)
-            logger.info(f"process {n + 1} / {len(segments)}")
-            try:
-                docs = self.parser.parse(blob)
-            except openai.APIStatusError as e:  # pragma: no cover
-                if e.status_code == 413:
-                    raise ProcessingError("File too large. The limit is 25 MiB.", e.status_code) from e
-                else:
-                    raise
-            finally:
-                segment.delete()
-
-            for doc in docs:
-                doc.metadata["segment_begin_seconds"] = segment_timestamps[n]
-                doc.metadata["segment_end_seconds"] = segment_timestamps[n + 1]
-                doc.metadata["total_segments"] = len(segments)
-                doc.metadata["total_duration"] = segment_timestamps[-1]
-
-            results.extend(docs)
-
-        chunks = self.splitter(chunk_size, chunk_overlap).split_documents(results)
-        return chunks
+        # the segments are transcribed one after another, so the chunks of the first segments
+        # can be passed on, while the later segments are still being transcribed
+        try:
+            for n, segment in enumerate(segments):
+                blob = Blob.from_path(segment.path)
+                logger.info(f"process {n + 1} / {len(segments)}")
+                try:
+                    docs = self.parser.parse(blob)
+                except openai.APIStatusError as e:  # pragma: no cover
+                    if e.status_code == 413:
+                        raise ProcessingError("File too large. The limit is 25 MiB.", e.status_code) from e
+                    else:
+                        raise
+                finally:
+                    segment.delete()
+
+                for doc in docs:
+                    doc.metadata["segment_begin_seconds"] = segment_timestamps[n]
+                    doc.metadata["segment_end_seconds"] = segment_timestamps[n + 1]
+                    doc.metadata["total_segments"] = len(segments)
+                    doc.metadata["total_duration"] = segment_timestamps[-1]
+
+                yield from docs
+        finally:
+            # cleanup the remaining segments, if we stopped early
+            for segment in segments:
+                if os.path.exists(segment.path):
+                    segment.delete()
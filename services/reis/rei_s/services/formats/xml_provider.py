@@ -38,7 +38,7 @@ class XmlProvider(AbstractFormatProvider):
     def process_file(
         self, file: SourceFile, chunk_size: int | None = None, chunk_overlap: int | None = None
     ) -> list[Document]:
-        text = file.buffer.decode()
+        text = file.read_text()
 
         chunks = self.splitter(chunk_size, chunk_overlap).create_documents([text])
         return chunks
@@ -0,0 +1,62 @@
+from functools import lru_cache
+import sqlite3
+from threading import Lock
+import time
+
+
+class IngestRegistry:
+    """Remembers which documents were stored from a file, such that an identical upload can copy their chunks.
+
+    The registry only knows the documents added and deleted by this instance. An entry may therefore be
+    outdated, e.g., if another instance deleted the document, so callers have to check the store.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.lock = Lock()
+
+        # the connection is shared by all worker threads, it is guarded by the lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            (version,) = self.connection.execute("PRAGMA user_version").fetchone()
+            if version < 1:
+                # the first version did not know the buckets of the documents
+                self.connection.execute("DROP TABLE IF EXISTS ingested")
+                self.connection.execute("PRAGMA user_version = 1")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS ingested ("
+                "fingerprint TEXT NOT NULL, "
+                "index_name TEXT NOT NULL, "
+                "doc_id TEXT NOT NULL, "
+                "bucket TEXT NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "PRIMARY KEY (index_name, doc_id))"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS ix_ingested_fingerprint ON ingested (fingerprint)")
+
+    def find(self, fingerprint: str) -> list[tuple[str, str, str]]:
+        """Returns the index names, doc ids and buckets of the documents, the most recent first"""
+        with self.lock, self.connection:
+            rows = self.connection.execute(
+                "SELECT index_name, doc_id, bucket FROM ingested WHERE fingerprint = ? ORDER BY created_at DESC",
+                [fingerprint],
+            ).fetchall()
+
+        return [(index_name, doc_id, bucket) for index_name, doc_id, bucket in rows]
+
+    def add(self, fingerprint: str, index_name: str, doc_id: str, bucket: str) -> None:
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO ingested (fingerprint, index_name, doc_id, bucket, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [fingerprint, index_name, doc_id, bucket, time.time()],
+            )
+
+    def remove(self, index_name: str, doc_id: str) -> None:
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM ingested WHERE index_name = ? AND doc_id = ?", [index_name, doc_id])
+
+
+@lru_cache
+def get_ingest_registry(path: str) -> IngestRegistry:
+    return IngestRegistry(path)
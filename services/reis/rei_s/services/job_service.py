@@ -0,0 +1,202 @@
+from concurrent.futures import Executor
+from functools import lru_cache
+import os
+import sqlite3
+from threading import Lock
+import time
+from typing import Any
+import uuid
+
+from fastapi import HTTPException
+
+from rei_s import logger
+from rei_s.config import Config
+from rei_s.metrics.metrics import files_processed_counter
+from rei_s.services import store_service
+from rei_s.types.dtos import JobResult
+from rei_s.types.source_file import SourceFile
+
+
+JOB_COLUMNS = [
+    "id",
+    "file_id",
+    "status",
+    "batches_done",
+    "num_batches",
+    "status_code",
+    "detail",
+    "created_at",
+    "finished_at",
+]
+FILE_COLUMNS = ["path", "file_name", "mime_type", "bucket", "index_name"]
+
+
+class JobManager:
+    """Runs uploads in the background and keeps their progress, such that clients can poll instead of waiting.
+
+    The jobs are stored in an SQLite database next to the uploaded files, such that accepted uploads
+    survive a restart and are resumed on startup. There is at most one pending job per file id.
+    The number of queued and running jobs is bounded, further uploads are rejected until jobs finished.
+    Finished jobs are kept for polling, the oldest are dropped when there are more than `history_size`.
+    """
+
+    def __init__(self, path: str, max_pending: int, history_size: int) -> None:
+        self.max_pending = max_pending
+        self.history_size = history_size
+        self.lock = Lock()
+
+        # the connection is shared by all worker threads, it is guarded by the lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, "
+                "file_id TEXT NOT NULL, "
+                "status TEXT NOT NULL, "
+                "batches_done INTEGER NOT NULL, "
+                "num_batches INTEGER, "
+                "status_code INTEGER, "
+                "detail TEXT, "
+                "created_at REAL NOT NULL, "
+                "finished_at REAL, "
+                "path TEXT NOT NULL, "
+                "file_name TEXT NOT NULL, "
+                "mime_type TEXT NOT NULL, "
+                "bucket TEXT NOT NULL, "
+                "index_name TEXT)"
+            )
+            # makes sure, that a file is not added twice, e.g., if the client retries the upload
+            self.connection.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_jobs_pending_file_id ON jobs (file_id) "
+                "WHERE status IN ('queued', 'running')"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS ix_jobs_finished_at ON jobs (finished_at)")
+
+    def _select(self, where: str, parameters: list[Any]) -> list[tuple[JobResult, list[Any]]]:
+        rows = self.connection.execute(
+            f"SELECT {', '.join(JOB_COLUMNS + FILE_COLUMNS)} FROM jobs WHERE {where}", parameters
+        ).fetchall()
+        return [(JobResult(**dict(zip(JOB_COLUMNS, row))), list(row[len(JOB_COLUMNS) :])) for row in rows]
+
+    def submit(
+        self, executor: Executor, config: Config, file: SourceFile, bucket: str, index_name: str | None
+    ) -> JobResult:
+        """Schedules adding the file, the job owns the file and deletes it when done
+
+        If there is already a pending job for the file id, the upload is discarded and the pending job is returned.
+        """
+        with self.lock, self.connection:
+            pending = self._select("file_id = ? AND status IN ('queued', 'running')", [file.id])
+            if pending:
+                logger.info(f"File {file.id} is already pending in job {pending[0][0].id}")
+                file.delete()
+                return pending[0][0]
+
+            (count,) = self.connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()
+            if count >= self.max_pending:
+                raise HTTPException(status_code=429, detail="Too many pending jobs")
+
+            job = JobResult(
+                id=str(uuid.uuid4()),
+                file_id=file.id,
+                status="queued",
+                batches_done=0,
+                num_batches=None,
+                status_code=None,
+                detail=None,
+                created_at=time.time(),
+                finished_at=None,
+            )
+            values = [getattr(job, column) for column in JOB_COLUMNS]
+            values += [file.path, file.file_name, file.mime_type, bucket, index_name]
+            self.connection.execute(
+                f"INSERT INTO jobs ({', '.join(JOB_COLUMNS + FILE_COLUMNS)}) VALUES ({', '.join('?' * len(values))})",
+                values,
+            )
+
+        executor.submit(self.run, job.id, config, file, bucket, index_name)
+        return job
+
+    def resume(self, executor: Executor, config: Config) -> None:
+        """Schedules the jobs, which were pending when the service stopped"""
+        with self.lock:
+            pending = self._select("status IN ('queued', 'running') ORDER BY created_at", [])
+
+        for job, (path, file_name, mime_type, bucket, index_name) in pending:
+            if not os.path.exists(path):
+                logger.error(f"Cannot resume job {job.id}, the uploaded file is missing")
+                self.update(job.id, status="failed", status_code=500, detail="The uploaded file is missing")
+                self.finish(job.id)
+                continue
+
+            logger.info(f"Resume job {job.id} for file: {job.file_id}")
+            file = SourceFile(id=job.file_id, path=path, file_name=file_name, mime_type=mime_type)
+            executor.submit(self.run, job.id, config, file, bucket, index_name, job.status == "running")
+
+    def get(self, job_id: str) -> JobResult | None:
+        with self.lock:
+            jobs = self._select("id = ?", [job_id])
+        return jobs[0][0] if jobs else None
+
+    def update(self, job_id: str, **values: object) -> None:
+        assignments = ", ".join(f"{key} = ?" for key in values)
+        with self.lock, self.connection:
+            self.connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", [*values.values(), job_id])
+
+    def run(
+        self,
+        job_id: str,
+        config: Config,
+        file: SourceFile,
+        bucket: str,
+        index_name: str | None,
+        interrupted: bool = False,
+    ) -> None:
+        logger.info(f"Start job {job_id} for file: {file.id}")
+        self.update(job_id, status="running", batches_done=0, num_batches=None)
+
+        def on_batch_added(index: int, num_batches: int | None) -> None:
+            self.update(job_id, batches_done=index + 1, num_batches=num_batches)
+
+        try:
+            if interrupted and not config.ingestion_checkpoints_enabled:
+                # the job was running when the service stopped, we start over without the chunks added so far
+                # with checkpoints, adding the file continues after the stored batches instead
+                store_service.delete_file(config, file.id, index_name)
+            store_service.add_file(config, file, bucket, file.id, index_name, on_batch_added)
+            files_processed_counter.inc()
+            self.update(job_id, status="done")
+            logger.info(f"Completed job {job_id} for file: {file.id}")
+        except HTTPException as e:
+            self.update(job_id, status="failed", status_code=e.status_code, detail=str(e.detail))
+        except Exception as e:
+            logger.error(f"Job {job_id} for file {file.id} failed: {e!r}")
+            self.update(job_id, status="failed", status_code=500, detail="Adding the file failed")
+        finally:
+            file.delete()
+            self.finish(job_id)
+
+    def finish(self, job_id: str) -> None:
+        with self.lock, self.connection:
+            # the number of batches is unknown while streaming, but it is known when done
+            self.connection.execute(
+                "UPDATE jobs SET num_batches = batches_done WHERE id = ? AND status = 'done'", [job_id]
+            )
+            self.connection.execute("UPDATE jobs SET finished_at = ? WHERE id = ?", [time.time(), job_id])
+            self.connection.execute(
+                "DELETE FROM jobs WHERE id IN ("
+                "SELECT id FROM jobs WHERE finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT -1 OFFSET ?)",
+                [self.history_size],
+            )
+
+
+@lru_cache
+def get_job_manager(path: str, max_pending: int, history_size: int) -> JobManager:
+    return JobManager(path, max_pending, history_size)
+
+
+def get_configured_job_manager(config: Config) -> JobManager:
+    return get_job_manager(config.get_jobs_path(), config.jobs_max_pending, config.jobs_history_size)
@@ -1,11 +1,28 @@
+from concurrent.futures import ProcessPoolExecutor, wait
+from itertools import batched
 import logging
 import multiprocessing as mp
+from multiprocessing.managers import SyncManager
+import queue
+from threading import Event, Lock
+from typing import Generator, Iterable, Sequence
 
+from langchain_core.documents import Document
+
+from rei_s.config import Config
 from rei_s.logger_formatter import JsonFormatter
 from rei_s.services.formats.abstract_format_provider import AbstractFormatProvider
 from rei_s.types.source_file import SourceFile
 
 
+_process_pool: ProcessPoolExecutor | None = None
+_manager: SyncManager | None = None
+_process_pool_lock = Lock()
+
+# interval in seconds, in which blocked queue operations check whether the other side gave up
+POLL_INTERVAL = 1.0
+
+
 def init_subprocess_logger() -> None:
     """For initilizing the logging format in newly spawned processes"""
     logger = logging.getLogger("root")
@@ -16,16 +33,175 @@ def init_subprocess_logger() -> None:
     logger.addHandler(handler)
 
 
-def process_file_in_process(
+def init_subprocess() -> None:
+    """Runs once in every process of the pool, before it accepts its first task"""
+    init_subprocess_logger()
+
+    # Importing the format providers pulls in langchain, unstructured, pdfminer, ...
+    # We pay this once per process here, instead of once per file.
+    import rei_s.services.formats  # noqa: F401
+
+
+def warm_up() -> None:
+    """Noop task, which forces the pool to spawn (and initialize) its processes"""
+
+
+def get_process_pool_size(config: Config) -> int:
+    return config.process_pool_size or config.workers
+
+
+def get_process_pool(config: Config) -> ProcessPoolExecutor:
+    global _process_pool
+
+    with _process_pool_lock:
+        if _process_pool is None:
+            # We use `spawn`, since forking a process with running threads is unsafe.
+            # The processes are recycled after `max_tasks_per_child` tasks, such that
+            # the RAM used for the processing is released back to the operating system.
+            _process_pool = ProcessPoolExecutor(
+                max_workers=get_process_pool_size(config),
+                mp_context=mp.get_context("spawn"),
+                initializer=init_subprocess,
+                max_tasks_per_child=config.process_pool_max_tasks_per_child,
+            )
+
+        return _process_pool
+
+
+def get_manager() -> SyncManager:
+    """The manager provides the queues, through which the pool processes stream their results"""
+    global _manager
+
+    with _process_pool_lock:
+        if _manager is None:
+            _manager = mp.get_context("spawn").Manager()
+
+        return _manager
+
+
+def start_process_pool(config: Config) -> None:
+    """Starts all processes of the pool and the manager, such that requests do not wait for them.
+
+    With the `spawn` context, the pool starts at most one process per submitted task, thus we submit a
+    warm-up for every process. Note that each warm-up counts towards `max_tasks_per_child`.
+    """
+    pool = get_process_pool(config)
+    wait([pool.submit(warm_up) for _ in range(get_process_pool_size(config))])
+
+    get_manager()
+
+
+def reset_process_pool() -> None:
+    """Discards the pool, e.g., after a process died and the pool is broken. A new pool is created on demand."""
+    global _process_pool
+
+    with _process_pool_lock:
+        pool = _process_pool
+        _process_pool = None
+
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool, _manager
+
+    with _process_pool_lock:
+        pool = _process_pool
+        _process_pool = None
+        manager = _manager
+        _manager = None
+
+    if pool is not None:
+        pool.shutdown()
+    if manager is not None:
+        manager.shutdown()
+
+
+def put_until_cancelled(
+    queue_: "queue.Queue[list[Document] | Exception | None]",
+    item: list[Document] | Exception | None,
+    cancelled: Event,
+) -> bool:
+    while not cancelled.is_set():
+        try:
+            queue_.put(item, timeout=POLL_INTERVAL)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def stream_file_in_process(
     format_: AbstractFormatProvider,
     file: SourceFile,
     chunk_size: int | None,
-    queue: mp.Queue,  # type: ignore[type-arg]
+    batch_size: int | None,
+    queue_: "queue.Queue[list[Document] | Exception | None]",
+    cancelled: Event,
 ) -> None:
+    """Puts the batches of chunks into the queue, followed by `None` when done, or the raised exception
+
+    Without a batch size, the whole file is a single batch.
+    """
     try:
-        init_subprocess_logger()
-        chunks = format_.process_file(file, chunk_size)
+        if batch_size is None:
+            batches: Iterable[Sequence[Document]] = [format_.process_file(file, chunk_size)]
+        else:
+            batches = batched(format_.iter_chunks(file, chunk_size), batch_size)
+
+        for batch in batches:
+            # the queue is bounded, so we stop parsing ahead, if the consumer can not keep up
+            if not put_until_cancelled(queue_, list(batch), cancelled):
+                return
     except Exception as e:
-        queue.put(e)
+        put_until_cancelled(queue_, e, cancelled)
     else:
-        queue.put(chunks)
+        put_until_cancelled(queue_, None, cancelled)
+
+
+def load_file(format_: AbstractFormatProvider, file: SourceFile) -> list[Document]:
+    return list(format_.load(file))
+
+
+def load_file_in_process(config: Config, format_: AbstractFormatProvider, file: SourceFile) -> list[Document]:
+    """Parses the file into its elements, which are not split into chunks yet"""
+    return get_process_pool(config).submit(load_file, format_, file).result()
+
+
+def iter_batches_in_process(
+    config: Config,
+    format_: AbstractFormatProvider,
+    file: SourceFile,
+    chunk_size: int | None,
+    batch_size: int | None,
+) -> Generator[list[Document], None, None]:
+    manager = get_manager()
+    queue_: "queue.Queue[list[Document] | Exception | None]" = manager.Queue(maxsize=config.processing_queue_size)
+    cancelled = manager.Event()
+
+    future = get_process_pool(config).submit(
+        stream_file_in_process, format_, file, chunk_size, batch_size, queue_, cancelled
+    )
+    process_finished = False
+    try:
+        while True:
+            try:
+                item = queue_.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if process_finished:
+                    raise RuntimeError("Processing stopped without a result") from None
+                if future.done():
+                    # this raises if the process died, otherwise its last item is in the queue by now
+                    future.result()
+                    process_finished = True
+                continue
+
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # stops the process, if we stopped consuming early, e.g., because storing a batch failed
+        cancelled.set()
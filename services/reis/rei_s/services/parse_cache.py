@@ -0,0 +1,84 @@
+from functools import lru_cache
+import json
+import sqlite3
+from threading import Lock
+import time
+from typing import Any
+import zlib
+
+from langchain_core.documents import Document
+
+from rei_s.metrics.metrics import parse_cache_hits_counter, parse_cache_misses_counter
+
+
+class ParseCache:
+    """Size bounded on-disk cache for the elements of parsed files, evicting the least recently used entries.
+
+    The elements are stored before they are split into chunks, such that a file can be split again with
+    another chunk size without parsing it.
+    """
+
+    def __init__(self, path: str, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.lock = Lock()
+
+        # the connection is shared by all worker threads, it is guarded by the lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            (version,) = self.connection.execute("PRAGMA user_version").fetchone()
+            if version < 1:
+                # the first version pickled the elements, which must never be loaded
+                self.connection.execute("DROP TABLE IF EXISTS elements")
+                self.connection.execute("PRAGMA user_version = 1")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS elements ("
+                "format TEXT NOT NULL, "
+                "content_hash TEXT NOT NULL, "
+                "elements BLOB NOT NULL, "
+                "last_used REAL NOT NULL, "
+                "PRIMARY KEY (format, content_hash))"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS ix_elements_last_used ON elements (last_used)")
+
+    def get(self, format_: str, content_hash: str) -> list[Document] | None:
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT elements FROM elements WHERE format = ? AND content_hash = ?", [format_, content_hash]
+            ).fetchone()
+            if row is not None:
+                self.connection.execute(
+                    "UPDATE elements SET last_used = ? WHERE format = ? AND content_hash = ?",
+                    [time.time(), format_, content_hash],
+                )
+
+        if row is None:
+            parse_cache_misses_counter.inc()
+            return None
+
+        parse_cache_hits_counter.inc()
+        # the elements are plain JSON, so a tampered database cannot execute code
+        elements: list[tuple[str, dict[str, Any]]] = json.loads(zlib.decompress(row[0]))
+        return [Document(page_content=page_content, metadata=metadata) for page_content, metadata in elements]
+
+    def set(self, format_: str, content_hash: str, elements: list[Document]) -> None:
+        # values of the metadata, which are not JSON, e.g., dates, are stored as strings
+        blob = zlib.compress(
+            json.dumps([(doc.page_content, doc.metadata) for doc in elements], default=str).encode("utf-8")
+        )
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO elements (format, content_hash, elements, last_used) VALUES (?, ?, ?, ?)",
+                [format_, content_hash, blob, time.time()],
+            )
+            (count,) = self.connection.execute("SELECT COUNT(*) FROM elements").fetchone()
+            if count > self.max_entries:
+                self.connection.execute(
+                    "DELETE FROM elements WHERE rowid IN (SELECT rowid FROM elements ORDER BY last_used LIMIT ?)",
+                    [count - self.max_entries],
+                )
+
+
+@lru_cache
+def get_parse_cache(path: str, max_entries: int) -> ParseCache:
+    return ParseCache(path, max_entries)
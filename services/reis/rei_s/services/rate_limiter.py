@@ -0,0 +1,217 @@
+import asyncio
+from functools import lru_cache
+import re
+from threading import Lock
+import time
+from typing import Awaitable, Callable, TypeVar
+
+import httpx
+from langchain_core.embeddings import Embeddings
+import openai
+
+from rei_s import logger
+from rei_s.metrics.metrics import embeddings_rate_limited_counter
+
+
+T = TypeVar("T")
+
+# a rough estimate for the tokens of a text, which is good enough for budgeting and avoids a tokenizer
+CHARS_PER_TOKEN = 4
+
+# the limiter waits in between, so retries are cheap, but we do not want to retry forever
+MAX_RATE_LIMIT_RETRIES = 100
+
+# used if the provider does not tell us, how long to wait
+DEFAULT_BACKOFF_SECONDS = 10.0
+
+# other transient errors, e.g., a lost connection, are retried like the clients of openai do by default
+MAX_TRANSIENT_RETRIES = 2
+TRANSIENT_BACKOFF_SECONDS = 0.5
+TRANSIENT_ERRORS = (openai.APIConnectionError, openai.InternalServerError)
+
+
+class TokenBucket:
+    """Budget of `per_minute` units, which refills continuously.
+
+    Callers reserve their units upfront. The bucket may run into debt, the returned wait time
+    pays back the debt, such that callers are served in the order of their reservations.
+    """
+
+    def __init__(self, per_minute: int) -> None:
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        self.refill(now)
+        self.level -= amount
+        return max(0.0, -self.level / self.rate)
+
+    def limit(self, remaining: float, now: float) -> None:
+        """The provider knows better, e.g., because other services share the same quota"""
+        self.refill(now)
+        self.level = min(self.level, remaining)
+
+
+class RateLimiter:
+    """Shared limit for requests and tokens per minute of all threads of the process"""
+
+    def __init__(self, requests_per_minute: int | None, tokens_per_minute: int | None) -> None:
+        self.lock = Lock()
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.paused_until = 0.0
+
+    def reserve(self, tokens: int) -> float:
+        """Reserves the budget for a request and returns the seconds to wait before sending it"""
+        with self.lock:
+            now = time.monotonic()
+            wait = max(0.0, self.paused_until - now)
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1, now))
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.reserve(tokens, now))
+            return wait
+
+    def acquire(self, tokens: int) -> None:
+        time.sleep(self.reserve(tokens))
+        # another thread may have hit the rate limit in the meantime
+        while (wait := self.paused_until - time.monotonic()) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int) -> None:
+        await asyncio.sleep(self.reserve(tokens))
+        while (wait := self.paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(wait)
+
+    def backoff(self, seconds: float) -> None:
+        """Pauses all requests, instead of letting every thread run into the rate limit on its own"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def observe_headers(self, headers: httpx.Headers) -> None:
+        """Adapts to the `x-ratelimit-*` headers, which OpenAI and Azure OpenAI send with every response"""
+        with self.lock:
+            now = time.monotonic()
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                remaining = parse_float(headers.get(f"x-ratelimit-remaining-{kind}"))
+                if remaining is None:
+                    continue
+                if bucket is not None:
+                    bucket.limit(remaining, now)
+                if remaining <= 0:
+                    reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                    self.paused_until = max(self.paused_until, now + (reset or DEFAULT_BACKOFF_SECONDS))
+
+    def observe_response(self, response: httpx.Response) -> None:
+        self.observe_headers(response.headers)
+        if response.status_code == 429:
+            self.backoff(get_retry_after(response.headers))
+
+    async def aobserve_response(self, response: httpx.Response) -> None:
+        self.observe_response(response)
+
+
+def parse_float(value: str | None) -> float | None:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def parse_duration(value: str | None) -> float | None:
+    """Parses durations like `20ms`, `1s` or `6m0s`"""
+    if not value:
+        return None
+
+    factors = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", value)
+    if not parts:
+        return parse_float(value)
+    return sum(float(number) * factors[unit] for number, unit in parts)
+
+
+def get_retry_after(headers: httpx.Headers) -> float:
+    retry_after_ms = parse_float(headers.get("retry-after-ms"))
+    if retry_after_ms is not None:
+        return retry_after_ms / 1000
+    return parse_float(headers.get("retry-after")) or DEFAULT_BACKOFF_SECONDS
+
+
+@lru_cache
+def get_rate_limiter(name: str, requests_per_minute: int | None, tokens_per_minute: int | None) -> RateLimiter:
+    """One limiter per embedding model, it is shared by all clients of the process"""
+    return RateLimiter(requests_per_minute, tokens_per_minute)
+
+
+def estimate_tokens(texts: list[str]) -> int:
+    return sum(len(text) // CHARS_PER_TOKEN + 1 for text in texts)
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """Embeddings, which wait for the budget of the rate limiter before calling the wrapped provider"""
+
+    def __init__(self, embeddings: Embeddings, rate_limiter: RateLimiter) -> None:
+        self.embeddings = embeddings
+        self.rate_limiter = rate_limiter
+
+    def _on_rate_limit(self, error: openai.RateLimitError, retries: int) -> None:
+        embeddings_rate_limited_counter.inc()
+        if retries > MAX_RATE_LIMIT_RETRIES:
+            raise error
+        retry_after = get_retry_after(error.response.headers)
+        logger.warning(f"Embeddings are rate limited, pausing for {retry_after}s")
+        self.rate_limiter.backoff(retry_after)
+
+    @staticmethod
+    def _on_transient_error(error: Exception, retries: int) -> float:
+        """Returns the time to wait before the request is sent again, only this request waits"""
+        if retries > MAX_TRANSIENT_RETRIES:
+            raise error
+        logger.warning(f"Embedding failed with {error!r}, retrying")
+        return float(TRANSIENT_BACKOFF_SECONDS * 2 ** (retries - 1))
+
+    def _call(self, texts: list[str], function: Callable[[], T]) -> T:
+        retries = 0
+        transient_retries = 0
+        while True:
+            self.rate_limiter.acquire(estimate_tokens(texts))
+            try:
+                return function()
+            except openai.RateLimitError as e:
+                retries += 1
+                self._on_rate_limit(e, retries)
+            except TRANSIENT_ERRORS as e:
+                transient_retries += 1
+                time.sleep(self._on_transient_error(e, transient_retries))
+
+    async def _acall(self, texts: list[str], function: Callable[[], Awaitable[T]]) -> T:
+        retries = 0
+        transient_retries = 0
+        while True:
+            await self.rate_limiter.aacquire(estimate_tokens(texts))
+            try:
+                return await function()
+            except openai.RateLimitError as e:
+                retries += 1
+                self._on_rate_limit(e, retries)
+            except TRANSIENT_ERRORS as e:
+                transient_retries += 1
+                await asyncio.sleep(self._on_transient_error(e, transient_retries))
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._call(texts, lambda: self.embeddings.embed_documents(texts))
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._call([text], lambda: self.embeddings.embed_query(text))
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self._acall(texts, lambda: self.embeddings.aembed_documents(texts))
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self._acall([text], lambda: self.embeddings.aembed_query(text))
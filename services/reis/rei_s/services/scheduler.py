@@ -0,0 +1,121 @@
+from collections import deque
+from concurrent.futures import Executor, Future
+from threading import Condition, Thread
+import time
+from typing import Any, Callable, Literal, Mapping, TypeVar
+
+from rei_s.config import Config
+from rei_s.metrics.metrics import scheduler_queue_depth_gauge, scheduler_wait_histogram
+
+
+T = TypeVar("T")
+
+# * interactive: processing, while a user waits for the result, e.g., previews of attachments in the chat
+# * search: work around searches, e.g., fetching the content of documents
+# * bulk: adding files to the vector store
+Lane = Literal["interactive", "search", "bulk"]
+
+Task = tuple[float, Future[Any], Callable[..., Any], tuple[Any, ...], dict[str, Any]]
+
+
+def get_lane_weights(config: Config) -> dict[Lane, int]:
+    return {
+        "interactive": config.scheduler_weight_interactive,
+        "search": config.scheduler_weight_search,
+        "bulk": config.scheduler_weight_bulk,
+    }
+
+
+class PriorityExecutor(Executor):
+    """Thread pool, which serves its lanes by their weight instead of first come, first served.
+
+    A lane with weight 8 gets 8 tasks started for every task of a lane with weight 1, as long as both have
+    queued tasks (stride scheduling). Idle lanes do not collect credit, so they cannot starve the others later.
+    Running tasks are not interrupted, the lanes only decide which queued task gets the next free thread.
+    Therefore `reserved_workers` additional threads only serve the interactive and search lanes, which are
+    not blocked by long running bulk tasks.
+    `submit` uses the bulk lane, such that code, which only knows the `Executor` interface, has the lowest priority.
+    """
+
+    def __init__(self, max_workers: int, weights: Mapping[Lane, int], reserved_workers: int = 0) -> None:
+        self.weights = dict(weights)
+        self.condition = Condition()
+        self.queues: dict[Lane, deque[Task]] = {lane: deque() for lane in self.weights}
+        self.passes: dict[Lane, float] = {lane: 0.0 for lane in self.weights}
+        self.virtual_time = 0.0
+        self.is_shutdown = False
+
+        all_lanes: tuple[Lane, ...] = ("interactive", "search", "bulk")
+        reserved_lanes: tuple[Lane, ...] = ("interactive", "search")
+        self.threads = [
+            Thread(target=self.work, args=(all_lanes,), name=f"worker-{i}", daemon=True) for i in range(max_workers)
+        ] + [
+            Thread(target=self.work, args=(reserved_lanes,), name=f"reserved-worker-{i}", daemon=True)
+            for i in range(reserved_workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> Future[T]:
+        return self.submit_to_lane("bulk", fn, *args, **kwargs)
+
+    def submit_to_lane(self, lane: Lane, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> Future[T]:
+        future: Future[T] = Future()
+        with self.condition:
+            if self.is_shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+
+            queue = self.queues[lane]
+            if not queue:
+                self.passes[lane] = max(self.passes[lane], self.virtual_time)
+            queue.append((time.monotonic(), future, fn, args, kwargs))
+            scheduler_queue_depth_gauge.labels(lane).inc()
+            # not every thread serves every lane, so all of them have to look at the queues
+            self.condition.notify_all()
+
+        return future
+
+    def next_task(self, served_lanes: tuple[Lane, ...]) -> tuple[Lane, Task] | None:
+        with self.condition:
+            while not (lanes := [lane for lane in served_lanes if self.queues[lane]]):
+                if self.is_shutdown:
+                    return None
+                self.condition.wait()
+
+            lane = min(lanes, key=lambda lane: self.passes[lane])
+            self.virtual_time = self.passes[lane]
+            self.passes[lane] += 1 / self.weights[lane]
+            return lane, self.queues[lane].popleft()
+
+    def work(self, served_lanes: tuple[Lane, ...]) -> None:
+        while (task := self.next_task(served_lanes)) is not None:
+            lane, (submitted_at, future, fn, args, kwargs) = task
+            scheduler_queue_depth_gauge.labels(lane).dec()
+            scheduler_wait_histogram.labels(lane).observe(time.monotonic() - submitted_at)
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self.condition:
+            self.is_shutdown = True
+            if cancel_futures:
+                for lane, queue in self.queues.items():
+                    while queue:
+                        queue.popleft()[1].cancel()
+                        scheduler_queue_depth_gauge.labels(lane).dec()
+            self.condition.notify_all()
+
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+
+def create_executor(config: Config) -> PriorityExecutor:
+    return PriorityExecutor(config.workers, get_lane_weights(config), config.scheduler_reserved_workers)
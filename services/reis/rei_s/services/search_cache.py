@@ -0,0 +1,90 @@
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+import time
+from typing import Hashable, List
+
+from langchain_core.documents import Document
+
+from rei_s.metrics.metrics import search_cache_hits_counter, search_cache_misses_counter
+
+
+# The generation of a search scope, a cached result is only valid, while the generation did not change
+Generation = tuple[int, int]
+
+
+class SearchCache:
+    """In-memory cache for search results, which is invalidated by uploads and deletions.
+
+    Instead of looking for the affected entries, changes increment generation counters:
+    * adding a file increments the counter of its bucket and the counter for searches across all buckets
+    * deleting a file increments the counter of the whole index, since we do not know the bucket of the file
+    Entries with an outdated generation are treated as missing and eventually evicted.
+    """
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = Lock()
+        self.entries: OrderedDict[Hashable, tuple[float, Generation, List[Document]]] = OrderedDict()
+        self.index_generations: dict[Hashable, int] = {}
+        # `None` as bucket is the scope of searches across all buckets.
+        # The generations are taken from a counter, and only the most recently changed buckets are kept.
+        # Buckets without a generation have the highest generation of the dropped buckets, such that an
+        # entry of a dropped bucket is not valid again.
+        self.bucket_generations: OrderedDict[tuple[Hashable, str | None], int] = OrderedDict()
+        self.dropped_generation = 0
+        self.counter = 0
+
+    def generation(self, index: Hashable, bucket: str | None) -> Generation:
+        """Has to be taken before searching, such that changes during the search invalidate the result"""
+        with self.lock:
+            return (
+                self.index_generations.get(index, 0),
+                self.bucket_generations.get((index, bucket), self.dropped_generation),
+            )
+
+    def get(self, index: Hashable, bucket: str | None, key: Hashable) -> List[Document] | None:
+        generation = self.generation(index, bucket)
+        with self.lock:
+            entry = self.entries.get((index, key))
+            if entry is None or entry[0] < time.monotonic() or entry[1] != generation:
+                self.entries.pop((index, key), None)
+                search_cache_misses_counter.inc()
+                return None
+
+            self.entries.move_to_end((index, key))
+            search_cache_hits_counter.inc()
+            # the callers may modify the documents
+            return [doc.model_copy(deep=True) for doc in entry[2]]
+
+    def set(self, index: Hashable, key: Hashable, generation: Generation, documents: List[Document]) -> None:
+        with self.lock:
+            self.entries[(index, key)] = (
+                time.monotonic() + self.ttl,
+                generation,
+                [doc.model_copy(deep=True) for doc in documents],
+            )
+            self.entries.move_to_end((index, key))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate_bucket(self, index: Hashable, bucket: str | None) -> None:
+        with self.lock:
+            self.counter += 1
+            for scope in [(index, bucket), (index, None)]:
+                self.bucket_generations[scope] = self.counter
+                self.bucket_generations.move_to_end(scope)
+
+            while len(self.bucket_generations) > self.max_entries:
+                _, generation = self.bucket_generations.popitem(last=False)
+                self.dropped_generation = max(self.dropped_generation, generation)
+
+    def invalidate_index(self, index: Hashable) -> None:
+        with self.lock:
+            self.index_generations[index] = self.index_generations.get(index, 0) + 1
+
+
+@lru_cache
+def get_search_cache(max_entries: int, ttl: float) -> SearchCache:
+    return SearchCache(max_entries, ttl)
@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
+import asyncio
 from typing import List
 
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from pydantic import BaseModel
 
 
@@ -11,18 +13,64 @@ class StoreFilter(BaseModel):
 
 
 class StoreAdapter(ABC):
+    # the embeddings the store was created with, used for embedding queries outside of the store
+    embeddings: Embeddings | None = None
+
     @abstractmethod
-    def add_documents(self, documents: list[Document]) -> None:
+    def add_documents(self, documents: list[Document], embeddings: list[list[float]] | None = None) -> None:
+        """Adds the documents to the store, they are embedded by the store, if no embeddings are given"""
         raise NotImplementedError
 
     @abstractmethod
     def delete(self, doc_id: str) -> None:
         raise NotImplementedError
 
+    @abstractmethod
+    def delete_many(self, doc_ids: List[str]) -> None:
+        """Deletes the chunks of all documents at once"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_chunks(self, ids: List[str]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_chunk_hashes(self, doc_id: str) -> dict[str, str | None]:
+        """Returns the ids of the chunks of the document with their `content_hash` (`None` for older chunks)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_document_chunks(self, doc_id: str) -> list[tuple[Document, list[float]]]:
+        """Returns the chunks of the document with their embeddings"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def reindex(self) -> None:
+        """Rebuilds the vector index of the store"""
+        raise NotImplementedError
+
     @abstractmethod
     def similarity_search(self, query: str, k: int = 4, search_filter: StoreFilter | None = None) -> List[Document]:
         raise NotImplementedError
 
+    async def asimilarity_search(
+        self, query: str, k: int = 4, search_filter: StoreFilter | None = None
+    ) -> List[Document]:
+        """Stores without an async client run the sync search in a thread"""
+        return await asyncio.to_thread(self.similarity_search, query, k, search_filter)
+
+    @abstractmethod
+    def similarity_search_by_vector(
+        self, embedding: list[float], k: int = 4, search_filter: StoreFilter | None = None
+    ) -> List[Document]:
+        raise NotImplementedError
+
+    async def asimilarity_search_by_vector(
+        self, embedding: list[float], k: int = 4, search_filter: StoreFilter | None = None
+    ) -> List[Document]:
+        """Stores without an async client run the sync search in a thread"""
+        return await asyncio.to_thread(self.similarity_search_by_vector, embedding, k, search_filter)
+
     @abstractmethod
     def get_documents(self, ids: List[str]) -> List[Document]:
         raise NotImplementedError
@@ -1,3 +1,7 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable
+
 from langchain_core.embeddings.embeddings import Embeddings
 
 from rei_s.config import Config
@@ -7,6 +11,13 @@ from rei_s.services.stores.devnull_store import DevNullStoreAdapter
 from rei_s.services.stores.pgvector import PGVectorStoreAdapter
 
 
+# Process wide registry of warm store adapters, the least recently used adapters are dropped
+stores: OrderedDict[tuple[Config, str | None], StoreAdapter] = OrderedDict()
+# locks of the adapters, which are being created
+creation_locks: dict[tuple[Config, str | None], Lock] = {}
+stores_lock = Lock()
+
+
 def get_store(
     config: Config,
     embeddings: Embeddings,
@@ -20,3 +31,65 @@ def get_store(
         return DevNullStoreAdapter.create(config=config, embeddings=embeddings, index_name=index_name)
     else:
         raise ValueError(f"Store type {config.store_type} not supported")
+
+
+def resolve_index_name(config: Config, index_name: str | None) -> str | None:
+    if index_name is not None:
+        return index_name
+    if config.store_type == "pgvector":
+        return config.store_pgvector_index_name
+    if config.store_type == "azure-ai-search":
+        return config.store_azure_ai_search_service_index_name
+    return None
+
+
+def get_cached_store(
+    config: Config,
+    index_name: str | None,
+    create: Callable[[], StoreAdapter],
+) -> StoreAdapter:
+    key = (config, resolve_index_name(config, index_name))
+
+    with stores_lock:
+        store = lookup_store(key)
+        if store is not None:
+            return store
+        creation_lock = creation_locks.setdefault(key, Lock())
+
+    # Creating an adapter is expensive (e.g., it creates the collection or index if needed),
+    # so we hold a lock to avoid creating the same adapter in several threads at once.
+    # It is a lock per adapter, such that the lookups of other adapters do not wait for the creation.
+    with creation_lock:
+        with stores_lock:
+            store = lookup_store(key)
+            if store is not None:
+                return store
+
+        try:
+            store = create()
+        except BaseException:
+            with stores_lock:
+                creation_locks.pop(key, None)
+            raise
+
+        with stores_lock:
+            stores[key] = store
+            creation_locks.pop(key, None)
+            while len(stores) > config.store_cache_size:
+                stores.popitem(last=False)
+
+        return store
+
+
+def lookup_store(key: tuple[Config, str | None]) -> StoreAdapter | None:
+    """Returns the cached adapter and marks it as recently used, the caller holds `stores_lock`"""
+    store = stores.get(key)
+    if store is not None:
+        stores.move_to_end(key)
+    return store
+
+
+def clear_store_cache() -> None:
+    with stores_lock:
+        stores.clear()
+        creation_locks.clear()
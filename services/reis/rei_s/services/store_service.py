@@ -1,35 +1,56 @@
-import multiprocessing as mp
-from typing import Any, Generator, List
-from math import ceil
+import asyncio
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+from itertools import batched, islice
+import json
+from typing import Any, Callable, Generator, Hashable, Iterable, Iterator, List
+import uuid
 
 from fastapi import HTTPException
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 
 from rei_s import logger
 from rei_s.services.formats.utils import ProcessingError
-from rei_s.services.multiprocess_utils import process_file_in_process
-from rei_s.services.embeddings_provider import get_embeddings
+from rei_s.services.checkpoints import CheckpointStore, get_checkpoint_store
+from rei_s.services.multiprocess_utils import iter_batches_in_process, load_file_in_process, reset_process_pool
+from rei_s.services.parse_cache import ParseCache, get_parse_cache
+from rei_s.services.embeddings_cache import aembed_queries, normalize_query
+from rei_s.services.embeddings_provider import get_embeddings, get_embeddings_model_name
+from rei_s.services.ingest_registry import IngestRegistry, get_ingest_registry
 from rei_s.config import Config
 from rei_s.services.store_adapter import StoreAdapter, StoreFilter
-from rei_s.services.store_provider import get_store
-from rei_s.types.dtos import SourceDto, ChunkDto, DocumentDto
+from rei_s.services.search_cache import Generation, SearchCache, get_search_cache
+from rei_s.services.store_provider import get_cached_store, get_store, resolve_index_name
+from rei_s.types.dtos import BulkUploadFileResult, FileUpdateResult, SearchQuery, SourceDto, ChunkDto, DocumentDto
 from rei_s.types.source_file import SourceFile
 from rei_s.services.formats.abstract_format_provider import AbstractFormatProvider
 from rei_s.services.formats import get_format_provider_mappings, get_format_providers
-from rei_s.metrics.metrics import files_processed_counter
+from rei_s.metrics.metrics import files_deduplicated_counter, files_processed_counter
 
 
-def batched(iterable: List[Document], n: int) -> Generator[List[Document], None, None]:
-    for i in range(0, len(iterable), n):
-        yield iterable[i : i + n]
+# metadata of the stored chunks, which is not returned by searches
+INTERNAL_METADATA_KEYS = ["bucket", "content_hash", "file_hash"]
+
+# number of chunks, which are embedded and stored at once by bulk uploads, if `BATCH_SIZE` is not set
+DEFAULT_BULK_BATCH_SIZE = 256
+
+# namespace of the chunk ids, which are derived from the file and the position of the chunk
+CHUNK_ID_NAMESPACE = uuid.UUID("5b0f3c9e-2d1a-4c67-9a0e-7f3b8d21c4e6")
 
 
 def get_vector_store(
     config: Config,
     index_name: str | None,
 ) -> StoreAdapter:
-    embeddings = get_embeddings(config)
-    vector_store = get_store(config=config, embeddings=embeddings, index_name=index_name)
+    # the embeddings client is only created, if there is no warm adapter for the index
+    vector_store = get_cached_store(
+        config,
+        index_name,
+        lambda: get_store(config=config, embeddings=get_embeddings(config), index_name=index_name),
+    )
 
     if vector_store is None:
         raise RuntimeError("Store service has not been configured")
@@ -37,6 +58,58 @@ def get_vector_store(
     return vector_store
 
 
+def get_configured_search_cache(config: Config) -> SearchCache | None:
+    if config.search_cache_size == 0:
+        return None
+    return get_search_cache(config.search_cache_size, config.search_cache_ttl)
+
+
+def get_search_cache_index(config: Config, index_name: str | None) -> Hashable:
+    return config.store_type, resolve_index_name(config, index_name)
+
+
+def get_configured_parse_cache(config: Config) -> ParseCache | None:
+    if not config.parse_cache_enabled:
+        return None
+    return get_parse_cache(config.get_parse_cache_path(), config.parse_cache_max_entries)
+
+
+def get_configured_checkpoint_store(config: Config) -> CheckpointStore | None:
+    if not config.ingestion_checkpoints_enabled:
+        return None
+    return get_checkpoint_store(config.get_ingestion_checkpoints_path())
+
+
+def get_checkpoint_scope(config: Config, index_name: str | None) -> str:
+    return f"{config.store_type}/{resolve_index_name(config, index_name)}"
+
+
+def get_configured_ingest_registry(config: Config) -> IngestRegistry | None:
+    if not config.ingestion_dedupe_enabled:
+        return None
+    return get_ingest_registry(config.get_ingestion_dedupe_path())
+
+
+def get_ingest_index_name(config: Config, index_name: str | None) -> str:
+    # stores without index names have a single index
+    return resolve_index_name(config, index_name) or ""
+
+
+def get_ingest_fingerprint(config: Config, file: SourceFile, chunk_size: int | None = None) -> str | None:
+    """Identifies the chunks and embeddings of a file, which only depend on the file, its format (and the version
+    of its parser), the chunk size and the model.
+
+    Returns `None`, if the format of the file is not supported.
+    """
+    for format_ in get_format_providers(config):
+        if format_.supports(file):
+            return (
+                f"{config.store_type}/{format_.name}/{format_.version}/{chunk_size or 'default'}/"
+                f"{get_embeddings_model_name(config)}/{file.content_hash}"
+            )
+    return None
+
+
 def get_file_name_extensions(config: Config) -> list[str]:
     file_name_extensions: list[str] = []
     for format_provider in get_format_providers(config):
@@ -50,9 +123,12 @@ def process_file(config: Config, file: SourceFile, chunk_size: int | None = None
     logger.info(f"Processing file: {file.id}")
     chunks_with_metadata = [
         chunk
-        for batch, _, _ in generate_batches(config, file, doc_id=file.id, chunk_size=chunk_size)
+        for batch, _, _ in generate_batches(config, file, doc_id=file.id, chunk_size=chunk_size, use_parse_cache=True)
         for chunk in batch
     ]
+    # the content hash is only needed to store the chunks
+    for chunk in chunks_with_metadata:
+        del chunk.metadata["content_hash"]
     files_processed_counter.inc()
     logger.info(f"Completed file: {file.id}")
     return chunks_with_metadata
@@ -66,33 +142,92 @@ def process_and_add_file(config: Config, file: SourceFile, bucket: str, index_na
     return True
 
 
-def process_file_synchronously(
-    format_: AbstractFormatProvider, file: SourceFile, chunk_size: int | None, threshold: int = 10**5
-) -> List[Document]:
+def process_and_update_file(config: Config, file: SourceFile, bucket: str, index_name: str | None) -> FileUpdateResult:
+    logger.info(f"Processing and update file: {file.id}")
+    result = update_file(config, file, bucket, file.id, index_name)
+    files_processed_counter.inc()
+    logger.info(f"Completed file: {file.id} ({result.added} added, {result.kept} kept, {result.deleted} deleted)")
+    return result
+
+
+def process_and_add_files(
+    config: Config, files: List[SourceFile], bucket: str, index_name: str | None
+) -> List[BulkUploadFileResult]:
+    logger.info(f"Processing and add {len(files)} files")
+    results = add_files(config, files, bucket, index_name)
+    files_processed_counter.inc(len(files))
+    logger.info(f"Completed {len(files)} files")
+    return results
+
+
+def iter_chunk_batches(
+    config: Config,
+    format_: AbstractFormatProvider,
+    file: SourceFile,
+    chunk_size: int | None,
+    use_parse_cache: bool = False,
+) -> Generator[List[Document], None, None]:
     # this function tries to optimize for performance,
     # since the process step is the single CPU intensive part
-    # * small files are processed in the same thread to avoid overhead of starting a new process,
-    #   pickling, copying and unpickling the file
-    # * large files will start a new process to avoid the GIL
-    #   this will also lead python to release the RAM used for the processing back to the operating system
+    # * small files are processed in the same thread to avoid overhead of pickling, copying and unpickling the file
+    # * large files are processed in the long living process pool to avoid the GIL
+    #   the pool processes are recycled regularly, which releases the RAM used for the processing
+    #   back to the operating system
+    # If a batch size is configured, the chunks are passed on batch by batch while the file is still parsed,
+    # such that only a bounded number of chunks is held in memory.
+
+    parse_cache = get_configured_parse_cache(config) if use_parse_cache and format_.cacheable else None
+    if parse_cache is not None:
+        yield from iter_cached_chunk_batches(config, parse_cache, format_, file, chunk_size)
+        return
+
+    if not format_.multiprocessable or file.size < config.filesize_threshold:
+        if config.batch_size is None:
+            yield format_.process_file(file, chunk_size)
+        else:
+            for batch in batched(format_.iter_chunks(file, chunk_size), config.batch_size):
+                yield list(batch)
+        return
 
-    if not format_.multiprocessable or file.size < threshold:
-        return format_.process_file(file, chunk_size)
+    try:
+        yield from iter_batches_in_process(config, format_, file, chunk_size, config.batch_size)
+    except BrokenProcessPool:
+        # a process of the pool died, e.g., killed by the OOM killer, this leaves the whole pool unusable
+        reset_process_pool()
+        raise
+
+
+def iter_cached_chunk_batches(
+    config: Config, parse_cache: ParseCache, format_: AbstractFormatProvider, file: SourceFile, chunk_size: int | None
+) -> Generator[List[Document], None, None]:
+    """Splits the cached elements of the file, the file is only parsed, if its elements are not cached yet"""
+    # the elements are only the same, if the parsing did not change
+    key = f"{format_.name}/{format_.version}"
+    elements = parse_cache.get(key, file.content_hash)
+    if elements is None:
+        # the elements have to be complete before they are cached, so they are not streamed
+        if not format_.multiprocessable or file.size < config.filesize_threshold:
+            elements = list(format_.load(file))
+        else:
+            try:
+                elements = load_file_in_process(config, format_, file)
+            except BrokenProcessPool:
+                reset_process_pool()
+                raise
+        parse_cache.set(key, file.content_hash, elements)
+
+    chunks = format_.split(elements, chunk_size)
+    if config.batch_size is None:
+        yield list(chunks)
     else:
-        ctx = mp.get_context("spawn")
-        queue = ctx.Queue()
-        process = ctx.Process(target=process_file_in_process, args=(format_, file, chunk_size, queue))
+        for batch in batched(chunks, config.batch_size):
+            yield list(batch)
 
-        process.start()
-        chunks_or_exception = queue.get()
-        process.join()
 
-        if isinstance(chunks_or_exception, Exception):
-            raise chunks_or_exception
-        else:
-            chunks: list[Document] = chunks_or_exception
-
-        return chunks
+def get_content_hash(page_content: str, metadata: dict[str, Any]) -> str:
+    """Identifies a chunk, whose content and metadata did not change between two versions of a file"""
+    serialized = json.dumps([page_content, metadata], sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode()).hexdigest()
 
 
 def generate_batches(
@@ -101,70 +236,473 @@ def generate_batches(
     bucket: str | None = None,
     doc_id: str | None = None,
     chunk_size: int | None = None,
-) -> Generator[tuple[List[Document], int, int], None, None]:
+    use_parse_cache: bool = False,
+) -> Generator[tuple[List[Document], int, int | None], None, None]:
+    """Yields the batches of chunks with their index and the number of batches.
+
+    The number of batches is `None`, if the chunks are streamed in batches, since it is unknown until
+    the file was completely parsed.
+    """
     for format_ in get_format_providers(config):
         if format_.supports(file):
-            try:
-                chunks = process_file_synchronously(format_, file, chunk_size, config.filesize_threshold)
-            except ProcessingError as e:
-                logger.warning(f"Failed processing file `{doc_id}`: {e.message}")
-                raise HTTPException(status_code=e.status, detail=f"Processing failed: {e.message}") from e
-            except Exception as e:
-                # catchall, since the format_providers
-                # yield individual errors from special exception classes to ValueError
-                logger.warning(f"Failed processing file `{doc_id}`: {e!r}")
-                raise HTTPException(status_code=400, detail="Processing failed") from e
-
-            if len(chunks) > 0:
-                batch_size = config.batch_size if config.batch_size else len(chunks)
-                num_batches = ceil(len(chunks) / batch_size)
-                for index, chunk_batch in enumerate(batched(chunks, batch_size)):
-                    with_metadata = [
-                        Document(
-                            page_content=x.page_content,
-                            metadata={
-                                **x.metadata,
-                                "format": format_.name,
-                                "mime_type": file.mime_type,
-                                "doc_id": doc_id,
-                                "bucket": bucket,
-                                "source": file.file_name,
-                            },
-                        )
-                        for x in chunk_batch
-                    ]
-
-                    yield with_metadata, index, num_batches
-
-            return
+            num_batches = None if config.batch_size else 1
+            batches = iter_chunk_batches(config, format_, file, chunk_size, use_parse_cache)
+            index = 0
+            while True:
+                try:
+                    chunk_batch = next(batches, None)
+                except ProcessingError as e:
+                    logger.warning(f"Failed processing file `{doc_id}`: {e.message}")
+                    raise HTTPException(status_code=e.status, detail=f"Processing failed: {e.message}") from e
+                except Exception as e:
+                    # catchall, since the format_providers
+                    # yield individual errors from special exception classes to ValueError
+                    logger.warning(f"Failed processing file `{doc_id}`: {e!r}")
+                    raise HTTPException(status_code=400, detail="Processing failed") from e
+
+                if chunk_batch is None:
+                    return
+                if len(chunk_batch) == 0:
+                    continue
+
+                with_metadata = []
+                for x in chunk_batch:
+                    metadata = {
+                        **x.metadata,
+                        "format": format_.name,
+                        "mime_type": file.mime_type,
+                        "doc_id": doc_id,
+                        "bucket": bucket,
+                        "source": file.file_name,
+                    }
+                    metadata["content_hash"] = get_content_hash(x.page_content, metadata)
+                    with_metadata.append(Document(page_content=x.page_content, metadata=metadata))
+
+                yield with_metadata, index, num_batches
+                index += 1
 
     raise HTTPException(status_code=415, detail="File format not supported.")
 
 
-def add_file(config: Config, file: SourceFile, bucket: str, doc_id: str, index_name: str | None = None) -> None:
+# called with the index of the batch and the number of batches (if known), after the batch was stored
+BatchCallback = Callable[[int, int | None], None]
+
+
+def get_chunk_id(bucket: str, doc_id: str, content_hash: str, position: int) -> str:
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{bucket}/{doc_id}/{content_hash}/{position}"))
+
+
+def iter_missing_batches(
+    batches: Iterable[tuple[List[Document], int, int | None]],
+    bucket: str,
+    doc_id: str,
+    content_hash: str,
+    stored: set[int],
+    existing_ids: set[str],
+    on_batch_added: BatchCallback | None = None,
+) -> Generator[tuple[List[Document], int, int | None], None, None]:
+    """Assigns the chunk ids and skips the batches, which were stored by a previous attempt.
+
+    A batch is only skipped, if its chunks are still in the store (`existing_ids`), since another instance
+    may have deleted the document after the checkpoint was recorded.
+    """
+    position = 0
+    for batch, index, num_batches in batches:
+        for offset, doc in enumerate(batch):
+            doc.id = get_chunk_id(bucket, doc_id, content_hash, position + offset)
+            # the file of the chunk, which is not part of the content hash of the chunk itself
+            doc.metadata["file_hash"] = content_hash
+        position += len(batch)
+
+        if index in stored and all(doc.id in existing_ids for doc in batch):
+            if on_batch_added is not None:
+                on_batch_added(index, num_batches)
+            continue
+
+        yield batch, index, num_batches
+
+
+def add_file(
+    config: Config,
+    file: SourceFile,
+    bucket: str,
+    doc_id: str,
+    index_name: str | None = None,
+    on_batch_added: BatchCallback | None = None,
+) -> None:
+    """Adds the chunks of the file to the store.
+
+    The ids of the chunks are derived from the file, such that adding the same file again overwrites
+    its chunks instead of duplicating them. With checkpoints, a retry after a failure only embeds
+    and stores the batches, which are still missing. With de-duplication, the chunks of an identical
+    file, which was already added, are copied with their embeddings instead.
+    """
     vector_store = get_vector_store(config=config, index_name=index_name)
-    for batch, index, num_batches in generate_batches(config, file, bucket, doc_id):
-        logger.info(f"add {len(batch)} chunks for doc_id {doc_id}: ({index + 1}/{num_batches})")
-        vector_store.add_documents(batch)
-        logger.info(f"ready with {len(batch)} chunks for doc_id {doc_id}: ({index + 1}/{num_batches})")
+    content_hash = file.content_hash
+
+    checkpoints = get_configured_checkpoint_store(config)
+    scope = get_checkpoint_scope(config, index_name)
+    # the batches are only the same, if the file, the batching and the bucket (part of the chunk ids) are the same
+    fingerprint = f"{bucket}/{content_hash}/{config.batch_size}"
+    stored = checkpoints.get(scope, doc_id, fingerprint) if checkpoints is not None else set()
+    existing_ids: set[str] = set()
+    if stored:
+        logger.info(f"resume doc_id {doc_id}, {len(stored)} batches were already stored")
+        existing_ids = set(vector_store.get_chunk_hashes(doc_id))
+
+    def on_batch_stored(index: int, num_batches: int | None) -> None:
+        if checkpoints is not None:
+            checkpoints.add(scope, doc_id, fingerprint, index)
+        if on_batch_added is not None:
+            on_batch_added(index, num_batches)
+
+    # while a batch is embedded and stored, the next batches are already parsed (in case of the process pool)
+    batches = iter_missing_batches(
+        # a retry does not parse the file again, if its elements are cached
+        generate_batches(config, file, bucket, doc_id, use_parse_cache=True),
+        bucket,
+        doc_id,
+        content_hash,
+        stored,
+        existing_ids,
+        on_batch_added,
+    )
 
+    registry = get_configured_ingest_registry(config)
+    ingest_fingerprint = get_ingest_fingerprint(config, file) if registry is not None else None
 
-def search(
+    try:
+        if registry is not None and ingest_fingerprint is not None:
+            if copy_ingested_file(
+                config, registry, ingest_fingerprint, file, bucket, doc_id, index_name, vector_store, on_batch_added
+            ):
+                return
+            # the document is only complete again, when all batches were stored
+            registry.remove(get_ingest_index_name(config, index_name), doc_id)
+
+        store_batches(config, vector_store, batches, doc_id, on_batch_stored)
+
+        if checkpoints is not None:
+            checkpoints.clear(scope, doc_id)
+        if registry is not None and ingest_fingerprint is not None:
+            registry.add(ingest_fingerprint, get_ingest_index_name(config, index_name), doc_id, bucket)
+    finally:
+        # also if adding failed, since the batches added so far are found by searches
+        search_cache = get_configured_search_cache(config)
+        if search_cache is not None:
+            search_cache.invalidate_bucket(get_search_cache_index(config, index_name), bucket)
+
+
+def copy_ingested_file(
     config: Config,
-    query: str,
-    bucket: str | None,
-    take: int,
-    doc_ids: List[str] | None = None,
+    registry: IngestRegistry,
+    fingerprint: str,
+    file: SourceFile,
+    bucket: str,
+    doc_id: str,
+    index_name: str | None,
+    vector_store: StoreAdapter,
+    on_batch_added: BatchCallback | None = None,
+) -> bool:
+    """Copies the chunks of an identical file, which was already added, instead of parsing and embedding the file.
+
+    Returns `False`, if there is no identical file, whose chunks are still in the store.
+    """
+    target_index = get_ingest_index_name(config, index_name)
+    for source_index, source_doc_id, source_bucket in registry.find(fingerprint):
+        is_same_document = (source_index, source_doc_id) == (target_index, doc_id)
+        source_store = get_vector_store(config=config, index_name=source_index or None)
+        chunks = source_store.get_document_chunks(source_doc_id)
+        if not has_file_content(chunks, file):
+            # the document was deleted or replaced, e.g., by another instance
+            registry.remove(source_index, source_doc_id)
+            continue
+
+        if is_same_document and source_bucket == bucket:
+            logger.info(f"doc_id {doc_id} is already stored with the same content")
+            if on_batch_added is not None:
+                on_batch_added(0, 1)
+            return True
+
+        logger.info(f"copy {len(chunks)} chunks of doc_id {source_doc_id} in '{source_index}' to doc_id {doc_id}")
+        batch_size = config.batch_size or DEFAULT_BULK_BATCH_SIZE
+        num_batches = -(-len(chunks) // batch_size)
+        for index, batch in enumerate(batched(chunks, batch_size)):
+            vector_store.add_documents(
+                [copy_chunk(chunk, file, bucket, doc_id) for chunk, _ in batch],
+                [embedding for _, embedding in batch],
+            )
+            if on_batch_added is not None:
+                on_batch_added(index, num_batches)
+
+        if is_same_document:
+            # the document moved to another bucket, the chunks are part of their ids, so the old ones remain
+            vector_store.delete_chunks([str(chunk.id) for chunk, _ in chunks])
+            search_cache = get_configured_search_cache(config)
+            if search_cache is not None:
+                search_cache.invalidate_bucket(get_search_cache_index(config, index_name), source_bucket)
+
+        registry.add(fingerprint, target_index, doc_id, bucket)
+        files_deduplicated_counter.inc()
+        return True
+
+    return False
+
+
+def has_file_content(chunks: list[tuple[Document, list[float]]], file: SourceFile) -> bool:
+    """Checks, that the recorded document still consists of the chunks of the file"""
+    return bool(chunks) and all(chunk.metadata.get("file_hash") == file.content_hash for chunk, _ in chunks)
+
+
+def copy_chunk(chunk: Document, file: SourceFile, bucket: str, doc_id: str) -> Document:
+    """Moves a chunk of an identical file to the document"""
+    metadata = {key: value for key, value in chunk.metadata.items() if key not in ["content_hash", "file_hash"]}
+    metadata.update(mime_type=file.mime_type, doc_id=doc_id, bucket=bucket, source=file.file_name)
+    metadata["content_hash"] = get_content_hash(chunk.page_content, metadata)
+    metadata["file_hash"] = file.content_hash
+
+    # the id is derived from the copied chunk, such that copying the file again overwrites the chunks
+    chunk_id = str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{bucket}/{doc_id}/{chunk.id}"))
+    return Document(id=chunk_id, page_content=chunk.page_content, metadata=metadata)
+
+
+def update_file(
+    config: Config,
+    file: SourceFile,
+    bucket: str,
+    doc_id: str,
     index_name: str | None = None,
-) -> List[Document]:
+    on_batch_added: BatchCallback | None = None,
+) -> FileUpdateResult:
+    """Replaces the chunks of the document with the chunks of the new version of the file.
+
+    Only chunks, whose content or metadata changed, are embedded and stored. The new chunks are stored,
+    before the vanished chunks are deleted, such that searches find the document during the update.
+    """
     vector_store = get_vector_store(config=config, index_name=index_name)
-    store_filter = StoreFilter(bucket=bucket, doc_ids=doc_ids)
+    content_hash = file.content_hash
 
-    logger.info("start similarity search")
+    # the chunk ids by content hash, a document may contain the same chunk multiple times
+    existing: defaultdict[str | None, list[str]] = defaultdict(list)
+    for chunk_id, chunk_hash in vector_store.get_chunk_hashes(doc_id).items():
+        existing[chunk_hash].append(chunk_id)
+
+    result = FileUpdateResult(added=0, kept=0, deleted=0)
+
+    registry = get_configured_ingest_registry(config)
+    if registry is not None:
+        # the document is only identical to the file, when the update completed
+        registry.remove(get_ingest_index_name(config, index_name), doc_id)
+
+    def iter_changed_batches() -> Generator[tuple[List[Document], int, int | None], None, None]:
+        batches = iter_missing_batches(
+            generate_batches(config, file, bucket, doc_id), bucket, doc_id, content_hash, set(), set()
+        )
+        for batch, index, num_batches in batches:
+            changed = []
+            for doc in batch:
+                if existing[doc.metadata["content_hash"]]:
+                    existing[doc.metadata["content_hash"]].pop()
+                    result.kept += 1
+                else:
+                    changed.append(doc)
+
+            if not changed:
+                if on_batch_added is not None:
+                    on_batch_added(index, num_batches)
+                continue
+
+            result.added += len(changed)
+            yield changed, index, num_batches
+
+    try:
+        store_batches(config, vector_store, iter_changed_batches(), doc_id, on_batch_added)
+
+        vanished = [chunk_id for chunk_ids in existing.values() for chunk_id in chunk_ids]
+        logger.info(f"delete {len(vanished)} vanished chunks of doc_id {doc_id}")
+        vector_store.delete_chunks(vanished)
+        result.deleted = len(vanished)
+
+        ingest_fingerprint = get_ingest_fingerprint(config, file) if registry is not None else None
+        if registry is not None and ingest_fingerprint is not None:
+            registry.add(ingest_fingerprint, get_ingest_index_name(config, index_name), doc_id, bucket)
+    finally:
+        # the document may have been in another bucket before
+        search_cache = get_configured_search_cache(config)
+        if search_cache is not None:
+            search_cache.invalidate_index(get_search_cache_index(config, index_name))
+
+    return result
+
+
+def store_batches(
+    config: Config,
+    vector_store: StoreAdapter,
+    batches: Iterator[tuple[List[Document], int, int | None]],
+    doc_id: str,
+    on_batch_stored: BatchCallback | None = None,
+) -> None:
+    if config.embedding_concurrency > 1:
+        add_batches_concurrently(config, vector_store, batches, doc_id, on_batch_stored)
+        return
+
+    for batch, index, num_batches in batches:
+        logger.info(f"add {len(batch)} chunks for doc_id {doc_id}: ({index + 1}/{num_batches or '?'})")
+        vector_store.add_documents(batch)
+        logger.info(f"ready with {len(batch)} chunks for doc_id {doc_id}: ({index + 1}/{num_batches or '?'})")
+        if on_batch_stored is not None:
+            on_batch_stored(index, num_batches)
+
+
+def embed_batch(embeddings: Embeddings, batch: List[Document]) -> list[list[float]]:
+    return embeddings.embed_documents([doc.page_content for doc in batch])
+
+
+def add_batches_concurrently(
+    config: Config,
+    vector_store: StoreAdapter,
+    batches: Iterator[tuple[List[Document], int, int | None]],
+    doc_id: str,
+    on_batch_added: BatchCallback | None = None,
+) -> None:
+    """Embeds up to `embedding_concurrency` batches at the same time, the embedded batches are written one by one.
+
+    New batches are only taken from the (possibly streaming) parser, when an embedding slot is free again,
+    so a slow embedding endpoint also slows down the parsing instead of piling up chunks in memory.
+    """
+    # the embeddings of the warm adapter share their client and the state of the rate limiter
+    embeddings = vector_store.embeddings
+    if embeddings is None:
+        embeddings = get_embeddings(config)
+    pending: dict[Future[list[list[float]]], tuple[List[Document], int, int | None]] = {}
+
+    def write(future: Future[list[list[float]]]) -> None:
+        batch, index, num_batches = pending.pop(future)
+        vector_store.add_documents(batch, future.result())
+        logger.info(f"ready with {len(batch)} chunks for doc_id {doc_id}: ({index + 1}/{num_batches or '?'})")
+        if on_batch_added is not None:
+            on_batch_added(index, num_batches)
+
+    with ThreadPoolExecutor(max_workers=config.embedding_concurrency, thread_name_prefix="embed") as executor:
+        try:
+            for batch, index, num_batches in batches:
+                logger.info(f"add {len(batch)} chunks for doc_id {doc_id}: ({index + 1}/{num_batches or '?'})")
+                pending[executor.submit(embed_batch, embeddings, batch)] = (batch, index, num_batches)
+
+                while len(pending) >= config.embedding_concurrency:
+                    if config.embedding_ordered_writes:
+                        # dicts keep the insertion order, so the first future belongs to the oldest batch
+                        write(next(iter(pending)))
+                    else:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            write(future)
+
+            while pending:
+                write(next(iter(pending)) if config.embedding_ordered_writes else next(as_completed(pending)))
+        finally:
+            # on errors, we do not embed the batches, which did not start yet
+            for future in pending:
+                future.cancel()
+
+
+def parse_file(config: Config, file: SourceFile, bucket: str) -> List[Document]:
+    return [chunk for batch, _, _ in generate_batches(config, file, bucket, file.id) for chunk in batch]
+
+
+def iter_parsed_files(
+    config: Config, files: List[SourceFile], bucket: str
+) -> Generator[tuple[SourceFile, List[Document] | HTTPException], None, None]:
+    """Parses the files in parallel and yields them in order, with their chunks or the error"""
+    with ThreadPoolExecutor(max_workers=config.workers, thread_name_prefix="parse") as executor:
+        # only a few files are parsed ahead, so the chunks of thousands of files do not pile up in memory
+        pending: deque[tuple[SourceFile, Future[List[Document]]]] = deque()
+        files_iter = iter(files)
+        try:
+            while True:
+                for file in islice(files_iter, 2 * config.workers - len(pending)):
+                    pending.append((file, executor.submit(parse_file, config, file, bucket)))
+                if not pending:
+                    return
+
+                file, future = pending.popleft()
+                try:
+                    yield file, future.result()
+                except HTTPException as e:
+                    yield file, e
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def add_files(
+    config: Config, files: List[SourceFile], bucket: str, index_name: str | None = None
+) -> List[BulkUploadFileResult]:
+    """Adds many (small) files at once.
+
+    The chunks of all files are coalesced into full batches, which saves most of the embedding
+    and store requests compared to adding the files one by one.
+    """
+    vector_store = get_vector_store(config=config, index_name=index_name)
+    batch_size = config.batch_size or DEFAULT_BULK_BATCH_SIZE
+
+    errors: dict[str, HTTPException] = {}
+    # files, of which some chunks may have been added, although adding other chunks failed
+    partially_added: set[str] = set()
+    chunks: List[Document] = []
+
+    def add_batch(batch: List[Document]) -> None:
+        doc_ids = {doc.metadata["doc_id"] for doc in batch}
+        logger.info(f"add {len(batch)} chunks of {len(doc_ids)} files")
+        try:
+            vector_store.add_documents(batch)
+        except Exception as e:
+            logger.warning(f"Failed adding chunks of {len(doc_ids)} files: {e!r}")
+            for doc_id in doc_ids:
+                errors.setdefault(doc_id, HTTPException(status_code=500, detail="Adding the chunks failed"))
+            partially_added.update(doc_ids)
+
+    try:
+        for file, parsed in iter_parsed_files(config, files, bucket):
+            if isinstance(parsed, HTTPException):
+                errors[file.id] = parsed
+                continue
+
+            chunks.extend(parsed)
+            while len(chunks) >= batch_size:
+                add_batch(chunks[:batch_size])
+                del chunks[:batch_size]
+
+        if chunks:
+            add_batch(chunks)
+    finally:
+        search_cache = get_configured_search_cache(config)
+        if search_cache is not None:
+            search_cache.invalidate_bucket(get_search_cache_index(config, index_name), bucket)
+
+    # chunks of failed files may have been added with other batches, we remove them to avoid partial files
+    for doc_id in partially_added:
+        try:
+            vector_store.delete(doc_id)
+        except Exception as e:
+            logger.warning(f"Failed removing chunks of failed file `{doc_id}`: {e!r}")
+
+    return [
+        BulkUploadFileResult(id=file.id, status_code=200, detail=None)
+        if file.id not in errors
+        else BulkUploadFileResult(
+            id=file.id, status_code=errors[file.id].status_code, detail=str(errors[file.id].detail)
+        )
+        for file in files
+    ]
+
+
+def get_search_cache_key(query: str, bucket: str | None, doc_ids: List[str] | None, take: int) -> Hashable:
+    return normalize_query(query), bucket, tuple(doc_ids) if doc_ids is not None else None, take
 
-    docs = vector_store.similarity_search(query, take, store_filter)
 
-    # remove bucket before passing it back
+def clean_search_results(config: Config, docs: List[Document]) -> List[Document]:
+    # remove internal metadata like the bucket before passing it back
     # also call possibly existing cleanup methods for the format
     result: List[Document] = []
     for doc in docs:
@@ -172,16 +710,94 @@ def search(
 
         if provider is not None:
             cleaned = provider.clean_up(doc)
-        try:
-            del cleaned.metadata["bucket"]
-        except KeyError:
-            pass
+        for key in INTERNAL_METADATA_KEYS:
+            cleaned.metadata.pop(key, None)
 
         result.append(cleaned)
 
     return result
 
 
+async def search(
+    config: Config,
+    query: str,
+    bucket: str | None,
+    take: int,
+    doc_ids: List[str] | None = None,
+    index_name: str | None = None,
+) -> List[Document]:
+    search_cache = get_configured_search_cache(config)
+    cache_index = get_search_cache_index(config, index_name)
+    cache_key = get_search_cache_key(query, bucket, doc_ids, take)
+    if search_cache is not None:
+        cached = search_cache.get(cache_index, bucket, cache_key)
+        if cached is not None:
+            return cached
+        generation = search_cache.generation(cache_index, bucket)
+
+    # Creating the adapter of an index for the first time blocks, e.g., to create the collection.
+    # Afterwards this is a cheap lookup, while the embedding and the search itself are awaited.
+    vector_store = await asyncio.to_thread(get_vector_store, config=config, index_name=index_name)
+    store_filter = StoreFilter(bucket=bucket, doc_ids=doc_ids)
+
+    logger.info("start similarity search")
+
+    docs = await vector_store.asimilarity_search(query, take, store_filter)
+    result = clean_search_results(config, docs)
+
+    if search_cache is not None:
+        search_cache.set(cache_index, cache_key, generation, result)
+
+    return result
+
+
+async def search_batch(
+    config: Config,
+    queries: List[SearchQuery],
+    index_name: str | None = None,
+) -> List[List[Document]]:
+    """Searches for several queries at once, the queries are embedded with a single request"""
+    search_cache = get_configured_search_cache(config)
+    cache_index = get_search_cache_index(config, index_name)
+    cache_keys = [get_search_cache_key(q.query, q.bucket, q.files, q.take) for q in queries]
+
+    results: dict[int, List[Document]] = {}
+    generations: dict[int, Generation] = {}
+    for i, (q, cache_key) in enumerate(zip(queries, cache_keys)):
+        if search_cache is not None:
+            cached = search_cache.get(cache_index, q.bucket, cache_key)
+            if cached is not None:
+                results[i] = cached
+                continue
+            generations[i] = search_cache.generation(cache_index, q.bucket)
+
+    missing = [i for i in range(len(queries)) if i not in results]
+    if missing:
+        vector_store = await asyncio.to_thread(get_vector_store, config=config, index_name=index_name)
+        embeddings = vector_store.embeddings
+        if embeddings is None:
+            embeddings = await asyncio.to_thread(get_embeddings, config)
+
+        logger.info(f"start similarity search for {len(missing)} queries")
+
+        vectors = await aembed_queries(embeddings, [queries[i].query for i in missing])
+        found = await asyncio.gather(
+            *[
+                vector_store.asimilarity_search_by_vector(
+                    vector, queries[i].take, StoreFilter(bucket=queries[i].bucket, doc_ids=queries[i].files)
+                )
+                for i, vector in zip(missing, vectors)
+            ]
+        )
+
+        for i, docs in zip(missing, found):
+            results[i] = clean_search_results(config, docs)
+            if search_cache is not None:
+                search_cache.set(cache_index, cache_keys[i], generations[i], results[i])
+
+    return [results[i] for i in range(len(queries))]
+
+
 def get_documents_content(config: Config, ids: List[str], index_name: str | None = None) -> List[str]:
     vector_store = get_vector_store(config=config, index_name=index_name)
     docs = vector_store.get_documents(ids)
@@ -201,6 +817,37 @@ def delete_file(config: Config, doc_id: str, index_name: str | None = None) -> N
     vector_store = get_vector_store(config=config, index_name=index_name)
     logger.info(f"delete chunks with doc_id '{doc_id}'")
     vector_store.delete(doc_id)
+    forget_files(config, [doc_id], index_name)
+
+
+def delete_files(config: Config, doc_ids: List[str], index_name: str | None = None) -> None:
+    vector_store = get_vector_store(config=config, index_name=index_name)
+    logger.info(f"delete chunks of {len(doc_ids)} doc_ids")
+    vector_store.delete_many(doc_ids)
+    forget_files(config, doc_ids, index_name)
+
+
+def forget_files(config: Config, doc_ids: List[str], index_name: str | None) -> None:
+    """Drops everything, which is known about deleted files besides their chunks"""
+    checkpoints = get_configured_checkpoint_store(config)
+    registry = get_configured_ingest_registry(config)
+    for doc_id in doc_ids:
+        if checkpoints is not None:
+            # the stored batches are gone
+            checkpoints.clear(get_checkpoint_scope(config, index_name), doc_id)
+        if registry is not None:
+            registry.remove(get_ingest_index_name(config, index_name), doc_id)
+
+    search_cache = get_configured_search_cache(config)
+    if search_cache is not None:
+        search_cache.invalidate_index(get_search_cache_index(config, index_name))
+
+
+def reindex(config: Config, index_name: str | None = None) -> None:
+    vector_store = get_vector_store(config=config, index_name=index_name)
+    logger.info(f"rebuild the vector index of '{resolve_index_name(config, index_name)}'")
+    vector_store.reindex()
+    logger.info(f"rebuilt the vector index of '{resolve_index_name(config, index_name)}'")
 
 
 def get_file_sources_markdown(results: List[Document]) -> str:
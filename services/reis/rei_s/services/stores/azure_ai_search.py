@@ -1,9 +1,10 @@
+import json
 from threading import Lock
 from typing import Awaitable, List
 
 from langchain_core.documents import Document
 from langchain_core.embeddings.embeddings import Embeddings
-from langchain_community.vectorstores.azuresearch import AzureSearch
+from langchain_community.vectorstores.azuresearch import AzureSearch, _aresults_to_documents, _results_to_documents
 from azure.search.documents.indexes.models import (
     SearchableField,
     SearchField,
@@ -91,21 +92,39 @@ class AzureAISearchStoreAdapter(StoreAdapter):
         instance = cls()
 
         instance.vector_store = azure_vector_store
+        instance.embeddings = embeddings
 
         return instance
 
-    def add_documents(self, documents: list[Document]) -> None:
+    def add_documents(self, documents: list[Document], embeddings: list[list[float]] | None = None) -> None:
         # langchain's abstraction of Azure AI seems to forget the ids and replaces them with the kwarg "key"
         # and langchains interface needs us to provide either no keys or keys for every document
         keys = [doc.id for doc in documents if doc.id is not None]
         if len(keys) > 0 and len(keys) != len(documents):
             raise ValueError("If you give an `id` for any document, you need to give an id for every document")
-        self.vector_store.add_documents(documents, keys=keys)
+
+        if embeddings is None:
+            self.vector_store.add_documents(documents, keys=keys)
+            return
+
+        self.vector_store.add_embeddings(
+            zip([doc.page_content for doc in documents], embeddings),
+            [doc.metadata for doc in documents],
+            keys=keys,
+        )
 
     def delete(self, doc_id: str) -> None:
+        self.delete_many([doc_id])
+
+    def delete_many(self, doc_ids: List[str]) -> None:
         # The `delete` method can only delete by the "key", which is unique, i.e., the chunk id.
-        # To delete by our doc_id, we first need to fetch all chunk_ids of the doc_id.
-        response = self.vector_store.client.search(search_text="*", filter=f"doc_id eq '{doc_id}'", select=["id"])
+        # To delete by our doc_id, we first need to fetch all chunk_ids of the doc_ids.
+        if not doc_ids:
+            return
+
+        response = self.vector_store.client.search(
+            search_text="*", filter=f"search.in(doc_id, '{', '.join(doc_ids)}')", select=["id"]
+        )
         # assure mypy that we get the sync type
         if isinstance(response, Awaitable):
             raise TypeError("Got awaitable response from client. Expected sync Azure AI Search client")
@@ -113,6 +132,42 @@ class AzureAISearchStoreAdapter(StoreAdapter):
         ids = [i["id"] for i in response]
         self.vector_store.delete(ids)
 
+    def delete_chunks(self, ids: List[str]) -> None:
+        if ids:
+            self.vector_store.delete(ids)
+
+    def get_chunk_hashes(self, doc_id: str) -> dict[str, str | None]:
+        response = self.vector_store.client.search(
+            search_text="*", filter=f"doc_id eq '{doc_id}'", select=["id", "metadata"]
+        )
+        # assure mypy that we get the sync type
+        if isinstance(response, Awaitable):
+            raise TypeError("Got awaitable response from client. Expected sync Azure AI Search client")
+
+        return {i["id"]: json.loads(i["metadata"] or "{}").get("content_hash") for i in response}
+
+    def get_document_chunks(self, doc_id: str) -> list[tuple[Document, list[float]]]:
+        response = self.vector_store.client.search(
+            search_text="*",
+            filter=f"doc_id eq '{doc_id}'",
+            select=["id", "content", "metadata", "content_vector"],
+        )
+        # assure mypy that we get the sync type
+        if isinstance(response, Awaitable):
+            raise TypeError("Got awaitable response from client. Expected sync Azure AI Search client")
+
+        return [
+            (
+                Document(id=i["id"], page_content=i["content"], metadata=json.loads(i["metadata"] or "{}")),
+                i["content_vector"],
+            )
+            for i in response
+        ]
+
+    def reindex(self) -> None:
+        # Azure AI Search maintains the vector index of the `myHnswProfile` itself
+        pass
+
     @staticmethod
     def convert_filter(search_filter: StoreFilter | None) -> str | None:
         if search_filter is None:
@@ -129,17 +184,55 @@ class AzureAISearchStoreAdapter(StoreAdapter):
 
         return filter_expression
 
-    def similarity_search(self, query: str, k: int = 4, search_filter: StoreFilter | None = None) -> List[Document]:
+    @staticmethod
+    def matches_nothing(search_filter: StoreFilter | None) -> bool:
         # We catch the special case of an empty file list. While None means that all files may be searched
         # an empty file list means that no files may be searched, such that the result will always be empty.
         # So we do not have to bother Azure.
-        if search_filter is not None and search_filter.doc_ids is not None and len(search_filter.doc_ids) == 0:
+        return search_filter is not None and search_filter.doc_ids is not None and len(search_filter.doc_ids) == 0
+
+    def similarity_search(self, query: str, k: int = 4, search_filter: StoreFilter | None = None) -> List[Document]:
+        if self.matches_nothing(search_filter):
             return []
 
         filter_expression = self.convert_filter(search_filter)
 
         return self.vector_store.similarity_search(query, k, filters=filter_expression)
 
+    async def asimilarity_search(
+        self, query: str, k: int = 4, search_filter: StoreFilter | None = None
+    ) -> List[Document]:
+        if self.matches_nothing(search_filter):
+            return []
+
+        filter_expression = self.convert_filter(search_filter)
+
+        return await self.vector_store.asimilarity_search(query, k, filters=filter_expression)
+
+    # langchain's AzureSearch has no public method to search by vector, so we use the protected ones,
+    # which back its `similarity_search`
+    def similarity_search_by_vector(
+        self, embedding: list[float], k: int = 4, search_filter: StoreFilter | None = None
+    ) -> List[Document]:
+        if self.matches_nothing(search_filter):
+            return []
+
+        filter_expression = self.convert_filter(search_filter)
+        results = self.vector_store._simple_search(embedding, "", k, filters=filter_expression)
+
+        return [doc for doc, _ in _results_to_documents(results)]
+
+    async def asimilarity_search_by_vector(
+        self, embedding: list[float], k: int = 4, search_filter: StoreFilter | None = None
+    ) -> List[Document]:
+        if self.matches_nothing(search_filter):
+            return []
+
+        filter_expression = self.convert_filter(search_filter)
+        results = await self.vector_store._asimple_search(embedding, "", k, filters=filter_expression)
+
+        return [doc for doc, _ in await _aresults_to_documents(results)]
+
     def get_documents(self, ids: List[str]) -> List[Document]:
         filter_query = f"search.in(id, '{', '.join(ids)}')"
         docs = self.vector_store.similarity_search("", len(ids), filters=filter_query)
@@ -11,16 +11,38 @@ class DevNullStoreAdapter(StoreAdapter):
 
     @classmethod
     def create(cls, config: Config, embeddings: Embeddings, index_name: str | None = None) -> "DevNullStoreAdapter":
-        return cls()
+        instance = cls()
+        instance.embeddings = embeddings
+        return instance
 
-    def add_documents(self, documents: list[Document]) -> None:
+    def add_documents(self, documents: list[Document], embeddings: list[list[float]] | None = None) -> None:
         pass
 
     def delete(self, doc_id: str) -> None:
         pass
 
+    def delete_many(self, doc_ids: List[str]) -> None:
+        pass
+
+    def delete_chunks(self, ids: List[str]) -> None:
+        pass
+
+    def get_chunk_hashes(self, doc_id: str) -> dict[str, str | None]:
+        return {}
+
+    def reindex(self) -> None:
+        pass
+
+    def get_document_chunks(self, doc_id: str) -> list[tuple[Document, list[float]]]:
+        return []
+
     def similarity_search(self, query: str, k: int = 4, search_filter: StoreFilter | None = None) -> List[Document]:
         return []
 
+    def similarity_search_by_vector(
+        self, embedding: list[float], k: int = 4, search_filter: StoreFilter | None = None
+    ) -> List[Document]:
+        return []
+
     def get_documents(self, ids: List[str]) -> List[Document]:
         return []
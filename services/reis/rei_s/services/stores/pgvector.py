@@ -1,5 +1,8 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from threading import Lock
-from typing import Any, Dict, List
+import uuid
+from typing import Any, List, cast
 
 from langchain_core.documents import Document
 from langchain_postgres import PGVector
@@ -7,14 +10,147 @@ from langchain_core.embeddings.embeddings import Embeddings
 
 from rei_s import logger
 from rei_s.config import Config
+from rei_s.metrics.metrics import pgvector_pool_connections_gauge, pgvector_pool_max_connections_gauge
 from rei_s.services.store_adapter import StoreAdapter, StoreFilter
 
 
 lock = Lock()
 
+# metadata keys, by which chunks are deleted and filtered, they get an expression index
+INDEXED_METADATA_KEYS = ["doc_id", "bucket"]
+
+
+def connect_without_transaction(vector_store: PGVector) -> Any:
+    # indexes can only be built and dropped concurrently outside of a transaction
+    engine = vector_store._engine
+    if engine is None:
+        raise RuntimeError("The store has no sync engine")
+    return engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+
+def drop_invalid_index(connection: Any, index_name: str) -> None:
+    """Drops the index, if its concurrent build failed or was interrupted.
+
+    Such an index is not used by queries, but `CREATE INDEX IF NOT EXISTS` would keep it forever.
+    """
+    from sqlalchemy import text
+
+    is_valid = connection.execute(
+        text(
+            "SELECT pg_index.indisvalid FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+            "WHERE pg_class.relname = :index_name"
+        ),
+        dict(index_name=index_name),
+    ).scalar_one_or_none()
+    if is_valid is False:
+        logger.warning(f"Drop the invalid index `{index_name}`")
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+
+
+def create_metadata_indexes(vector_store: PGVector) -> None:
+    """Creates the expression indexes, langchain only creates a GIN index, which is not used for `->>` lookups.
+
+    The indexes are built concurrently, so the writes of other instances are not blocked meanwhile.
+    """
+    from sqlalchemy import text
+    from sqlalchemy.exc import DBAPIError
+
+    table = vector_store.EmbeddingStore.__tablename__
+    try:
+        with connect_without_transaction(vector_store) as connection:
+            for key in INDEXED_METADATA_KEYS:
+                index_name = f"ix_{table}_{key}"
+                drop_invalid_index(connection, index_name)
+                connection.execute(
+                    text(
+                        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                        f"ON {table} (collection_id, (cmetadata->>'{key}'))"
+                    )
+                )
+    except DBAPIError as e:
+        # e.g., another instance creates the index at the same time, the store works without the index anyway
+        logger.warning(f"Cannot create the metadata indexes: {e}")
+
+
+@lru_cache
+def create_pooled_engine(
+    url: str, pool_size: int, max_overflow: int, pool_pre_ping: bool, pool_recycle: int, async_mode: bool
+) -> Any:
+    """Creates an engine, whose pool is shared by all collections and adapters of the process.
+
+    langchain creates an engine for each vector store if it gets a connection string, i.e., new
+    connections for each request.
+    """
+    from sqlalchemy import create_engine as create_sync_engine
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import QueuePool
+
+    engine_args: dict[str, Any] = dict(
+        pool_size=pool_size, max_overflow=max_overflow, pool_pre_ping=pool_pre_ping, pool_recycle=pool_recycle
+    )
+    engine = create_async_engine(url, **engine_args) if async_mode else create_sync_engine(url, **engine_args)
+
+    # the async engine uses a subclass of the queue pool
+    pool = cast(QueuePool, engine.pool)
+    # the engines of different databases have their own metrics, the url is labelled without the credentials
+    database = f"{engine.url.host}:{engine.url.port or 5432}/{engine.url.database}"
+    label = "async" if async_mode else "sync"
+    pgvector_pool_connections_gauge.labels(database, label, "checked_out").set_function(pool.checkedout)
+    pgvector_pool_connections_gauge.labels(database, label, "idle").set_function(pool.checkedin)
+    pgvector_pool_max_connections_gauge.labels(database, label).set(pool_size + max_overflow)
+
+    return engine
+
+
+def get_engine(config: Config, async_mode: bool = False) -> Any:
+    if config.store_pgvector_url is None:
+        raise ValueError("The env variable `STORE_PGVECTOR_URL` is missing.")
+
+    return create_pooled_engine(
+        config.store_pgvector_url,
+        config.store_pgvector_pool_size,
+        config.store_pgvector_pool_max_overflow,
+        config.store_pgvector_pool_pre_ping,
+        config.store_pgvector_pool_recycle,
+        async_mode,
+    )
+
+
+# the type of the pgvector extension by engine, its oid is the same for all connections to the database
+vector_type_infos: dict[Any, Any] = {}
+
+
+def get_vector_type_info(engine: Any, driver_connection: Any) -> Any:
+    """Fetches the type once per engine, instead of a query for each batch"""
+    from psycopg.types import TypeInfo
+
+    if engine not in vector_type_infos:
+        vector_type_infos[engine] = TypeInfo.fetch(driver_connection, "vector")
+    return vector_type_infos[engine]
+
+
+# index types of pgvector for approximate nearest neighbour searches
+VECTOR_INDEX_TYPES = ["hnsw", "ivfflat"]
+# pgvector indexes at most 2000 dimensions, with half precision at most 4000
+VECTOR_INDEX_MAX_DIMENSIONS = 2000
+HALFVEC_INDEX_MAX_DIMENSIONS = 4000
+
+# the vector indexes are built one after the other in the background, the first request to a collection does not wait
+index_builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pgvector-index")
+
 
 class PGVectorStoreAdapter(StoreAdapter):
     vector_store: PGVector
+    # langchain needs a separate instance for the async methods
+    async_vector_store: PGVector
+    config: Config
+    collection_id: uuid.UUID
+    # the dimensions of the embeddings, only known if there is a vector index
+    dimensions: int | None = None
+    # whether the vector index of the collection was built, until then searches compare the query with every chunk
+    has_vector_index: bool = False
+    # whether a build of the vector index is queued, such that adding chunks does not queue another one
+    vector_index_pending: bool = False
 
     @classmethod
     def create(cls, config: Config, embeddings: Embeddings, index_name: str | None = None) -> "PGVectorStoreAdapter":
@@ -35,57 +171,411 @@ class PGVectorStoreAdapter(StoreAdapter):
         with lock:
             pg_vector_store = PGVector(
                 embeddings,
-                connection=config.store_pgvector_url,
+                connection=get_engine(config),
                 collection_name=collection_name,
                 use_jsonb=True,
             )
 
+            with pg_vector_store._make_sync_session() as session:
+                collection = pg_vector_store.get_collection(session)
+                if not collection:
+                    raise RuntimeError(f"Collection `{collection_name}` was not created")
+                collection_id = collection.uuid
+
+        # a concurrent build waits for the running transactions on the table, so it is not done under the lock
+        create_metadata_indexes(pg_vector_store)
+
+        # the async instance connects lazily, the collection was already created by the sync instance
+        async_pg_vector_store = PGVector(
+            embeddings,
+            connection=get_engine(config, async_mode=True),
+            collection_name=collection_name,
+            use_jsonb=True,
+            create_extension=False,
+        )
+
         instance = cls()
 
         instance.vector_store = pg_vector_store
+        instance.async_vector_store = async_pg_vector_store
+        instance.config = config
+        instance.collection_id = collection_id
+        instance.embeddings = embeddings
+
+        if config.store_pgvector_vector_index != "none":
+            # the embedding column has no dimensions, so the index and the searches need them for a cast
+            instance.dimensions = len(embeddings.embed_query("Text"))
+            if instance.dimensions > HALFVEC_INDEX_MAX_DIMENSIONS:
+                raise ValueError(
+                    f"`STORE_PGVECTOR_VECTOR_INDEX` supports at most {HALFVEC_INDEX_MAX_DIMENSIONS} dimensions, "
+                    f"but the embeddings have {instance.dimensions}, use `STORE_PGVECTOR_VECTOR_INDEX=none`."
+                )
+            instance.schedule_vector_index()
 
         return instance
 
-    def add_documents(self, documents: list[Document]) -> None:
-        self.vector_store.add_documents(documents)
+    def get_vector_index_name(self, index_type: str) -> str:
+        # identifiers are limited to 63 characters
+        return f"ix_embedding_{index_type}_{self.collection_id.hex}"
+
+    def uses_halfvec(self) -> bool:
+        return self.dimensions is not None and self.dimensions > VECTOR_INDEX_MAX_DIMENSIONS
+
+    def get_indexed_embedding(self, column: Any) -> Any:
+        """The expression, which the vector index was built on, the queries have to use it to use the index"""
+        from sqlalchemy import cast
+        from pgvector.sqlalchemy import HALFVEC, Vector
+
+        if self.dimensions is None:
+            return column
+        if self.uses_halfvec():
+            return cast(column, HALFVEC(self.dimensions))
+        return cast(column, Vector(self.dimensions))
+
+    def has_chunks(self, connection: Any, count: int) -> bool:
+        """Whether the collection has at least this many chunks, without counting all of them"""
+        from sqlalchemy import text
+
+        table = self.vector_store.EmbeddingStore.__tablename__
+        chunks = connection.execute(
+            text(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} WHERE collection_id = :collection_id LIMIT :count) AS c"
+            ),
+            dict(collection_id=self.collection_id, count=count),
+        ).scalar_one()
+        return bool(chunks >= count)
+
+    def create_vector_index(self) -> None:
+        """Creates the configured vector index of the collection, if it does not exist.
+
+        The index is built concurrently, so writes are not blocked, but this may take long for large collections.
+        An index, whose previous build failed, is invalid and built again.
+        """
+        from sqlalchemy import text
+
+        index_type = self.config.store_pgvector_vector_index
+        if index_type == "none" or self.dimensions is None:
+            return
+
+        if index_type == "hnsw":
+            parameters = (
+                f"m = {self.config.store_pgvector_hnsw_m}, "
+                f"ef_construction = {self.config.store_pgvector_hnsw_ef_construction}"
+            )
+        else:
+            parameters = f"lists = {self.config.store_pgvector_ivfflat_lists}"
+
+        vector_type = "halfvec" if self.uses_halfvec() else "vector"
+        index_name = self.get_vector_index_name(index_type)
+        table = self.vector_store.EmbeddingStore.__tablename__
+        statement = (
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {table} "
+            f"USING {index_type} ((embedding::{vector_type}({self.dimensions})) {vector_type}_cosine_ops) "
+            f"WITH ({parameters}) WHERE collection_id = '{self.collection_id}'"
+        )
+        with connect_without_transaction(self.vector_store) as connection:
+            drop_invalid_index(connection, index_name)
+            if index_type == "ivfflat" and not self.has_chunks(connection, self.config.store_pgvector_ivfflat_lists):
+                # the lists are computed from the chunks at build time, the index is built, when more chunks are added
+                logger.info(f"skip ivfflat index for small collection `{self.vector_store.collection_name}`")
+                return
+
+            logger.info(f"create {index_type} index for collection `{self.vector_store.collection_name}`")
+            connection.execute(text(statement))
+            self.has_vector_index = True
+
+    def schedule_vector_index(self) -> None:
+        if self.vector_index_pending:
+            return
+        self.vector_index_pending = True
+        index_builder.submit(self.ensure_vector_index)
+
+    def ensure_vector_index(self) -> None:
+        """Creates the vector index in the background, the store works without the index, so failures are only logged"""
+        try:
+            self.create_vector_index()
+        except Exception as e:
+            logger.error(f"Cannot create the vector index of collection `{self.vector_store.collection_name}`: {e!r}")
+        finally:
+            self.vector_index_pending = False
+
+    def drop_and_create_vector_index(self) -> None:
+        from sqlalchemy import text
+
+        self.has_vector_index = False
+        with connect_without_transaction(self.vector_store) as connection:
+            for index_type in VECTOR_INDEX_TYPES:
+                connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {self.get_vector_index_name(index_type)}"))
+
+        self.create_vector_index()
+
+    def reindex(self) -> None:
+        """Drops the vector indexes of the collection and builds the configured one again, e.g., after
+        many chunks were added to an IVFFlat index, whose lists were computed from the first chunks.
+
+        The build waits for the background builds of this process, so they do not build the same index.
+        """
+        index_builder.submit(self.drop_and_create_vector_index).result()
+
+    def get_search_settings(self) -> list[str]:
+        """The statements, which configure the vector index for the searches of a transaction"""
+        index_type = self.config.store_pgvector_vector_index
+        if index_type == "hnsw":
+            return [f"SET LOCAL hnsw.ef_search = {self.config.store_pgvector_hnsw_ef_search}"]
+        if index_type == "ivfflat":
+            return [f"SET LOCAL ivfflat.probes = {self.config.store_pgvector_ivfflat_probes}"]
+        return []
+
+    def add_documents(self, documents: list[Document], embeddings: list[list[float]] | None = None) -> None:
+        self.write_documents(documents, embeddings)
+
+        # an IVFFlat index is only built, when the collection has enough chunks
+        if self.config.store_pgvector_vector_index == "ivfflat" and not self.has_vector_index:
+            self.schedule_vector_index()
+
+    def write_documents(self, documents: list[Document], embeddings: list[list[float]] | None = None) -> None:
+        if len(documents) >= self.config.store_pgvector_copy_threshold:
+            if embeddings is None:
+                embeddings = self.vector_store.embeddings.embed_documents([doc.page_content for doc in documents])
+            self.copy_documents(documents, embeddings)
+            return
+
+        if embeddings is None:
+            self.vector_store.add_documents(documents)
+            return
+
+        self.vector_store.add_embeddings(
+            texts=[doc.page_content for doc in documents],
+            embeddings=embeddings,
+            metadatas=[doc.metadata for doc in documents],
+            # like langchain, we generate ids for the documents without one
+            ids=[doc.id or str(uuid.uuid4()) for doc in documents],
+        )
+
+    def copy_documents(self, documents: list[Document], embeddings: list[list[float]]) -> None:
+        """Writes the chunks with a binary COPY into a temporary table and upserts them from there like langchain.
+
+        For large batches this is much faster than the INSERT of langchain, which sends all chunks in one
+        statement with the embeddings as text.
+        """
+        from pgvector.psycopg.vector import register_vector_info
+
+        table = self.vector_store.EmbeddingStore.__tablename__
+        columns = "id, collection_id, embedding, document, cmetadata"
+        engine = get_engine(self.config)
+        with engine.begin() as connection:
+            driver_connection = connection.connection.driver_connection
+            with driver_connection.cursor() as cursor:
+                # the types are registered for the cursor only, the other queries of the pooled connection use text
+                register_vector_info(cursor, get_vector_type_info(engine, driver_connection))
+                cursor.execute(f"CREATE TEMP TABLE staging_embedding (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+                with cursor.copy(f"COPY staging_embedding ({columns}) FROM STDIN (FORMAT BINARY)") as copy:
+                    copy.set_types(["varchar", "uuid", "vector", "varchar", "jsonb"])
+                    for doc, embedding in zip(documents, embeddings):
+                        # like langchain, we generate ids for the documents without one
+                        copy.write_row(
+                            [doc.id or str(uuid.uuid4()), self.collection_id, embedding, doc.page_content, doc.metadata]
+                        )
+                cursor.execute(
+                    f"INSERT INTO {table} ({columns}) SELECT {columns} FROM staging_embedding "
+                    "ON CONFLICT (id) DO UPDATE SET "
+                    "embedding = EXCLUDED.embedding, document = EXCLUDED.document, cmetadata = EXCLUDED.cmetadata"
+                )
 
     def delete(self, doc_id: str) -> None:
+        self.delete_many([doc_id])
+
+    def delete_many(self, doc_ids: List[str]) -> None:
         # The vector store does not offer a method to delete chunks by metadata (only chunk id), thus
         # we do it ourselves by calling SQLAlchemy directly using the protected `_make_sync_session` method.
-        from sqlalchemy import delete
+        # The collection is looked up in a subquery, so this is a single statement, which uses the doc_id index.
+        from sqlalchemy import delete, select
+
+        if not doc_ids:
+            return
+
+        embedding_store = self.vector_store.EmbeddingStore
+        collection_store = self.vector_store.CollectionStore
+        collection_id = (
+            select(collection_store.uuid)
+            .where(collection_store.name == self.vector_store.collection_name)
+            .scalar_subquery()
+        )
+        stmt = (
+            delete(embedding_store)
+            .where(embedding_store.collection_id == collection_id)
+            .where(embedding_store.cmetadata["doc_id"].astext.in_(doc_ids))
+        )
 
         with self.vector_store._make_sync_session() as session:
-            stmt = delete(self.vector_store.EmbeddingStore)
+            session.execute(stmt)
+            session.commit()
+
+    def delete_chunks(self, ids: List[str]) -> None:
+        if ids:
+            self.vector_store.delete(ids)
+
+    def get_chunk_hashes(self, doc_id: str) -> dict[str, str | None]:
+        from sqlalchemy import select
 
+        embedding_store = self.vector_store.EmbeddingStore
+        with self.vector_store._make_sync_session() as session:
             collection = self.vector_store.get_collection(session)
             if not collection:
                 logger.warning("Collection not found")
-                return
+                return {}
 
-            stmt = stmt.where(self.vector_store.EmbeddingStore.collection_id == collection.uuid)
+            stmt = (
+                select(embedding_store.id, embedding_store.cmetadata["content_hash"].astext)
+                .where(embedding_store.collection_id == collection.uuid)
+                .filter(embedding_store.cmetadata["doc_id"].astext == doc_id)
+            )
+            return {str(chunk_id): content_hash for chunk_id, content_hash in session.execute(stmt).tuples()}
 
-            stmt = stmt.filter(self.vector_store.EmbeddingStore.cmetadata["doc_id"].astext == doc_id)
-            session.execute(stmt)
-            session.commit()
+    def get_document_chunks(self, doc_id: str) -> list[tuple[Document, list[float]]]:
+        from sqlalchemy import select
+
+        embedding_store = self.vector_store.EmbeddingStore
+        with self.vector_store._make_sync_session() as session:
+            collection = self.vector_store.get_collection(session)
+            if not collection:
+                logger.warning("Collection not found")
+                return []
+
+            stmt = (
+                select(
+                    embedding_store.id, embedding_store.document, embedding_store.cmetadata, embedding_store.embedding
+                )
+                .where(embedding_store.collection_id == collection.uuid)
+                .filter(embedding_store.cmetadata["doc_id"].astext == doc_id)
+            )
+            return [
+                (
+                    Document(id=str(chunk_id), page_content=document or "", metadata=metadata or {}),
+                    [float(x) for x in embedding],
+                )
+                for chunk_id, document, metadata, embedding in session.execute(stmt).tuples()
+            ]
 
     @staticmethod
-    def convert_filter(search_filter: StoreFilter | None) -> Dict[str, Any] | None:
-        filter_dict: Dict[str, Any] | None
-        if search_filter is None:
-            filter_dict = None
-        else:
-            filter_dict = {}
+    def convert_filter(embedding_store: Any, search_filter: StoreFilter | None) -> list[Any]:
+        """Compares the metadata as text, such that the expression indexes on the bucket and the doc_id are used.
+
+        langchain compares with JSON path functions instead, which cannot use an index.
+        """
+        conditions = []
+        if search_filter is not None:
             if search_filter.bucket is not None:
-                filter_dict["bucket"] = {"$eq": search_filter.bucket}
+                conditions.append(embedding_store.cmetadata["bucket"].astext == search_filter.bucket)
             if search_filter.doc_ids is not None:
-                filter_dict["doc_id"] = {"$in": search_filter.doc_ids}
+                conditions.append(embedding_store.cmetadata["doc_id"].astext.in_(search_filter.doc_ids))
+
+        return conditions
+
+    def build_count_statement(self, conditions: list[Any]) -> Any:
+        """Counts the chunks matching the filter, but stops counting above the threshold"""
+        from sqlalchemy import func, select
+
+        embedding_store = self.vector_store.EmbeddingStore
+        matches = (
+            select(embedding_store.id)
+            .where(embedding_store.collection_id == self.get_collection_id(), *conditions)
+            .limit(self.config.store_pgvector_prefilter_threshold + 1)
+            .subquery()
+        )
+        return select(func.count()).select_from(matches)
+
+    def build_search_statement(self, embedding: list[float], k: int, conditions: list[Any], prefilter: bool) -> Any:
+        """Finds the nearest chunks, either among the chunks matching the filter (pre-filter) or by filtering
+        the chunks in the order of their distance (post-filter).
+
+        A pre-filter is exact and fast, if only few chunks match. The post-filter is used for unselective filters,
+        since it can use the vector index without looking at every matching chunk.
+        """
+        from sqlalchemy import select
+
+        embedding_store = self.vector_store.EmbeddingStore
+        candidates = (
+            select(embedding_store.id, embedding_store.document, embedding_store.cmetadata, embedding_store.embedding)
+            .where(embedding_store.collection_id == self.get_collection_id(), *conditions)
+            .cte("candidates")
+        )
+        if prefilter:
+            # the planner must not push the ordering into the vector index, which would filter after the index scan
+            candidates = candidates.prefix_with("MATERIALIZED")
+
+        # the store uses langchain's default, the cosine distance
+        distance = self.get_indexed_embedding(candidates.c.embedding).cosine_distance(embedding).label("distance")
+        return (
+            select(candidates.c.id, candidates.c.document, candidates.c.cmetadata, distance).order_by(distance).limit(k)
+        )
+
+    def get_collection_id(self) -> Any:
+        from sqlalchemy import literal_column
 
-        return filter_dict
+        # the id is inlined, such that the planner can match the partial vector index of the collection
+        return literal_column(f"'{self.collection_id}'::uuid")
+
+    @staticmethod
+    def rows_to_documents(rows: Any) -> List[Document]:
+        return [
+            Document(id=str(chunk_id), page_content=document, metadata=metadata)
+            for chunk_id, document, metadata, _distance in rows
+        ]
 
     def similarity_search(self, query: str, k: int = 4, search_filter: StoreFilter | None = None) -> List[Document]:
-        filter_dict = self.convert_filter(search_filter)
+        if self.embeddings is None:
+            raise ValueError("The store has no embeddings for the query")
+
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k, search_filter)
+
+    async def asimilarity_search(
+        self, query: str, k: int = 4, search_filter: StoreFilter | None = None
+    ) -> List[Document]:
+        if self.embeddings is None:
+            raise ValueError("The store has no embeddings for the query")
+
+        return await self.asimilarity_search_by_vector(await self.embeddings.aembed_query(query), k, search_filter)
+
+    def similarity_search_by_vector(
+        self, embedding: list[float], k: int = 4, search_filter: StoreFilter | None = None
+    ) -> List[Document]:
+        from sqlalchemy import text
+
+        conditions = self.convert_filter(self.vector_store.EmbeddingStore, search_filter)
+
+        with self.vector_store._make_sync_session() as session:
+            for setting in self.get_search_settings():
+                session.execute(text(setting))
+            prefilter = bool(conditions)
+            if prefilter and self.has_vector_index:
+                prefilter = (
+                    session.execute(self.build_count_statement(conditions)).scalar_one()
+                    <= self.config.store_pgvector_prefilter_threshold
+                )
+            rows = session.execute(self.build_search_statement(embedding, k, conditions, prefilter)).all()
+
+        return self.rows_to_documents(rows)
+
+    async def asimilarity_search_by_vector(
+        self, embedding: list[float], k: int = 4, search_filter: StoreFilter | None = None
+    ) -> List[Document]:
+        from sqlalchemy import text
+
+        # the statements are built with the tables of the sync instance, the async instance initializes them lazily
+        conditions = self.convert_filter(self.vector_store.EmbeddingStore, search_filter)
+
+        async with self.async_vector_store._make_async_session() as session:
+            for setting in self.get_search_settings():
+                await session.execute(text(setting))
+            prefilter = bool(conditions)
+            if prefilter and self.has_vector_index:
+                prefilter = (
+                    await session.execute(self.build_count_statement(conditions))
+                ).scalar_one() <= self.config.store_pgvector_prefilter_threshold
+            rows = (await session.execute(self.build_search_statement(embedding, k, conditions, prefilter))).all()
 
-        return self.vector_store.similarity_search(query, k, filter_dict)
+        return self.rows_to_documents(rows)
 
     def get_documents(self, ids: List[str]) -> List[Document]:
         return self.vector_store.get_by_ids(ids)
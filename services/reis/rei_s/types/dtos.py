@@ -1,4 +1,4 @@
-from typing import Any, List, Optional, Dict, Tuple
+from typing import Any, List, Literal, Optional, Dict, Tuple
 from pydantic import BaseModel, Field, ConfigDict
 from pydantic.alias_generators import to_camel
 
@@ -53,10 +53,55 @@ class FileResult(BaseModel):
     sources: list[SourceDto] = Field(description="Additional information about the sources.")
 
 
+class SearchQuery(BaseModel):
+    query: str = Field(description="The query from the internal tool")
+    take: int = Field(description="The number of results to return")
+    bucket: Optional[str] = Field(None, description="The ID of the bucket")
+    files: Optional[list[str]] = Field(None, description="File IDs to restrict the query")
+
+
+class BatchSearchRequest(BaseModel):
+    queries: list[SearchQuery] = Field(description="The queries to search for", min_length=1)
+
+
+class BatchSearchResult(BaseModel):
+    results: list[FileResult] = Field(description="The results in the order of the queries")
+
+
+class BulkUploadFileResult(BaseModel):
+    id: str = Field(description="The ID of the file")
+    status_code: int = Field(description="200 if the file was added, otherwise the error status of the file")
+    detail: Optional[str] = Field(None, description="The reason, why the file could not be added")
+
+
+class BulkUploadResult(BaseModel):
+    files: list[BulkUploadFileResult] = Field(description="The results in the order of the uploaded files")
+
+
+class JobResult(BaseModel):
+    id: str = Field(description="The ID of the job")
+    file_id: str = Field(description="The ID of the file")
+    status: Literal["queued", "running", "done", "failed"] = Field(description="The status of the job")
+    batches_done: int = Field(0, description="The number of batches of chunks, which are stored")
+    num_batches: Optional[int] = Field(
+        None, description="The number of batches, unknown until the file is parsed completely if chunks are streamed"
+    )
+    status_code: Optional[int] = Field(None, description="The status, the upload failed with")
+    detail: Optional[str] = Field(None, description="The reason, why the upload failed")
+    created_at: float = Field(description="Unix timestamp of the upload")
+    finished_at: Optional[float] = Field(None, description="Unix timestamp, when the job was done or failed")
+
+
 class FileProcessResult(BaseModel):
     chunks: list[ResultDocument] = Field(description="The chunks which constitute the processed file")
 
 
+class FileUpdateResult(BaseModel):
+    added: int = Field(description="The number of new or changed chunks, which were embedded and stored")
+    kept: int = Field(description="The number of unchanged chunks, which were kept")
+    deleted: int = Field(description="The number of chunks, which are not part of the new version")
+
+
 class UploadRequest(BaseModel):
     bucket: str = Field(description="The bucket where the file belongs too")
     index_name: str = Field(description="The index name")
@@ -1,10 +1,12 @@
 from contextlib import contextmanager
+import hashlib
+import mmap
 import os
 from tempfile import NamedTemporaryFile
-from typing import Generator
+from typing import Generator, Iterator
 import uuid
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from rei_s.utils import get_uploaded_file_path
 
 
@@ -14,15 +16,53 @@ class SourceFile(BaseModel):
     mime_type: str
     file_name: str
 
+    # the file is written once and not modified afterwards, so we only look at it once
+    _size: int | None = PrivateAttr(None)
+    _content_hash: str | None = PrivateAttr(None)
+
+    def set_content_info(self, size: int, content_hash: str) -> None:
+        """Records the size and the hash, which were computed while the file was written"""
+        self._size = size
+        self._content_hash = content_hash
+
     @property
     def size(self) -> int:
-        return os.path.getsize(self.path)
+        if self._size is None:
+            self._size = os.path.getsize(self.path)
+        return self._size
 
     @property
     def buffer(self) -> bytes:
+        # not cached, the format providers read the file through `view`, `read_text` or its path instead
         with open(self.path, "rb") as f:
             return f.read()
 
+    @contextmanager
+    def view(self) -> Iterator[bytes | mmap.mmap]:
+        """Read only view of the content, which is paged in on demand by the OS instead of being copied into memory"""
+        if self.size == 0:
+            # empty files can not be mapped
+            yield b""
+            return
+
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            yield view
+
+    def read_text(self) -> str:
+        # decoding from the view avoids holding the bytes and the decoded text in memory at the same time
+        with self.view() as view:
+            return str(view, "utf-8")
+
+    @property
+    def content_hash(self) -> str:
+        if self._content_hash is None:
+            sha256 = hashlib.sha256()
+            with open(self.path, "rb") as f:
+                while chunk := f.read(1024 * 1024):
+                    sha256.update(chunk)
+            self._content_hash = sha256.hexdigest()
+        return self._content_hash
+
     @staticmethod
     def new_temporary_file(buffer: bytes | None = None, extension: str | None = None) -> "SourceFile":
         id_ = str(uuid.uuid4())
@@ -1,4 +1,3 @@
-from concurrent.futures import ThreadPoolExecutor
 import os
 import tempfile
 from typing import Any
@@ -7,7 +6,7 @@ from fastapi import FastAPI
 from fastapi.concurrency import asynccontextmanager
 
 from rei_s.logger import logger
-from rei_s.config import get_config
+from rei_s.config import Config, get_config, get_state_dir
 from rei_s.prometheus_server import PrometheusHttpServer
 
 
@@ -16,29 +15,63 @@ def get_uploaded_file_path(file_id: str) -> str:
     normalized_path = os.path.normpath(joined_path)
     if not normalized_path.startswith(tempfile.gettempdir()):
         raise ValueError("Invalid file path")
+    # uploads must not replace the databases of the service
+    state_dir = get_state_dir()
+    if normalized_path == state_dir or normalized_path.startswith(state_dir + os.sep):
+        raise ValueError("Invalid file path")
     return normalized_path
 
 
-async def startup_workers(app: FastAPI, workers: int) -> None:
-    app.state.executor = ThreadPoolExecutor(max_workers=workers)
-    logger.info(f"Started {workers} workers")
+def create_state_dir() -> None:
+    try:
+        # only this service may access its databases, the temporary directory itself is not created
+        os.mkdir(get_state_dir(), mode=0o700)
+    except FileExistsError:
+        pass
+    except OSError as e:
+        # the service is still usable without its databases, e.g., if the temporary directory is not writable
+        logger.error(f"Cannot create the directory of the databases: {e!r}")
+
+
+async def startup_workers(app: FastAPI, config: Config) -> None:
+    # imported here, since the services depend on `get_uploaded_file_path` of this module
+    from rei_s.services.job_service import get_configured_job_manager
+    from rei_s.services.multiprocess_utils import get_process_pool_size, start_process_pool
+    from rei_s.services.scheduler import create_executor
+
+    app.state.executor = create_executor(config)
+    logger.info(f"Started {config.workers} workers")
+
+    # uploads, which were accepted before a restart
+    try:
+        get_configured_job_manager(config).resume(app.state.executor, config)
+    except Exception as e:
+        # the service is still usable without jobs, e.g., if the temporary directory is not writable
+        logger.error(f"Cannot resume the pending jobs: {e!r}")
+
+    start_process_pool(config)
+    logger.info(f"Started {get_process_pool_size(config)} processing processes")
 
 
 async def shutdown_workers(app: FastAPI) -> None:
-    logger.info("Stopped all workers")
+    from rei_s.services.multiprocess_utils import shutdown_process_pool
+
     app.state.executor.shutdown()
+    shutdown_process_pool()
+    logger.info("Stopped all workers")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> Any:
     config = app.dependency_overrides.get(get_config, get_config)()
+    create_state_dir()
 
     if config.metrics_port:
         metrics_server = PrometheusHttpServer(config.metrics_port)
         logger.info(f"Starting Prometheus server on port {config.metrics_port}")
         metrics_server.start()
 
-    await startup_workers(app, config.workers)
+    await startup_workers(app, config)
 
     yield
 
@@ -1,10 +1,17 @@
+import os
+import tempfile
 from typing import Any, Generator
 from fastapi import FastAPI
 import pytest
-from concurrent.futures import ThreadPoolExecutor
 
 from rei_s import app_factory
 from rei_s.config import Config, get_config
+from rei_s.services.scheduler import create_executor
+from rei_s.services.store_provider import clear_store_cache
+
+
+# The databases of the tests are in a directory of the test run, such that runs do not share e.g. pending jobs
+test_run_dir = tempfile.TemporaryDirectory()
 
 
 def get_test_config(settings: dict[str, Any] | None = None) -> Config:
@@ -15,6 +22,7 @@ def get_test_config(settings: dict[str, Any] | None = None) -> Config:
         _env_file=None,
         store_type="dev-null",
         embeddings_type="random-test-embeddings",
+        jobs_path=os.path.join(test_run_dir.name, "jobs.sqlite3"),
     )
     config.update(settings)
     return Config(**config)
@@ -36,11 +44,18 @@ def app() -> Generator[FastAPI, None, None]:
     # this is good, because, we do not want to start the metrics endpoint for tests
     # but this means that we need to start the executor manually here.
     # For tests using the lifespan context, it will be overwritten.
-    app.state.executor = ThreadPoolExecutor(max_workers=1)
+    app.state.executor = create_executor(get_default_test_config())
 
     yield app
 
 
+# Store adapters are cached process wide, we do not want to share them (and their mocks) between tests
+@pytest.fixture(autouse=True)
+def clear_stores() -> Generator[None, None, None]:
+    yield
+    clear_store_cache()
+
+
 def pytest_addoption(parser: Any) -> None:
     parser.addoption("--stress", action="store_true", default=False, help="run stress tests")
 
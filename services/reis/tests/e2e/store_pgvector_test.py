@@ -1,13 +1,16 @@
 from io import BytesIO
-from typing import Any, Protocol
+from typing import Protocol
 from faker import Faker
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
 from langchain_community.embeddings import FakeEmbeddings
+from langchain_core.documents import Document
+from langchain_postgres.vectorstores import _get_embedding_collection_store
 from pydantic import ValidationError
 import pytest
 from pytest_mock import MockerFixture
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
 import sqlalchemy
 
 from rei_s.config import Config, get_config
@@ -227,15 +230,85 @@ def test_get_files_filtered_by_file_ids(file_uploader: FileUploaderFixture, clie
     assert len(content["files"]) == 0
 
 
+def test_search_with_vector_index(file_uploader: FileUploaderFixture) -> None:
+    _filename, input_content = file_uploader(bucket=1, file_id=1)
+    config = get_test_config(
+        dict(
+            store_type="pgvector",
+            store_pgvector_index_name=INDEX_NAME,
+            store_pgvector_vector_index="hnsw",
+            # every filter is applied after the index scan
+            store_pgvector_prefilter_threshold=0,
+        )
+    )
+
+    store = PGVectorStoreAdapter.create(config, FakeEmbeddings(size=1352), INDEX_NAME)
+    store.reindex()
+
+    engine = create_engine(str(config.store_pgvector_url))
+    with engine.connect() as con:
+        index_names = con.execute(
+            sqlalchemy.text("SELECT indexname FROM pg_indexes WHERE tablename = 'langchain_pg_embedding'")
+        )
+        assert store.get_vector_index_name("hnsw") in [str(name) for (name,) in index_names]
+
+    docs = store.similarity_search("test", 3, StoreFilter(bucket="1"))
+    assert [doc.page_content for doc in docs] == [input_content]
+
+
+def test_add_documents_with_copy() -> None:
+    config = get_test_config(
+        dict(store_type="pgvector", store_pgvector_index_name=INDEX_NAME, store_pgvector_copy_threshold=2)
+    )
+    store = PGVectorStoreAdapter.create(config, FakeEmbeddings(size=1352), INDEX_NAME)
+
+    documents = [
+        Document(id=f"chunk-{i}", page_content=f"text {i}", metadata={"doc_id": "1", "bucket": "1", "index": i})
+        for i in range(3)
+    ]
+    embeddings = [[float(i)] * 1352 for i in range(3)]
+    store.add_documents(documents, embeddings)
+    # the chunks are updated, if they are added again
+    documents[0].page_content = "changed"
+    store.add_documents(documents, embeddings)
+
+    chunks = sorted(store.get_document_chunks("1"), key=lambda chunk: chunk[0].metadata["index"])
+    assert [doc.id for doc, _ in chunks] == ["chunk-0", "chunk-1", "chunk-2"]
+    assert [doc.page_content for doc, _ in chunks] == ["changed", "text 1", "text 2"]
+    assert [embedding for _, embedding in chunks] == embeddings
+
+    docs = store.similarity_search_by_vector([1.0] * 1352, 3, StoreFilter(bucket="1", doc_ids=["1"]))
+    assert len(docs) == 3
+
+
 @pytest.mark.parametrize(
     "test_input,expected",
     [
-        (None, None),
-        (StoreFilter(bucket="1"), {"bucket": {"$eq": "1"}}),
-        (StoreFilter(bucket="42", doc_ids=["3", "2"]), {"bucket": {"$eq": "42"}, "doc_id": {"$in": ["3", "2"]}}),
-        (StoreFilter(doc_ids=["3", "2"]), {"doc_id": {"$in": ["3", "2"]}}),
-        (StoreFilter(bucket="2", doc_ids=[]), {"bucket": {"$eq": "2"}, "doc_id": {"$in": []}}),
+        (None, []),
+        (StoreFilter(bucket="1"), ["(langchain_pg_embedding.cmetadata ->> 'bucket') = '1'"]),
+        (
+            StoreFilter(bucket="42", doc_ids=["3", "2"]),
+            [
+                "(langchain_pg_embedding.cmetadata ->> 'bucket') = '42'",
+                "(langchain_pg_embedding.cmetadata ->> 'doc_id') IN ('3', '2')",
+            ],
+        ),
+        (StoreFilter(doc_ids=["3", "2"]), ["(langchain_pg_embedding.cmetadata ->> 'doc_id') IN ('3', '2')"]),
+        (
+            StoreFilter(bucket="2", doc_ids=[]),
+            [
+                "(langchain_pg_embedding.cmetadata ->> 'bucket') = '2'",
+                "(langchain_pg_embedding.cmetadata ->> 'doc_id') IN (NULL) AND (1 != 1)",
+            ],
+        ),
     ],
 )
-def test_filter_conversion(test_input: StoreFilter, expected: dict[str, Any]) -> None:
-    assert PGVectorStoreAdapter.convert_filter(test_input) == expected
+def test_filter_conversion(test_input: StoreFilter, expected: list[str]) -> None:
+    embedding_store, _ = _get_embedding_collection_store()
+    conditions = PGVectorStoreAdapter.convert_filter(embedding_store, test_input)
+
+    dialect = postgresql.dialect()  # type: ignore[no-untyped-call]
+    compiled = [
+        str(condition.compile(dialect=dialect, compile_kwargs={"literal_binds": True})) for condition in conditions
+    ]
+    assert compiled == expected
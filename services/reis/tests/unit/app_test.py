@@ -1,3 +1,5 @@
+from pathlib import Path
+
 from fastapi import FastAPI
 import pytest
 from fastapi.testclient import TestClient
@@ -5,7 +7,10 @@ from langchain_community.embeddings import FakeEmbeddings
 from langchain_core.documents import Document
 
 from pytest_mock import MockerFixture
+from rei_s.config import get_config
+from rei_s.services import store_service
 from rei_s.services.stores.devnull_store import DevNullStoreAdapter
+from tests.conftest import get_default_test_config, get_test_config
 
 
 @pytest.fixture
@@ -50,7 +55,14 @@ def test_get_documents_content(mocker: MockerFixture, client: TestClient) -> Non
 
 def test_get_files(mocker: MockerFixture, client: TestClient) -> None:
     mocked_document1 = Document(
-        page_content="test string", metadata={"source": "testfile.pdf", "format": "pdf", "mime_type": "application/pdf"}
+        page_content="test string",
+        metadata={
+            "source": "testfile.pdf",
+            "format": "pdf",
+            "mime_type": "application/pdf",
+            "bucket": "1",
+            "content_hash": "hash",
+        },
     )
     mocked_document2 = Document(
         page_content="test string 2",
@@ -69,6 +81,10 @@ def test_get_files(mocker: MockerFixture, client: TestClient) -> None:
     assert content["files"][0]["content"] == "test string"
     assert content["files"][0]["metadata"]["source"] == "testfile.pdf"
     assert content["debug"] == "## Sources\n\n* testfile.pdf\n* testfile2.pdf"
+    # internal metadata is not returned
+    for key in ["bucket", "content_hash"]:
+        assert key not in content["files"][0]["metadata"]
+        assert key not in content["sources"][0]["metadata"]
 
 
 def test_get_files_sources(mocker: MockerFixture, client: TestClient) -> None:
@@ -200,6 +216,43 @@ def test_get_files_no_files(mocker: MockerFixture, client: TestClient) -> None:
     assert content["debug"] == ""
 
 
+def test_search_files_batch(mocker: MockerFixture, client: TestClient) -> None:
+    mocked_document = Document(
+        page_content="test string", metadata={"source": "testfile.pdf", "format": "pdf", "mime_type": "application/pdf"}
+    )
+    mocked_store = DevNullStoreAdapter()
+    similarity_search_by_vector = mocker.patch.object(
+        mocked_store, "similarity_search_by_vector", autospec=True, return_value=[mocked_document]
+    )
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=mocked_store)
+    embed_documents = mocker.patch.object(FakeEmbeddings, "embed_documents", return_value=[[1.0, 0, 0], [0, 1.0, 0]])
+    mocker.patch("rei_s.services.store_service.get_embeddings", return_value=FakeEmbeddings(size=3))
+
+    response = client.post(
+        "/files/search:batch",
+        json={
+            "queries": [{"query": "first", "take": 3, "bucket": "1"}, {"query": "second", "take": 5, "files": ["2"]}]
+        },
+    )
+    assert response.status_code == 200
+
+    results = response.json()["results"]
+    assert len(results) == 2
+    assert results[0]["files"][0]["content"] == "test string"
+    assert results[1]["debug"] == "## Sources\n\n* testfile.pdf"
+
+    # both queries are embedded with a single request
+    embed_documents.assert_called_once_with(["first", "second"])
+    assert similarity_search_by_vector.call_count == 2
+    # the queries are searched concurrently, so the order of the calls is arbitrary
+    assert {str(call.args[2].doc_ids) for call in similarity_search_by_vector.call_args_list} == {"None", "['2']"}
+
+
+def test_search_files_batch_without_queries(client: TestClient) -> None:
+    response = client.post("/files/search:batch", json={"queries": []})
+    assert response.status_code == 422
+
+
 def test_add_files_fail(client: TestClient) -> None:
     response = client.post("/files")
     # missing required args
@@ -226,6 +279,125 @@ def test_add_files(mocker: MockerFixture, client: TestClient) -> None:
     assert response.status_code == 200
 
 
+def test_update_files(mocker: MockerFixture, client: TestClient) -> None:
+    mocked_store = DevNullStoreAdapter()
+    mocker.patch.object(mocked_store, "get_chunk_hashes", autospec=True, return_value={"old": "vanished"})
+    delete_chunks = mocker.patch.object(mocked_store, "delete_chunks", autospec=True)
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=mocked_store)
+
+    response = client.put(
+        "/files",
+        content=b"some text",
+        headers={
+            "bucket": "15",
+            "id": "1",
+            "fileName": "test.txt",
+            "fileMimeType": "text/plain",
+        },
+    )
+    assert response.status_code == 200
+    assert response.json() == {"added": 1, "kept": 0, "deleted": 1}
+    delete_chunks.assert_called_once_with(["old"])
+
+
+def test_delete_files(mocker: MockerFixture, client: TestClient) -> None:
+    mocked_store = DevNullStoreAdapter()
+    delete_many = mocker.patch.object(mocked_store, "delete_many", autospec=True)
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=mocked_store)
+
+    response = client.delete("/files", params={"fileIds": ["1", "2"]})
+    assert response.status_code == 200
+    delete_many.assert_called_once_with(["1", "2"])
+
+
+def test_reindex(mocker: MockerFixture, client: TestClient) -> None:
+    mocked_store = DevNullStoreAdapter()
+    reindex = mocker.patch.object(mocked_store, "reindex", autospec=True)
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=mocked_store)
+
+    response = client.post("/admin/reindex", params={"indexName": "other"})
+    assert response.status_code == 200
+    reindex.assert_called_once_with()
+
+
+def test_add_files_bulk(mocker: MockerFixture, client: TestClient) -> None:
+    mocked_store = DevNullStoreAdapter()
+    add_documents = mocker.patch.object(mocked_store, "add_documents", autospec=True)
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=mocked_store)
+
+    with open("tests/data/birthdays.pdf", "rb") as f:
+        pdf = f.read()
+
+    response = client.post(
+        "/files/bulk",
+        files=[
+            ("files", ("first.pdf", pdf, "application/pdf")),
+            ("files", ("unsupported.xyz", pdf, "application/xyz")),
+            ("files", ("second.txt", b"some text", "text/plain")),
+        ],
+        data={"ids": ["1", "2", "3"]},
+        headers={"bucket": "15"},
+    )
+    assert response.status_code == 200
+
+    results = response.json()["files"]
+    assert [result["id"] for result in results] == ["1", "2", "3"]
+    assert [result["status_code"] for result in results] == [200, 415, 200]
+    assert "File format not supported" in results[1]["detail"]
+
+    # the chunks of both files are added with a single batch
+    add_documents.assert_called_once()
+    assert {doc.metadata["doc_id"] for doc in add_documents.call_args.args[0]} == {"1", "3"}
+
+
+def test_add_files_bulk_mismatching_ids(client: TestClient) -> None:
+    response = client.post(
+        "/files/bulk",
+        files=[("files", ("second.txt", b"some text", "text/plain"))],
+        data={"ids": ["1", "2"]},
+        headers={"bucket": "15"},
+    )
+    assert response.status_code == 422
+
+
+def test_add_files_job(mocker: MockerFixture, app: FastAPI, client: TestClient, tmp_path: Path) -> None:
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=DevNullStoreAdapter())
+    mocker.patch.dict(
+        app.dependency_overrides, {get_config: lambda: get_test_config(dict(jobs_path=str(tmp_path / "jobs.sqlite3")))}
+    )
+
+    with open("tests/data/birthdays.pdf", "rb") as f:
+        response = client.post(
+            "/files/jobs",
+            data=f,  # type: ignore[arg-type]
+            headers={
+                "bucket": "15",
+                "id": "1",
+                "fileName": "test.pdf",
+                "fileMimeType": "application/pdf",
+            },
+        )
+    assert response.status_code == 202
+    job = response.json()
+    assert job["file_id"] == "1"
+
+    # the executor of the tests has a single thread, so the job is done after this
+    client.app.state.executor.submit(lambda: None).result()  # type: ignore[attr-defined]
+
+    response = client.get(f"/jobs/{job['id']}")
+    assert response.status_code == 200
+    job = response.json()
+    assert job["status"] == "done"
+    assert job["batches_done"] == 1
+    assert job["num_batches"] == 1
+    assert job["finished_at"] is not None
+
+
+def test_get_unknown_job(client: TestClient) -> None:
+    response = client.get("/jobs/unknown")
+    assert response.status_code == 404
+
+
 def test_process_files(mocker: MockerFixture, client: TestClient) -> None:
     # mock embeddings to assure that they are not generated
     mocker.patch(
@@ -254,6 +426,7 @@ def test_process_files(mocker: MockerFixture, client: TestClient) -> None:
     json = response.json()
     assert any("Darkwing Duck" in chunk["content"] for chunk in json["chunks"])
     assert any("Daniel Düsentrieb" in chunk["content"] for chunk in json["chunks"])
+    assert all("content_hash" not in chunk["metadata"] for chunk in json["chunks"])
 
 
 def test_add_damaged_file(mocker: MockerFixture, client: TestClient) -> None:
@@ -342,3 +515,13 @@ def test_bad_index_name(client: TestClient) -> None:
 def test_health(client: TestClient) -> None:
     response = client.get("/health")
     assert response.status_code == 200
+
+
+def test_vector_store_is_reused(mocker: MockerFixture) -> None:
+    get_embeddings = mocker.patch("rei_s.services.store_service.get_embeddings", return_value=FakeEmbeddings(size=3))
+    config = get_default_test_config()
+
+    store = store_service.get_vector_store(config, None)
+    assert store_service.get_vector_store(config, None) is store
+    assert store_service.get_vector_store(config, "other") is not store
+    assert get_embeddings.call_count == 2
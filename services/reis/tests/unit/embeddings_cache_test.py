@@ -0,0 +1,141 @@
+from array import array
+import asyncio
+import os
+import tempfile
+import time
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from pytest_mock import MockerFixture
+
+from rei_s.services.embeddings_cache import (
+    CachedEmbeddings,
+    CachedQueryEmbeddings,
+    EmbeddingsCache,
+    QueryEmbeddingsCache,
+    aembed_queries,
+)
+from rei_s.services.embeddings_provider import get_embeddings
+from tests.conftest import get_test_config
+
+
+class RecordingEmbeddings(DeterministicFakeEmbedding):
+    calls: list[list[str]] = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls.append(texts)
+        # like the real providers, the vectors have the precision of floats
+        return [array("f", vector).tolist() for vector in super().embed_documents(texts)]
+
+
+class RecordingQueryEmbeddings(DeterministicFakeEmbedding):
+    queries: list[str] = []
+
+    def embed_query(self, text: str) -> list[float]:
+        self.queries.append(text)
+        return super().embed_query(text)
+
+
+def test_cached_embeddings() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        provider = RecordingEmbeddings(size=8)
+        embeddings = CachedEmbeddings(provider, EmbeddingsCache(os.path.join(tmp_dir, "cache"), 100), "model")
+
+        first = embeddings.embed_documents(["a", "b", "a"])
+        assert provider.calls == [["a", "b"]]
+
+        second = embeddings.embed_documents(["b", "c", "a"])
+        assert provider.calls == [["a", "b"], ["c"]]
+
+        assert first[0] == first[2] == second[2]
+        assert first[1] == second[0]
+        assert first[0] == provider.embed_documents(["a"])[0]
+
+
+def test_cache_is_separated_by_model() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = EmbeddingsCache(os.path.join(tmp_dir, "cache"), 100)
+        cache.set_many("model-a", {"hash": [1.0, 2.0]})
+
+        assert cache.get_many("model-a", ["hash"]) == {"hash": [1.0, 2.0]}
+        assert cache.get_many("model-b", ["hash"]) == {}
+
+
+def test_cache_evicts_least_recently_used() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = EmbeddingsCache(os.path.join(tmp_dir, "cache"), 2)
+        cache.set_many("model", {"1": [1.0]})
+        cache.set_many("model", {"2": [2.0]})
+        cache.get_many("model", ["1"])
+        cache.set_many("model", {"3": [3.0]})
+
+        assert cache.get_many("model", ["1", "2", "3"]) == {"1": [1.0], "3": [3.0]}
+
+
+def test_cache_evicts_a_tenth_at_once() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = EmbeddingsCache(os.path.join(tmp_dir, "cache"), 10)
+        cache.set_many("model", {str(i): [float(i)] for i in range(10)})
+        cache.set_many("model", {"10": [0.1]})
+
+        assert len(cache.get_many("model", [str(i) for i in range(11)])) == 9
+        assert cache.get_many("model", ["10"]) == {"10": [array("f", [0.1])[0]]}
+
+        # the count is restored from the file
+        assert EmbeddingsCache(os.path.join(tmp_dir, "cache"), 10).count == 9
+
+
+def test_get_embeddings_with_cache() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config = get_test_config(
+            dict(
+                embeddings_cache_enabled=True,
+                embeddings_cache_path=os.path.join(tmp_dir, "cache"),
+                embeddings_query_cache_size=0,
+            )
+        )
+
+        assert isinstance(get_embeddings(config), CachedEmbeddings)
+        assert not isinstance(get_embeddings(get_test_config(dict(embeddings_query_cache_size=0))), CachedEmbeddings)
+
+
+def test_query_embeddings_cache() -> None:
+    provider = RecordingQueryEmbeddings(size=8)
+    embeddings = CachedQueryEmbeddings(provider, QueryEmbeddingsCache(2, ttl=60), "model")
+
+    first = embeddings.embed_query("what is  the answer")
+    assert embeddings.embed_query(" what is the answer ") == first
+    assert provider.queries == ["what is  the answer"]
+
+    embeddings.embed_query("b")
+    embeddings.embed_query("c")
+    embeddings.embed_query("what is the answer")
+    assert provider.queries == ["what is  the answer", "b", "c", "what is the answer"]
+
+
+def test_query_embeddings_cache_expires(mocker: MockerFixture) -> None:
+    cache = QueryEmbeddingsCache(10, ttl=60)
+    cache.set("model", "query", [1.0])
+
+    assert cache.get("model", "query") == [1.0]
+    assert cache.get("other-model", "query") is None
+
+    mocker.patch("rei_s.services.embeddings_cache.time.monotonic", return_value=time.monotonic() + 61)
+    assert cache.get("model", "query") is None
+
+
+def test_get_embeddings_with_query_cache() -> None:
+    assert isinstance(get_embeddings(get_test_config()), CachedQueryEmbeddings)
+    assert not isinstance(get_embeddings(get_test_config(dict(embeddings_query_cache_size=0))), CachedQueryEmbeddings)
+
+
+def test_embed_queries_with_query_cache() -> None:
+    provider = RecordingEmbeddings(size=8)
+    embeddings = CachedQueryEmbeddings(provider, QueryEmbeddingsCache(10, ttl=60), "model")
+    provider.calls.clear()
+
+    first = asyncio.run(aembed_queries(embeddings, ["a", "b"]))
+    second = asyncio.run(aembed_queries(embeddings, ["b", "c", "a"]))
+
+    assert provider.calls == [["a", "b"], ["c"]]
+    assert second[0] == first[1]
+    assert second[2] == first[0]
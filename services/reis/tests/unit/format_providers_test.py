@@ -217,6 +217,16 @@ def test_plain_provider() -> None:
         assert docs[1].page_content == "World!"
 
 
+def test_plain_provider_utf8_and_empty_file() -> None:
+    with temp_file(buffer="Grüße".encode(), mime_type="text/plain", file_name="text.txt") as source_file:
+        docs = PlainProvider().process_file(source_file)
+        assert docs[0].page_content == "Grüße"
+
+    # empty files can not be memory mapped
+    with temp_file(buffer=b"", mime_type="text/plain", file_name="empty.txt") as source_file:
+        assert PlainProvider().process_file(source_file) == []
+
+
 def test_outlook_provider() -> None:
     # file downloaded from https://docs.fileformat.com/email/msg/
     source_file = SourceFile(path="tests/data/email.msg", mime_type="application/vnd.ms-outlook", file_name="email.msg")
@@ -0,0 +1,144 @@
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from fastapi import HTTPException
+import pytest
+from pytest_mock import MockerFixture
+
+from rei_s.services.job_service import JobManager
+from rei_s.services.stores.devnull_store import DevNullStoreAdapter
+from rei_s.types.source_file import SourceFile
+from tests.conftest import get_test_config
+
+
+class DeferredExecutor(Executor):
+    """Keeps the submitted calls, such that jobs stay pending until the test runs them"""
+
+    def __init__(self) -> None:
+        self.calls: list[Callable[[], Any]] = []
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future[Any]:
+        self.calls.append(lambda: fn(*args, **kwargs))
+        return Future()
+
+    def run_all(self) -> None:
+        while self.calls:
+            self.calls.pop(0)()
+
+
+def get_text_file(tmp_path: Any, file_id: str) -> SourceFile:
+    path = tmp_path / f"{file_id}.txt"
+    path.write_text("some text")
+    return SourceFile(id=file_id, path=str(path), file_name=f"{file_id}.txt", mime_type="text/plain")
+
+
+def test_too_many_pending_jobs(mocker: MockerFixture, tmp_path: Any) -> None:
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=DevNullStoreAdapter())
+    config = get_test_config()
+    executor = DeferredExecutor()
+    manager = JobManager(str(tmp_path / "jobs.sqlite3"), max_pending=1, history_size=10)
+
+    job = manager.submit(executor, config, get_text_file(tmp_path, "1"), "15", None)
+    assert job.status == "queued"
+
+    with pytest.raises(HTTPException) as exc_info:
+        manager.submit(executor, config, get_text_file(tmp_path, "2"), "15", None)
+    assert exc_info.value.status_code == 429
+
+    executor.run_all()
+    finished = manager.get(job.id)
+    assert finished is not None
+    assert finished.status == "done"
+
+    # the slot is free again
+    manager.submit(executor, config, get_text_file(tmp_path, "3"), "15", None)
+
+
+def test_failed_job(mocker: MockerFixture, tmp_path: Any) -> None:
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=DevNullStoreAdapter())
+    manager = JobManager(str(tmp_path / "jobs.sqlite3"), max_pending=10, history_size=10)
+    (tmp_path / "1.xyz").write_bytes(b"")
+    file = SourceFile(id="1", path=str(tmp_path / "1.xyz"), file_name="1.xyz", mime_type="application/xyz")
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        job = manager.submit(executor, get_test_config(), file, "15", None)
+
+    failed = manager.get(job.id)
+    assert failed is not None
+    assert failed.status == "failed"
+    assert failed.status_code == 415
+    # the job owns the file
+    assert not (tmp_path / "1.xyz").exists()
+
+
+def test_job_history_is_bounded(mocker: MockerFixture, tmp_path: Any) -> None:
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=DevNullStoreAdapter())
+    config = get_test_config()
+    manager = JobManager(str(tmp_path / "jobs.sqlite3"), max_pending=10, history_size=2)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        jobs = [manager.submit(executor, config, get_text_file(tmp_path, str(i)), "15", None) for i in range(3)]
+
+    assert manager.get(jobs[0].id) is None
+    assert manager.get(jobs[1].id) is not None
+    assert manager.get(jobs[2].id) is not None
+
+
+def test_pending_file_is_not_added_twice(mocker: MockerFixture, tmp_path: Any) -> None:
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=DevNullStoreAdapter())
+    config = get_test_config()
+    executor = DeferredExecutor()
+    manager = JobManager(str(tmp_path / "jobs.sqlite3"), max_pending=10, history_size=10)
+
+    first = manager.submit(executor, config, get_text_file(tmp_path, "1"), "15", None)
+    (tmp_path / "retry.txt").write_text("some text")
+    retry = SourceFile(id="1", path=str(tmp_path / "retry.txt"), file_name="1.txt", mime_type="text/plain")
+    second = manager.submit(executor, config, retry, "15", None)
+
+    assert second.id == first.id
+    assert len(executor.calls) == 1
+    assert not (tmp_path / "retry.txt").exists()
+
+
+def test_resume_after_restart(mocker: MockerFixture, tmp_path: Any) -> None:
+    mocked_store = DevNullStoreAdapter()
+    delete = mocker.patch.object(mocked_store, "delete", autospec=True)
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=mocked_store)
+    config = get_test_config()
+    path = str(tmp_path / "jobs.sqlite3")
+
+    # the service stops, while one job is queued and the other one is running
+    manager = JobManager(path, max_pending=10, history_size=10)
+    queued = manager.submit(DeferredExecutor(), config, get_text_file(tmp_path, "1"), "15", None)
+    running = manager.submit(DeferredExecutor(), config, get_text_file(tmp_path, "2"), "15", None)
+    manager.update(running.id, status="running", batches_done=1)
+
+    restarted = JobManager(path, max_pending=10, history_size=10)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        restarted.resume(executor, config)
+
+    for job in (queued, running):
+        resumed = restarted.get(job.id)
+        assert resumed is not None
+        assert resumed.status == "done"
+        assert resumed.batches_done == 1
+
+    # only the chunks of the interrupted job are removed before adding the file again
+    delete.assert_called_once_with("2")
+
+
+def test_resume_without_file(tmp_path: Any) -> None:
+    config = get_test_config()
+    path = str(tmp_path / "jobs.sqlite3")
+    file = get_text_file(tmp_path, "1")
+
+    job = JobManager(path, max_pending=10, history_size=10).submit(DeferredExecutor(), config, file, "15", None)
+    file.delete()
+
+    restarted = JobManager(path, max_pending=10, history_size=10)
+    restarted.resume(DeferredExecutor(), config)
+
+    failed = restarted.get(job.id)
+    assert failed is not None
+    assert failed.status == "failed"
+    assert failed.finished_at is not None
@@ -0,0 +1,80 @@
+from typing import Generator
+
+import pytest
+
+from rei_s.services.formats.pdf_provider import PdfProvider
+from rei_s.services.formats.utils import ProcessingError
+from rei_s.services import multiprocess_utils
+from rei_s.services.multiprocess_utils import get_process_pool, shutdown_process_pool, start_process_pool
+from rei_s.services.store_service import iter_chunk_batches
+from rei_s.types.source_file import SourceFile
+from tests.conftest import get_test_config
+
+
+@pytest.fixture
+def pool_shutdown() -> Generator[None, None, None]:
+    yield
+    shutdown_process_pool()
+
+
+def raise_processing_error() -> None:
+    raise ProcessingError("File too large.", 413)
+
+
+def test_process_pool_is_reused(pool_shutdown: None) -> None:
+    config = get_test_config(dict(filesize_threshold=1, process_pool_size=1))
+    file = SourceFile(path="tests/data/birthdays.pdf", mime_type="application/pdf", file_name="birthdays.pdf")
+
+    pool = get_process_pool(config)
+    (chunks_first,) = iter_chunk_batches(config, PdfProvider(), file, None)
+    (chunks_second,) = iter_chunk_batches(config, PdfProvider(), file, None)
+
+    assert get_process_pool(config) is pool
+    assert any("Darkwing Duck" in chunk.page_content for chunk in chunks_first)
+    assert [chunk.page_content for chunk in chunks_first] == [chunk.page_content for chunk in chunks_second]
+
+
+def test_processing_error_from_pool(pool_shutdown: None) -> None:
+    config = get_test_config(dict(process_pool_size=1))
+
+    with pytest.raises(ProcessingError) as exc_info:
+        get_process_pool(config).submit(raise_processing_error).result()
+
+    assert exc_info.value.status == 413
+    assert exc_info.value.message == "File too large."
+
+
+def test_process_pool_streams_batches(pool_shutdown: None) -> None:
+    config = get_test_config(dict(filesize_threshold=1, process_pool_size=1, batch_size=1))
+    file = SourceFile(path="tests/data/birthdays.pdf", mime_type="application/pdf", file_name="birthdays.pdf")
+
+    batches = list(iter_chunk_batches(config, PdfProvider(), file, None))
+    chunks = PdfProvider().process_file(file, None)
+
+    assert len(batches) == 2
+    assert all(len(batch) == 1 for batch in batches)
+    assert [chunk.page_content for batch in batches for chunk in batch] == [chunk.page_content for chunk in chunks]
+
+
+def test_process_pool_stops_when_consumer_stops(pool_shutdown: None) -> None:
+    config = get_test_config(dict(filesize_threshold=1, process_pool_size=1, batch_size=1, processing_queue_size=1))
+    file = SourceFile(path="tests/data/birthdays.pdf", mime_type="application/pdf", file_name="birthdays.pdf")
+
+    batches = iter_chunk_batches(config, PdfProvider(), file, None)
+    next(batches)
+    batches.close()
+
+    # the single process of the pool is free again
+    (chunks,) = iter_chunk_batches(
+        get_test_config(dict(filesize_threshold=1, process_pool_size=1)), PdfProvider(), file, None
+    )
+    assert len(chunks) > 0
+
+
+def test_start_process_pool_starts_every_process(pool_shutdown: None) -> None:
+    config = get_test_config(dict(process_pool_size=2))
+
+    start_process_pool(config)
+
+    assert len(get_process_pool(config)._processes) == 2
+    assert multiprocess_utils._manager is not None
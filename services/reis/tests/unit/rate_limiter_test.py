@@ -0,0 +1,120 @@
+import asyncio
+import time
+from typing import cast
+
+import httpx
+import openai
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_openai import OpenAIEmbeddings
+import pytest
+from pytest_mock import MockerFixture
+
+from rei_s.services.embeddings_provider import create_provider_embeddings, get_embeddings, get_embeddings_rate_limiter
+from rei_s.services.rate_limiter import RateLimitedEmbeddings, RateLimiter, TokenBucket, parse_duration
+from tests.conftest import get_test_config
+
+
+def test_token_bucket() -> None:
+    bucket = TokenBucket(per_minute=60)
+    now = bucket.updated
+
+    assert bucket.reserve(60, now) == 0
+    # the next unit is available after one second, the one after that after two seconds
+    assert bucket.reserve(1, now) == pytest.approx(1)
+    assert bucket.reserve(1, now) == pytest.approx(2)
+    assert bucket.reserve(1, now + 10) == pytest.approx(0)
+
+
+def test_rate_limiter_uses_both_limits() -> None:
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=60)
+
+    assert limiter.reserve(60) == 0
+    assert limiter.reserve(30) == pytest.approx(30, abs=0.1)
+
+
+def test_rate_limiter_adapts_to_headers() -> None:
+    limiter = RateLimiter(requests_per_minute=None, tokens_per_minute=60_000)
+
+    limiter.observe_headers(httpx.Headers({"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "6m0s"}))
+
+    assert limiter.reserve(1) == pytest.approx(360, abs=0.1)
+
+
+def test_rate_limiter_backoff_on_429() -> None:
+    limiter = RateLimiter(requests_per_minute=None, tokens_per_minute=None)
+
+    limiter.observe_response(httpx.Response(429, headers={"retry-after-ms": "1500"}))
+
+    assert limiter.reserve(1) == pytest.approx(1.5, abs=0.1)
+
+
+def test_parse_duration() -> None:
+    assert parse_duration("20ms") == pytest.approx(0.02)
+    assert parse_duration("1s") == 1
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("1.5") == 1.5
+    assert parse_duration(None) is None
+
+
+def test_rate_limited_embeddings_retry(mocker: MockerFixture) -> None:
+    provider = FakeEmbeddings(size=3)
+    response = httpx.Response(
+        429, headers={"retry-after-ms": "200"}, request=httpx.Request("POST", "https://example.com/embeddings")
+    )
+    error = openai.RateLimitError("rate limited", response=response, body=None)
+    mocker.patch.object(FakeEmbeddings, "embed_documents", side_effect=[error, [[1.0, 2.0, 3.0]]])
+    sleep = mocker.spy(time, "sleep")
+
+    embeddings = RateLimitedEmbeddings(provider, RateLimiter(requests_per_minute=None, tokens_per_minute=None))
+
+    assert embeddings.embed_documents(["text"]) == [[1.0, 2.0, 3.0]]
+    # the second attempt waited for the retry-after
+    assert max(call.args[0] for call in sleep.call_args_list) == pytest.approx(0.2, abs=0.05)
+
+
+def test_rate_limited_embeddings_retry_transient_errors(mocker: MockerFixture) -> None:
+    provider = FakeEmbeddings(size=3)
+    error = openai.APIConnectionError(request=httpx.Request("POST", "https://example.com/embeddings"))
+    mocker.patch.object(FakeEmbeddings, "embed_documents", side_effect=[error, [[1.0, 2.0, 3.0]], error, error, error])
+    mocker.patch.object(time, "sleep")
+
+    embeddings = RateLimitedEmbeddings(provider, RateLimiter(requests_per_minute=None, tokens_per_minute=None))
+
+    assert embeddings.embed_documents(["text"]) == [[1.0, 2.0, 3.0]]
+    with pytest.raises(openai.APIConnectionError):
+        embeddings.embed_documents(["text"])
+
+
+def test_provider_embeddings_do_not_retry_with_rate_limit() -> None:
+    config = get_test_config(
+        dict(
+            embeddings_type="openai",
+            embeddings_openai_model_name="text-embedding-3-small",
+            embeddings_openai_api_key="key",
+            embeddings_rate_limit_requests_per_minute=10,
+        )
+    )
+    limiter = get_embeddings_rate_limiter(config)
+
+    # the limiter retries rate limited requests, the client must not retry them on its own
+    assert cast(OpenAIEmbeddings, create_provider_embeddings(config, limiter)).max_retries == 0
+    assert cast(OpenAIEmbeddings, create_provider_embeddings(config)).max_retries == 1337
+
+
+def test_get_embeddings_with_rate_limit() -> None:
+    config = get_test_config(dict(embeddings_rate_limit_requests_per_minute=10, embeddings_query_cache_size=0))
+
+    assert isinstance(get_embeddings(config), RateLimitedEmbeddings)
+    assert not isinstance(get_embeddings(get_test_config(dict(embeddings_query_cache_size=0))), RateLimitedEmbeddings)
+
+
+def test_rate_limited_embeddings_async() -> None:
+    limiter = RateLimiter(requests_per_minute=3, tokens_per_minute=None)
+    embeddings = RateLimitedEmbeddings(FakeEmbeddings(size=3), limiter)
+
+    assert len(asyncio.run(embeddings.aembed_documents(["text"]))[0]) == 3
+    assert len(asyncio.run(embeddings.aembed_query("text"))) == 3
+
+    # both requests used the budget of the limiter
+    assert limiter.reserve(1) == 0
+    assert limiter.reserve(1) == pytest.approx(20, abs=1)
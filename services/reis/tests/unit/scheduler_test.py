@@ -0,0 +1,95 @@
+from concurrent.futures import CancelledError
+from threading import Event
+
+from prometheus_client import REGISTRY
+import pytest
+
+from rei_s.services.scheduler import Lane, PriorityExecutor
+
+
+def get_queue_depth(lane: Lane) -> float | None:
+    return REGISTRY.get_sample_value("scheduler_queue_depth", {"lane": lane})
+
+
+def test_lanes_are_served_by_weight() -> None:
+    executor = PriorityExecutor(1, {"interactive": 2, "search": 1, "bulk": 1})
+    started, release = Event(), Event()
+
+    def block() -> None:
+        started.set()
+        release.wait()
+
+    order: list[str] = []
+    executor.submit(block)
+    started.wait()
+    futures = [executor.submit(order.append, f"b{i}") for i in range(4)]
+    futures += [executor.submit_to_lane("interactive", order.append, f"i{i}") for i in range(4)]
+
+    assert get_queue_depth("bulk") == 4
+    assert get_queue_depth("interactive") == 4
+
+    release.set()
+    for future in futures:
+        future.result()
+    executor.shutdown()
+
+    # the bulk lane was busy before, so the interactive lane goes first and then gets two tasks for each bulk task
+    assert order == ["i0", "i1", "i2", "b0", "i3", "b1", "b2", "b3"]
+    assert get_queue_depth("bulk") == 0
+    assert get_queue_depth("interactive") == 0
+
+
+def test_exception_is_set_on_future() -> None:
+    executor = PriorityExecutor(1, {"interactive": 1, "search": 1, "bulk": 1})
+
+    def fail() -> None:
+        raise ValueError("failed")
+
+    with pytest.raises(ValueError, match="failed"):
+        executor.submit_to_lane("search", fail).result()
+    executor.shutdown()
+
+
+def test_shutdown_cancels_queued_tasks() -> None:
+    executor = PriorityExecutor(1, {"interactive": 1, "search": 1, "bulk": 1})
+    started, release = Event(), Event()
+
+    def block() -> None:
+        started.set()
+        release.wait()
+
+    running = executor.submit(block)
+    started.wait()
+    queued = executor.submit(print, "never")
+
+    executor.shutdown(wait=False, cancel_futures=True)
+    release.set()
+
+    running.result()
+    with pytest.raises(CancelledError):
+        queued.result()
+    with pytest.raises(RuntimeError):
+        executor.submit(print, "too late")
+
+
+def test_reserved_workers_serve_interactive_tasks_while_bulk_tasks_run() -> None:
+    executor = PriorityExecutor(1, {"interactive": 1, "search": 1, "bulk": 1}, reserved_workers=1)
+    started, release = Event(), Event()
+
+    def block() -> None:
+        started.set()
+        release.wait()
+
+    running = executor.submit(block)
+    started.wait()
+    queued = executor.submit(print, "after the running bulk task")
+
+    assert executor.submit_to_lane("interactive", lambda: "preview").result(timeout=5) == "preview"
+    assert executor.submit_to_lane("search", lambda: "content").result(timeout=5) == "content"
+    # the reserved worker does not take bulk tasks
+    assert not running.done()
+    assert not queued.done()
+
+    release.set()
+    queued.result(timeout=5)
+    executor.shutdown()
@@ -0,0 +1,101 @@
+import asyncio
+
+from langchain_core.documents import Document
+from pytest_mock import MockerFixture
+
+from rei_s.services import store_service
+from rei_s.services.search_cache import SearchCache
+from rei_s.services.stores.devnull_store import DevNullStoreAdapter
+from tests.conftest import get_test_config
+
+
+def test_search_cache() -> None:
+    cache = SearchCache(10, ttl=60)
+    generation = cache.generation("index", "bucket")
+    cache.set("index", "key", generation, [Document(page_content="content")])
+
+    cached = cache.get("index", "bucket", "key")
+    assert cached is not None
+    assert cached[0].page_content == "content"
+
+    # the cached documents are not modified by the callers
+    cached[0].metadata["changed"] = True
+    assert cache.get("index", "bucket", "key") == [Document(page_content="content")]
+
+
+def test_search_cache_invalidation_by_bucket() -> None:
+    cache = SearchCache(10, ttl=60)
+    cache.set("index", "key-1", cache.generation("index", "1"), [])
+    cache.set("index", "key-2", cache.generation("index", "2"), [])
+    cache.set("index", "key-all", cache.generation("index", None), [])
+
+    cache.invalidate_bucket("index", "1")
+
+    assert cache.get("index", "1", "key-1") is None
+    assert cache.get("index", "2", "key-2") == []
+    assert cache.get("index", None, "key-all") is None
+
+
+def test_search_cache_invalidation_by_index() -> None:
+    cache = SearchCache(10, ttl=60)
+    cache.set("index", "key", cache.generation("index", "1"), [])
+    cache.set("other", "key", cache.generation("other", "1"), [])
+
+    cache.invalidate_index("index")
+
+    assert cache.get("index", "1", "key") is None
+    assert cache.get("other", "1", "key") == []
+
+
+def test_search_cache_ignores_results_of_outdated_searches() -> None:
+    cache = SearchCache(10, ttl=60)
+    generation = cache.generation("index", "1")
+    # a file is added while the search is running
+    cache.invalidate_bucket("index", "1")
+    cache.set("index", "key", generation, [])
+
+    assert cache.get("index", "1", "key") is None
+
+
+def test_search_uses_cache(mocker: MockerFixture) -> None:
+    store = DevNullStoreAdapter()
+    similarity_search = mocker.patch.object(
+        store, "similarity_search", return_value=[Document(page_content="content", metadata={"format": "pdf"})]
+    )
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=store)
+    mocker.patch("rei_s.services.store_service.add_batches_concurrently")
+    mocker.patch("rei_s.services.store_service.generate_batches", return_value=iter([]))
+    config = get_test_config(dict(search_cache_size=10, search_cache_ttl=60))
+
+    def search(bucket: str) -> list[Document]:
+        return asyncio.run(store_service.search(config, "query", bucket, 3, index_name="cached"))
+
+    assert search("1")[0].page_content == "content"
+    assert search("1")[0].page_content == "content"
+    assert similarity_search.call_count == 1
+
+    store_service.add_file(config, mocker.Mock(), "1", "doc", index_name="cached")
+    search("1")
+    assert similarity_search.call_count == 2
+
+    store_service.delete_file(config, "doc", index_name="cached")
+    search("1")
+    assert similarity_search.call_count == 3
+
+
+def test_search_cache_keeps_the_generations_of_recently_changed_buckets() -> None:
+    cache = SearchCache(2, ttl=60)
+    cache.set("index", "key-1", cache.generation("index", "1"), [])
+    for bucket in ["1", "2", "3", "4"]:
+        cache.generation("index", bucket)
+    assert len(cache.bucket_generations) == 0
+
+    cache.invalidate_bucket("index", "1")
+    cache.invalidate_bucket("index", "2")
+    cache.set("index", "key-2", cache.generation("index", "2"), [])
+    cache.invalidate_bucket("index", "3")
+
+    assert len(cache.bucket_generations) == 2
+    # the generation of the first bucket was dropped, but its outdated entry is not valid again
+    assert cache.get("index", "1", "key-1") is None
+    assert cache.get("index", "2", "key-2") == []
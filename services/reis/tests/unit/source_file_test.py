@@ -0,0 +1,29 @@
+import hashlib
+import os
+import pickle
+
+from pytest_mock import MockerFixture
+
+from rei_s.types.source_file import temp_file
+
+
+def test_source_file_looks_at_the_file_once(mocker: MockerFixture) -> None:
+    with temp_file(buffer=b"some text", mime_type="text/plain", file_name="text.txt") as source_file:
+        getsize = mocker.spy(os.path, "getsize")
+
+        assert source_file.size == 9
+        assert source_file.size == 9
+        assert source_file.content_hash == hashlib.sha256(b"some text").hexdigest()
+
+        getsize.assert_called_once()
+
+
+def test_recorded_content_info_survives_pickling() -> None:
+    with temp_file(buffer=b"some text", mime_type="text/plain", file_name="text.txt") as source_file:
+        source_file.set_content_info(9, "recorded")
+
+        copy = pickle.loads(pickle.dumps(source_file))
+
+        assert copy.content_hash == "recorded"
+        assert copy.size == 9
+        assert copy.buffer == b"some text"
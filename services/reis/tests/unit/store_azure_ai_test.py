@@ -1,4 +1,5 @@
 from io import BytesIO
+from azure.core.pipeline.transport import AsyncioRequestsTransport
 from faker import Faker
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
@@ -36,6 +37,9 @@ def get_config_override() -> Config:
 def client(mocker: MockerFixture, app: FastAPI) -> TestClient:
     app.dependency_overrides[get_config] = get_config_override
 
+    # the async search client uses aiohttp by default, we let it send its requests via `requests` to mock them
+    mocker.patch("azure.core.pipeline.transport._aiohttp.AioHttpTransport", AsyncioRequestsTransport)
+
     # mock embeddings to avoid calls to azure
     mocker.patch("rei_s.services.store_service.get_embeddings", return_value=FakeEmbeddings(size=1352))
 
@@ -106,6 +110,18 @@ def test_get_files(client: TestClient, responses: RequestsMock, faker: Faker) ->
     assert "bucket" not in content["files"][0]["metadata"]
 
 
+def test_search_files_batch(client: TestClient, responses: RequestsMock, faker: Faker) -> None:
+    filename = faker.file_name(extension="md")
+    input_content = faker.text()
+    mock_search_response(responses, filename, input_content)
+
+    response = client.post("/files/search:batch", json={"queries": [{"query": "test", "bucket": "1", "take": 3}]})
+
+    content = response.json()
+    assert content["results"][0]["files"][0]["content"] == input_content
+    assert "bucket" not in content["results"][0]["files"][0]["metadata"]
+
+
 def test_get_documents_content(client: TestClient, responses: RequestsMock, faker: Faker) -> None:
     filename = faker.file_name(extension="md")
     input_content = faker.text()
@@ -0,0 +1,437 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import pickle
+import sqlite3
+from threading import Event
+import time
+import zlib
+from typing import Any
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+import pytest
+from pytest_mock import MockerFixture
+
+from rei_s.services import store_service
+from rei_s.services.formats.pdf_provider import PdfProvider
+from rei_s.services.parse_cache import ParseCache
+from rei_s.services.store_provider import get_cached_store
+from rei_s.services.stores.devnull_store import DevNullStoreAdapter
+from rei_s.types.source_file import SourceFile
+from tests.conftest import get_test_config
+
+
+class SlowEmbeddings(Embeddings):
+    """Embeds the text `"<n>"` as `[n]`, after waiting longer for smaller numbers"""
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if "fail" in texts:
+            raise ValueError("embedding failed")
+        time.sleep(0.1 * (5 - int(texts[0])))
+        return [[float(text)] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+class RecordingStoreAdapter(DevNullStoreAdapter):
+    def __init__(self) -> None:
+        self.added: list[tuple[list[str], list[list[float]] | None]] = []
+        self.ids: list[str | None] = []
+
+    def add_documents(self, documents: list[Document], embeddings: list[list[float]] | None = None) -> None:
+        self.added.append(([doc.page_content for doc in documents], embeddings))
+        self.ids += [doc.id for doc in documents]
+
+    def get_chunk_hashes(self, doc_id: str) -> dict[str, str | None]:
+        return {str(chunk_id): None for chunk_id in self.ids}
+
+
+def mock_batches(
+    mocker: MockerFixture, texts: list[str], store: RecordingStoreAdapter | None = None
+) -> RecordingStoreAdapter:
+    if store is None:
+        store = RecordingStoreAdapter()
+    store.embeddings = SlowEmbeddings()
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=store)
+    mocker.patch(
+        "rei_s.services.store_service.generate_batches",
+        return_value=iter([([Document(page_content=text)], i, None) for i, text in enumerate(texts)]),
+    )
+    return store
+
+
+def add_file(embedding_concurrency: int, embedding_ordered_writes: bool = True, **settings: Any) -> None:
+    config = get_test_config(
+        dict(embedding_concurrency=embedding_concurrency, embedding_ordered_writes=embedding_ordered_writes, **settings)
+    )
+    file = SourceFile(path="tests/data/birthdays.pdf", mime_type="application/pdf", file_name="birthdays.pdf")
+    store_service.add_file(config, file, "bucket", "doc")
+
+
+def test_add_file_embeds_concurrently_with_ordered_writes(mocker: MockerFixture) -> None:
+    store = mock_batches(mocker, ["1", "2", "3", "4"])
+
+    add_file(embedding_concurrency=4)
+
+    assert store.added == [(["1"], [[1.0]]), (["2"], [[2.0]]), (["3"], [[3.0]]), (["4"], [[4.0]])]
+
+
+def test_add_file_embeds_concurrently_with_unordered_writes(mocker: MockerFixture) -> None:
+    store = mock_batches(mocker, ["1", "2", "3", "4"])
+
+    add_file(embedding_concurrency=4, embedding_ordered_writes=False)
+
+    # the later batches are embedded faster
+    assert store.added == [(["4"], [[4.0]]), (["3"], [[3.0]]), (["2"], [[2.0]]), (["1"], [[1.0]])]
+
+
+def test_add_file_sequentially(mocker: MockerFixture) -> None:
+    store = mock_batches(mocker, ["1", "2"])
+
+    add_file(embedding_concurrency=1)
+
+    # the store embeds the batches itself
+    assert store.added == [(["1"], None), (["2"], None)]
+
+
+def test_add_file_embedding_error(mocker: MockerFixture) -> None:
+    store = mock_batches(mocker, ["1", "fail", "3"])
+
+    with pytest.raises(ValueError, match="embedding failed"):
+        add_file(embedding_concurrency=2)
+
+    assert store.added == [(["1"], [[1.0]])]
+
+
+def test_add_file_resumes_after_failure(mocker: MockerFixture, tmp_path: Path) -> None:
+    checkpoints: dict[str, Any] = dict(
+        ingestion_checkpoints_enabled=True, ingestion_checkpoints_path=str(tmp_path / "checkpoints")
+    )
+    store = mock_batches(mocker, ["1", "fail", "3"])
+
+    with pytest.raises(ValueError, match="embedding failed"):
+        add_file(embedding_concurrency=2, **checkpoints)
+    assert store.added == [(["1"], [[1.0]])]
+
+    # the retry only stores the missing batches
+    store.added.clear()
+    mock_batches(mocker, ["1", "2", "3"], store)
+    add_file(embedding_concurrency=2, **checkpoints)
+    assert store.added == [(["2"], [[2.0]]), (["3"], [[3.0]])]
+
+    # the checkpoint is removed, when the file was added completely
+    store = mock_batches(mocker, ["1", "2", "3"])
+    add_file(embedding_concurrency=1, **checkpoints)
+    assert len(store.added) == 3
+
+
+def test_add_file_stores_batches_again_if_their_chunks_were_deleted(mocker: MockerFixture, tmp_path: Path) -> None:
+    checkpoints: dict[str, Any] = dict(
+        ingestion_checkpoints_enabled=True, ingestion_checkpoints_path=str(tmp_path / "checkpoints")
+    )
+    store = mock_batches(mocker, ["1", "fail", "3"])
+    with pytest.raises(ValueError, match="embedding failed"):
+        add_file(embedding_concurrency=2, **checkpoints)
+
+    # e.g., another instance deleted the file, before it is retried on this instance
+    store = mock_batches(mocker, ["1", "2", "3"])
+    add_file(embedding_concurrency=2, **checkpoints)
+    assert store.added == [(["1"], [[1.0]]), (["2"], [[2.0]]), (["3"], [[3.0]])]
+
+
+def test_add_file_ignores_checkpoints_of_other_buckets(mocker: MockerFixture, tmp_path: Path) -> None:
+    config = get_test_config(
+        dict(
+            embedding_concurrency=2,
+            ingestion_checkpoints_enabled=True,
+            ingestion_checkpoints_path=str(tmp_path / "checkpoints"),
+        )
+    )
+    file = SourceFile(path="tests/data/birthdays.pdf", mime_type="application/pdf", file_name="birthdays.pdf")
+    store = mock_batches(mocker, ["1", "fail", "3"])
+    with pytest.raises(ValueError, match="embedding failed"):
+        store_service.add_file(config, file, "bucket", "doc")
+
+    store.added.clear()
+    mock_batches(mocker, ["1", "2", "3"], store)
+    store_service.add_file(config, file, "other-bucket", "doc")
+    assert store.added == [(["1"], [[1.0]]), (["2"], [[2.0]]), (["3"], [[3.0]])]
+
+
+def test_add_file_retry_splits_cached_elements(mocker: MockerFixture, tmp_path: Path) -> None:
+    config = get_test_config(dict(parse_cache_enabled=True, parse_cache_path=str(tmp_path / "parse_cache")))
+    file = SourceFile(path="tests/data/birthdays.pdf", mime_type="application/pdf", file_name="birthdays.pdf")
+    store = DevNullStoreAdapter()
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=store)
+    mocker.patch.object(store, "add_documents", side_effect=ValueError("storing failed"))
+    load = mocker.spy(PdfProvider, "load")
+
+    with pytest.raises(ValueError, match="storing failed"):
+        store_service.add_file(config, file, "bucket", "doc")
+
+    add_documents = mocker.patch.object(store, "add_documents")
+    store_service.add_file(config, file, "bucket", "doc")
+
+    load.assert_called_once()
+    add_documents.assert_called()
+
+
+def test_add_file_without_checkpoints_keeps_chunk_ids(mocker: MockerFixture) -> None:
+    store = mock_batches(mocker, ["1", "fail"])
+    with pytest.raises(ValueError, match="embedding failed"):
+        add_file(embedding_concurrency=2)
+
+    retry = mock_batches(mocker, ["1", "2"])
+    add_file(embedding_concurrency=2)
+
+    # the chunks of the first attempt are overwritten, instead of being duplicated
+    assert store.ids == retry.ids[:1]
+    assert len(set(retry.ids)) == 2
+
+
+class HashingStoreAdapter(RecordingStoreAdapter):
+    """Keeps the content hashes of the stored chunks by their id"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.chunks: dict[str, str | None] = {}
+
+    def add_documents(self, documents: list[Document], embeddings: list[list[float]] | None = None) -> None:
+        super().add_documents(documents, embeddings)
+        self.chunks.update({str(doc.id): doc.metadata["content_hash"] for doc in documents})
+
+    def delete_chunks(self, ids: list[str]) -> None:
+        for chunk_id in ids:
+            del self.chunks[chunk_id]
+
+    def get_chunk_hashes(self, doc_id: str) -> dict[str, str | None]:
+        return dict(self.chunks)
+
+
+def write_paragraphs(path: Path, paragraphs: list[str]) -> SourceFile:
+    # each paragraph is long enough to become a chunk on its own
+    path.write_text("\n\n".join(paragraph * 300 for paragraph in paragraphs))
+    return SourceFile(id="doc", path=str(path), mime_type="text/plain", file_name="wiki.txt")
+
+
+def test_update_file_only_stores_changed_chunks(mocker: MockerFixture, tmp_path: Path) -> None:
+    store = HashingStoreAdapter()
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=store)
+    config = get_test_config()
+
+    store_service.add_file(config, write_paragraphs(tmp_path / "v1.txt", ["a. ", "b. ", "c. "]), "bucket", "doc")
+    store.added.clear()
+
+    result = store_service.update_file(
+        config, write_paragraphs(tmp_path / "v2.txt", ["a. ", "B. ", "c. ", "d. "]), "bucket", "doc"
+    )
+
+    assert (result.added, result.kept, result.deleted) == (2, 2, 1)
+    assert [content[:3] for content in store.added[0][0]] == ["B. ", "d. "]
+    assert len(store.chunks) == 4
+
+
+def test_add_files_coalesces_chunks_and_reports_failed_batches(mocker: MockerFixture) -> None:
+    store = RecordingStoreAdapter()
+    delete = mocker.patch.object(store, "delete")
+    original_add_documents = store.add_documents
+
+    def add_documents(documents: list[Document], embeddings: list[list[float]] | None = None) -> None:
+        if "fail" in [doc.page_content for doc in documents]:
+            raise RuntimeError("store failed")
+        original_add_documents(documents, embeddings)
+
+    mocker.patch.object(store, "add_documents", side_effect=add_documents)
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=store)
+    chunks = {"1": ["a", "b", "c"], "2": ["d", "fail"], "3": ["e"]}
+    mocker.patch(
+        "rei_s.services.store_service.parse_file",
+        side_effect=lambda config, file, bucket: [
+            Document(page_content=text, metadata={"doc_id": file.id}) for text in chunks[file.id]
+        ],
+    )
+    files = [SourceFile(id=id_, path="", mime_type="text/plain", file_name=f"{id_}.txt") for id_ in chunks]
+
+    results = store_service.add_files(get_test_config(dict(batch_size=2)), files, "bucket")
+
+    # the batches span the files
+    assert [doc for doc, _ in store.added] == [["a", "b"], ["c", "d"]]
+    # the last batch failed, which contained chunks of the second and the third file
+    assert [result.status_code for result in results] == [200, 500, 500]
+    # the first chunk of the second file was already added
+    assert sorted(call.args[0] for call in delete.call_args_list) == ["2", "3"]
+
+
+class DocumentStoreAdapter(DevNullStoreAdapter):
+    """Keeps the stored chunks with their embeddings by their id"""
+
+    def __init__(self) -> None:
+        self.chunks: dict[str, tuple[Document, list[float]]] = {}
+
+    def add_documents(self, documents: list[Document], embeddings: list[list[float]] | None = None) -> None:
+        assert embeddings is not None
+        self.chunks.update({str(doc.id): (doc, embedding) for doc, embedding in zip(documents, embeddings)})
+
+    def delete(self, doc_id: str) -> None:
+        self.chunks = {id_: chunk for id_, chunk in self.chunks.items() if chunk[0].metadata["doc_id"] != doc_id}
+
+    def get_chunk_hashes(self, doc_id: str) -> dict[str, str | None]:
+        return {
+            id_: doc.metadata["content_hash"]
+            for id_, (doc, _) in self.chunks.items()
+            if doc.metadata["doc_id"] == doc_id
+        }
+
+    def get_document_chunks(self, doc_id: str) -> list[tuple[Document, list[float]]]:
+        return [(doc, embedding) for doc, embedding in self.chunks.values() if doc.metadata["doc_id"] == doc_id]
+
+    def delete_chunks(self, ids: list[str]) -> None:
+        for id_ in ids:
+            self.chunks.pop(id_, None)
+
+
+def test_add_file_copies_chunks_of_identical_file(mocker: MockerFixture, tmp_path: Path) -> None:
+    store = DocumentStoreAdapter()
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=store)
+    config = get_test_config(
+        dict(embedding_concurrency=2, ingestion_dedupe_enabled=True, ingestion_dedupe_path=str(tmp_path / "registry"))
+    )
+
+    store_service.add_file(config, write_paragraphs(tmp_path / "v1.txt", ["a. ", "b. "]), "bucket", "doc")
+    parse = mocker.spy(store_service, "iter_chunk_batches")
+    copy = write_paragraphs(tmp_path / "copy.txt", ["a. ", "b. "])
+    copy.file_name = "copy.txt"
+    store_service.add_file(config, copy, "other", "copy")
+
+    parse.assert_not_called()
+    originals = sorted(store.get_document_chunks("doc"), key=lambda chunk: chunk[0].page_content)
+    copies = sorted(store.get_document_chunks("copy"), key=lambda chunk: chunk[0].page_content)
+    assert len(copies) == 2
+    for (original, original_embedding), (copied, copied_embedding) in zip(originals, copies):
+        assert copied.page_content == original.page_content
+        assert copied_embedding == original_embedding
+        assert copied.metadata["bucket"] == "other"
+        assert copied.metadata["source"] == "copy.txt"
+        # the chunks are the same as if the file had been processed, so updates keep them
+        expected = {**original.metadata, "bucket": "other", "doc_id": "copy", "source": "copy.txt"}
+        del expected["content_hash"]
+        del expected["file_hash"]
+        assert copied.metadata["content_hash"] == store_service.get_content_hash(copied.page_content, expected)
+        assert copied.metadata["file_hash"] == original.metadata["file_hash"]
+
+
+def test_add_file_moves_chunks_of_identical_file_to_new_bucket(mocker: MockerFixture, tmp_path: Path) -> None:
+    store = DocumentStoreAdapter()
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=store)
+    config = get_test_config(
+        dict(embedding_concurrency=2, ingestion_dedupe_enabled=True, ingestion_dedupe_path=str(tmp_path / "registry"))
+    )
+
+    store_service.add_file(config, write_paragraphs(tmp_path / "v1.txt", ["a. ", "b. "]), "bucket", "doc")
+    parse = mocker.spy(store_service, "iter_chunk_batches")
+    store_service.add_file(config, write_paragraphs(tmp_path / "v1.txt", ["a. ", "b. "]), "other", "doc")
+
+    parse.assert_not_called()
+    chunks = store.get_document_chunks("doc")
+    assert len(chunks) == 2
+    assert all(chunk.metadata["bucket"] == "other" for chunk, _ in chunks)
+
+
+def test_add_file_processes_file_if_identical_file_was_deleted(mocker: MockerFixture, tmp_path: Path) -> None:
+    store = DocumentStoreAdapter()
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=store)
+    config = get_test_config(
+        dict(embedding_concurrency=2, ingestion_dedupe_enabled=True, ingestion_dedupe_path=str(tmp_path / "registry"))
+    )
+
+    store_service.add_file(config, write_paragraphs(tmp_path / "v1.txt", ["a. ", "b. "]), "bucket", "doc")
+    # deleted by another instance, so the registry still knows the document
+    store.delete("doc")
+    parse = mocker.spy(store_service, "iter_chunk_batches")
+    store_service.add_file(config, write_paragraphs(tmp_path / "v2.txt", ["a. ", "b. "]), "bucket", "other")
+
+    parse.assert_called_once()
+    assert len(store.get_document_chunks("other")) == 2
+
+
+def test_process_file_splits_cached_elements(mocker: MockerFixture, tmp_path: Path) -> None:
+    config = get_test_config(dict(parse_cache_enabled=True, parse_cache_path=str(tmp_path / "parse_cache")))
+    file = SourceFile(path="tests/data/birthdays.pdf", mime_type="application/pdf", file_name="birthdays.pdf")
+    load = mocker.spy(PdfProvider, "load")
+
+    first = store_service.process_file(config, file, chunk_size=500)
+    second = store_service.process_file(config, file, chunk_size=300)
+    again = store_service.process_file(config, file, chunk_size=500)
+
+    load.assert_called_once()
+    assert again == first
+    # the same chunks as without the cache
+    assert first == store_service.process_file(get_test_config(), file, chunk_size=500)
+    assert second == store_service.process_file(get_test_config(), file, chunk_size=300)
+
+
+def test_add_file_processes_file_if_identical_file_was_replaced(mocker: MockerFixture, tmp_path: Path) -> None:
+    store = DocumentStoreAdapter()
+    mocker.patch("rei_s.services.store_service.get_vector_store", return_value=store)
+    config = get_test_config(
+        dict(embedding_concurrency=2, ingestion_dedupe_enabled=True, ingestion_dedupe_path=str(tmp_path / "registry"))
+    )
+
+    store_service.add_file(config, write_paragraphs(tmp_path / "v1.txt", ["a. ", "b. "]), "bucket", "doc")
+    # replaced by another instance, so the registry still has the content of the first file
+    store.delete("doc")
+    other_instance = get_test_config(dict(embedding_concurrency=2))
+    store_service.add_file(other_instance, write_paragraphs(tmp_path / "v2.txt", ["c. ", "d. "]), "bucket", "doc")
+    parse = mocker.spy(store_service, "iter_chunk_batches")
+    store_service.add_file(config, write_paragraphs(tmp_path / "copy.txt", ["a. ", "b. "]), "bucket", "copy")
+
+    parse.assert_called_once()
+    copies = store.get_document_chunks("copy")
+    assert len(copies) == 2
+    assert not any("c." in chunk.page_content or "d." in chunk.page_content for chunk, _ in copies)
+
+
+def test_parse_cache_does_not_load_pickled_elements(tmp_path: Path) -> None:
+    path = str(tmp_path / "parse_cache")
+    # a database of the first version, or one uploaded by an attacker
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE elements (format TEXT NOT NULL, content_hash TEXT NOT NULL, elements BLOB NOT NULL, "
+            "last_used REAL NOT NULL, PRIMARY KEY (format, content_hash))"
+        )
+        connection.execute(
+            "INSERT INTO elements VALUES ('pdf', 'hash', ?, 0)", [zlib.compress(pickle.dumps([("text", {})]))]
+        )
+    connection.close()
+
+    cache = ParseCache(path, 10)
+    assert cache.get("pdf", "hash") is None
+
+    cache.set("pdf", "hash", [Document(page_content="text", metadata={"page": 1})])
+    assert cache.get("pdf", "hash") == [Document(page_content="text", metadata={"page": 1})]
+
+
+def test_store_lookups_do_not_wait_for_the_creation_of_other_stores() -> None:
+    config = get_test_config()
+    creating = Event()
+    created = Event()
+
+    def create_slowly() -> DevNullStoreAdapter:
+        creating.set()
+        created.wait(5)
+        return DevNullStoreAdapter()
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        slow = executor.submit(get_cached_store, config, "slow", create_slowly)
+        assert creating.wait(5)
+        second = executor.submit(get_cached_store, config, "slow", DevNullStoreAdapter)
+
+        # another index is created and found while the first one is still being created
+        other = get_cached_store(config, "other", DevNullStoreAdapter)
+        assert get_cached_store(config, "other", DevNullStoreAdapter) is other
+        assert not slow.done()
+
+        created.set()
+        # the second lookup of the same index waited for the first creation
+        assert second.result() is slow.result()
@@ -69,3 +69,14 @@ def test_path_traversal_attack() -> None:
     # Test path traversal prevention
     with pytest.raises(ValueError, match="Invalid file path"):
         get_uploaded_file_path("../../../etc/passwd")
+
+
+def test_uploads_cannot_replace_the_databases() -> None:
+    with pytest.raises(ValueError, match="Invalid file path"):
+        get_uploaded_file_path("reis-state/jobs.sqlite3")
+    with pytest.raises(ValueError, match="Invalid file path"):
+        get_uploaded_file_path("reis-state")
+    with pytest.raises(ValueError, match="Invalid file path"):
+        get_uploaded_file_path("other/../reis-state/checkpoints.sqlite3")
+    # files outside of the directory are fine
+    assert get_uploaded_file_path("jobs.sqlite3").endswith("jobs.sqlite3")